@@ -1,11 +1,10 @@
 import os
-import json
-import sqlite3
+import time
 import traceback
 from datetime import datetime, timedelta
 import jwt
 from fastapi import FastAPI, HTTPException, Request, Depends, Header
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from typing import Optional
 
@@ -18,6 +17,21 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
 import random
 
+from sqlite_pool import SQLitePool
+from plan_cache import PlanCache, MISSING
+from llm_cache import ResponseCache, CACHE_MODES, cache_key
+from job_queue import JobQueue, TERMINAL_STATUSES
+from singleflight import SingleFlight
+from plan_fanout import generate_fanout_plan, FanoutValidationError
+from plan_stream import IncrementalJSONParser
+from schema_validation import validate, subschema
+from macro_engine import MEALS, summarize_plan
+from blob_codec import BlobCodec, dictionary_loader, init_dictionary_table, load_dictionaries
+from otp_store import VALID, EXPIRED, OTPPurger, make_otp_store
+from rate_limit import RateLimitMiddleware, RouteLimit, TokenBucketLimiter, env_rate
+import jsoncodec
+from jsoncodec import FastJSONResponse
+
 # ---------- Authentication Functions ----------
 SECRET_KEY = os.environ.get("JWT_SECRET_KEY", "your-secret-key-here")  # Change this in production
 ALGORITHM = "HS256"
@@ -43,11 +57,8 @@ async def get_current_user(authorization: str = Header(...)):
             raise HTTPException(status_code=401, detail="Invalid token")
         
         # Verify user exists in database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT user_id FROM users WHERE user_id = ?", (user_id,))
-        user = cursor.fetchone()
-        conn.close()
+        with db.connection() as conn:
+            user = conn.execute("SELECT user_id FROM users WHERE user_id = ?", (user_id,)).fetchone()
         
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
@@ -68,73 +79,119 @@ if not AUTH_SECRET_KEY:
 
 ALGORITHM = "HS256"
 
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+db = SQLitePool(DATABASE)
+plan_cache = PlanCache()
+# Plans, day rows and modification replies; BLOB_COMPRESSION=zlib|zstd turns compression on
+blob_codec = BlobCodec(loader=dictionary_loader(db))
+
+def write_plan_days(conn, week_key, plan):
+    """Replace the week's meal_plan_days rows; call inside the transaction that saves the blob."""
+    body = plan.get("meal_plan", plan) if isinstance(plan, dict) else {}
+    overview = body.get("overview") or {}
+    goals = [overview.get("calorie_goal"), overview.get("protein_goal")]
+    goals = [None if goal is None else str(goal) for goal in goals]
+    conn.execute('DELETE FROM meal_plan_days WHERE week_key = ?', (week_key,))
+    conn.executemany(
+        'INSERT INTO meal_plan_days (week_key, day, plan, calorie_goal, protein_goal) VALUES (?, ?, ?, ?, ?)',
+        [(week_key, str(day).lower(), blob_codec.encode(jsoncodec.dumps(day_plan)), *goals) for day, day_plan in (body.get("daily_plans") or {}).items()]
+    )
 
 def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Create meal_plans table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS meal_plans (
-        week_key TEXT PRIMARY KEY,
-        plan TEXT NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-    
-    # Create modifications table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS modifications (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        week_key TEXT NOT NULL,
-        timestamp TEXT NOT NULL,
-        context TEXT,
-        day TEXT,
-        response TEXT NOT NULL,
-        FOREIGN KEY (week_key) REFERENCES meal_plans(week_key)
-    )
-    ''')
+    with db.connection() as conn:
+        cursor = conn.cursor()
+
+        init_dictionary_table(conn)
+        load_dictionaries(conn, blob_codec)
+
+        # Create meal_plans table
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS meal_plans (
+            week_key TEXT PRIMARY KEY,
+            plan TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
     
-    conn.commit()
-    conn.close()
+        # Create modifications table
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS modifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            week_key TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            context TEXT,
+            day TEXT,
+            response TEXT NOT NULL,
+            FOREIGN KEY (week_key) REFERENCES meal_plans(week_key)
+        )
+        ''')
+
+        # One row per day of each plan, written with the blob, so the today
+        # and chat endpoints read a single day instead of decoding the week
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS meal_plan_days (
+            week_key TEXT NOT NULL,
+            day TEXT NOT NULL,
+            plan TEXT NOT NULL,
+            calorie_goal TEXT,
+            protein_goal TEXT,
+            PRIMARY KEY (week_key, day)
+        )
+        ''')
+
+        # Plans saved before meal_plan_days existed
+        missing = cursor.execute('''
+            SELECT week_key, plan FROM meal_plans
+            WHERE week_key NOT IN (SELECT DISTINCT week_key FROM meal_plan_days)
+        ''').fetchall()
+        for row in missing:
+            write_plan_days(conn, row["week_key"], jsoncodec.loads(blob_codec.decode(row["plan"])))
 
 # Initialize database on startup
 init_db()
+response_cache = ResponseCache(db)
 
 def save_meal_plan(week_key: str, plan: dict):
-    plan_json = json.dumps(plan)
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT OR REPLACE INTO meal_plans (week_key, plan)
-        VALUES (?, ?)
-    ''', (week_key, plan_json))
-    conn.commit()
-    conn.close()
+    plan_json = jsoncodec.dumps(plan)
+    with db.connection() as conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO meal_plans (week_key, plan)
+            VALUES (?, ?)
+        ''', (week_key, blob_codec.encode(plan_json)))
+        write_plan_days(conn, week_key, plan)
+    # Write-through so readers never see the plan this call replaced
+    plan_cache.put(week_key, jsoncodec.loads(plan_json))
 
 def get_meal_plan(week_key: str):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('SELECT plan FROM meal_plans WHERE week_key = ?', (week_key,))
-    row = cursor.fetchone()
-    conn.close()
+    plan = plan_cache.get(week_key)
+    if plan is not MISSING:
+        return plan
+    generation = plan_cache.generation()
+    with db.connection() as conn:
+        row = conn.execute('SELECT plan FROM meal_plans WHERE week_key = ?', (week_key,)).fetchone()
+    plan = None if row is None else jsoncodec.loads(blob_codec.decode(row["plan"]))
+    plan_cache.put(week_key, plan, generation)
+    return plan
+
+def get_meal_plan_day(week_key: str, day: str):
+    """One day of a plan as {"plan": day_plan, "overview": goals}, read from its own row; None if missing."""
+    with db.connection() as conn:
+        row = conn.execute(
+            'SELECT plan, calorie_goal, protein_goal FROM meal_plan_days WHERE week_key = ? AND day = ?',
+            (week_key, day.lower())
+        ).fetchone()
     if row is None:
         return None
-    return json.loads(row["plan"])
+    return {
+        "plan": jsoncodec.loads(blob_codec.decode(row["plan"])),
+        "overview": {"calorie_goal": row["calorie_goal"], "protein_goal": row["protein_goal"]},
+    }
 
 def add_modification(week_key: str, modification: dict):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO modifications (week_key, timestamp, context, day, response)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (week_key, modification["timestamp"], modification.get("context"), modification.get("day"), modification["response"]))
-    conn.commit()
-    conn.close()
+    with db.connection() as conn:
+        conn.execute('''
+            INSERT INTO modifications (week_key, timestamp, context, day, response)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (week_key, modification["timestamp"], modification.get("context"), modification.get("day"), blob_codec.encode(modification["response"])))
 
 # ---------- Utility Functions ----------
 def get_week_key():
@@ -300,56 +357,117 @@ Here are some example meals to give you ideas:
 """
 
 # ---------- Anthropic API Call Functions ----------
-def call_claude(prompt, model="claude-3-5-sonnet-20241022", max_tokens=8000, temperature=0.7):
-    anthropic_api_key = os.environ.get("ANTHROPIC_API_KEY")
-    if not anthropic_api_key:
-        raise ValueError("ANTHROPIC_API_KEY environment variable not set")
-    client = anthropic.Anthropic(api_key=anthropic_api_key)
-    meal_plan_schema = {
+MEAL_PLAN_MODEL = "claude-3-5-sonnet-20241022"
+MEAL_PLAN_MAX_TOKENS = 8000
+MEAL_PLAN_TEMPERATURE = 0.7
+
+# One shared async client so LLM calls await on the event loop instead of
+# blocking it, and so HTTP connections are pooled across requests.
+_async_anthropic_client = None
+
+def get_async_anthropic_client():
+    global _async_anthropic_client
+    if _async_anthropic_client is None:
+        anthropic_api_key = os.environ.get("ANTHROPIC_API_KEY")
+        if not anthropic_api_key:
+            raise ValueError("ANTHROPIC_API_KEY environment variable not set")
+        _async_anthropic_client = anthropic.AsyncAnthropic(api_key=anthropic_api_key)
+    return _async_anthropic_client
+
+def get_meal_plan_tool():
+    return {
         "name": "generate_meal_plan",
         "description": "Generate a structured 7-day meal plan with daily meals, nutritional info, and portion sizes",
         "input_schema": get_meal_plan_schema()
     }
+
+def check_cache_mode(cache_mode):
+    if cache_mode not in CACHE_MODES:
+        raise HTTPException(status_code=400, detail=f"cache must be one of {', '.join(CACHE_MODES)}")
+
+def cached_response(key, cache_mode):
+    """Look up a cached LLM response unless the caller asked to skip the cache."""
+    if cache_mode != "use":
+        response_cache.bypasses += 1
+        return None
+    return response_cache.get(key)
+
+async def call_claude_tool(prompt, tool, model=MEAL_PLAN_MODEL, max_tokens=MEAL_PLAN_MAX_TOKENS, temperature=MEAL_PLAN_TEMPERATURE, cache_mode="use"):
+    """Call Claude with a single tool and return that tool's input; raises if it wasn't used."""
+    key = cache_key(model, prompt, tool, temperature, max_tokens)
+    cached = cached_response(key, cache_mode)
+    if cached is not None:
+        return cached
+    client = get_async_anthropic_client()
+    response = await client.messages.create(
+        model=model,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        messages=[{"role": "user", "content": prompt}],
+        tools=[tool],
+        tool_choice={"type": "tool", "name": tool["name"]}
+    )
+    for content in response.content:
+        if content.type == "tool_use" and content.name == tool["name"]:
+            if cache_mode != "bypass":
+                response_cache.put(key, content.input)
+            return content.input
+    raise ValueError(f"No {tool['name']} tool call found in the response")
+
+async def call_claude(prompt, model=MEAL_PLAN_MODEL, max_tokens=MEAL_PLAN_MAX_TOKENS, temperature=MEAL_PLAN_TEMPERATURE, cache_mode="use"):
     try:
-        response = client.messages.create(
-            model=model,
-            max_tokens=max_tokens,
-            temperature=temperature,
-            messages=[{"role": "user", "content": prompt}],
-            tools=[meal_plan_schema]
-        )
-        for content in response.content:
-            if content.type == "tool_use" and content.name == "generate_meal_plan":
-                return content.input
+        return await call_claude_tool(prompt, get_meal_plan_tool(), model, max_tokens, temperature, cache_mode)
+    except ValueError:
         return {"error": "No structured meal plan found in the response"}
     except Exception as e:
         return {"error": str(e)}
 
-def call_anthropic(prompt):
+async def stream_claude_tool_input(prompt, tool, model=MEAL_PLAN_MODEL, max_tokens=MEAL_PLAN_MAX_TOKENS, temperature=MEAL_PLAN_TEMPERATURE):
+    """Yield the tool call's input JSON as raw fragments while Claude generates it."""
+    client = get_async_anthropic_client()
+    stream = await client.messages.create(
+        model=model,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        messages=[{"role": "user", "content": prompt}],
+        tools=[tool],
+        tool_choice={"type": "tool", "name": tool["name"]},
+        stream=True
+    )
+    async for event in stream:
+        if event.type == "content_block_delta" and getattr(event.delta, "type", None) == "input_json_delta":
+            yield event.delta.partial_json
+
+async def call_anthropic(prompt, cache_mode="use"):
+    model = "claude-3-sonnet-20240229"
+    key = cache_key(model, prompt, None, 0.7, 1000)
+    cached = cached_response(key, cache_mode)
+    if cached is not None:
+        return cached
     try:
-        api_key = os.environ.get("ANTHROPIC_API_KEY")
-        if not api_key:
+        try:
+            client = get_async_anthropic_client()
+        except ValueError:
             return "ERROR: API key not configured."
-        client = anthropic.Client(api_key=api_key)
-        response = client.messages.create(
-            model="claude-3-sonnet-20240229",
+        response = await client.messages.create(
+            model=model,
             max_tokens=1000,
             temperature=0.7,
             messages=[{"role": "user", "content": prompt}]
         )
-        return response.content[0].text
+        text = response.content[0].text
+        if cache_mode != "bypass":
+            response_cache.put(key, text)
+        return text
     except Exception as e:
         print(f"Error calling Anthropic API: {str(e)}")
         return f"ERROR: {str(e)}"
 
 # ---------- Meal Plan Functions ----------
 def get_today_meal_plan():
-    week_key = get_week_key()
-    meal_plan = get_meal_plan(week_key)
-    if not meal_plan or "meal_plan" not in meal_plan or "daily_plans" not in meal_plan["meal_plan"]:
-        return None
     today = datetime.now().strftime("%A").lower()
-    return meal_plan["meal_plan"]["daily_plans"].get(today)
+    day = get_meal_plan_day(get_week_key(), today)
+    return day["plan"] if day else None
 
 def get_weekly_meal_plan():
     week_key = get_week_key()
@@ -358,12 +476,41 @@ def get_weekly_meal_plan():
         return None
     return meal_plan["meal_plan"]
 
-def generate_meal_plan():
+# Concurrent generations for the same week share one Claude call and save
+generation_flight = SingleFlight()
+
+# "single" asks for the whole week in one tool call; "fanout" generates a
+# skeleton and then every day concurrently (see plan_fanout.py)
+GENERATION_ENGINES = ("single", "fanout")
+
+async def generate_meal_plan(cache_mode="use", engine="single"):
+    # The root app has a single shared plan per week, so there is no user in the
+    # key; a bypass or fanout request must not be handed a cached single-call plan
+    key = (None, get_week_key(), engine, cache_mode)
+    return await generation_flight.do(key, lambda: _generate_and_save_meal_plan(cache_mode, engine))
+
+async def call_fanout(cache_mode):
+    async def call_tool(prompt, tool, max_tokens):
+        return await call_claude_tool(prompt, tool, max_tokens=max_tokens, cache_mode=cache_mode)
     try:
-        print("Starting meal plan generation...")
+        return await generate_fanout_plan(call_tool, get_meal_prompt(), get_meal_plan_schema())
+    except FanoutValidationError as e:
+        print(f"Error: {e}")
+        return {"error": "Invalid meal plan structure"}
+    except Exception as e:
+        return {"error": str(e)}
+
+async def _generate_and_save_meal_plan(cache_mode, engine):
+    try:
+        print(f"Starting meal plan generation ({engine})...")
+        started = time.perf_counter()
         
         print("Calling Claude API to generate meal plan...")
-        meal_plan = call_claude(get_meal_prompt())
+        if engine == "fanout":
+            meal_plan = await call_fanout(cache_mode)
+        else:
+            meal_plan = await call_claude(get_meal_prompt(), cache_mode=cache_mode)
+        elapsed_ms = round((time.perf_counter() - started) * 1000)
         
         if "error" in meal_plan:
             print(f"Error generating meal plan: {meal_plan['error']}")
@@ -386,9 +533,9 @@ def generate_meal_plan():
         # Save the meal plan
         week_key = get_week_key()
         save_meal_plan(week_key, meal_plan)
-        print("Meal plan saved successfully")
+        print(f"Meal plan saved successfully ({engine}, {elapsed_ms}ms)")
         
-        return {"status": "success", "plan": meal_plan}
+        return {"status": "success", "plan": meal_plan, "engine": engine, "elapsed_ms": elapsed_ms}
         
     except HTTPException:
         raise
@@ -397,6 +544,70 @@ def generate_meal_plan():
         print(f"Error traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Sections forwarded to streaming clients as soon as they are complete
+MEAL_PLAN_STREAM_SECTIONS = [
+    ("meal_plan", "overview"),
+    ("meal_plan", "daily_plans", "*"),
+    ("meal_plan", "meal_prep"),
+    ("meal_plan", "grocery_lists"),
+]
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {jsoncodec.dumps(data)}\n\n"
+
+async def replay_cached_plan(meal_plan):
+    yield jsoncodec.dumps(meal_plan)
+
+async def stream_meal_plan_events(cache_mode="use"):
+    """Generate a meal plan, emitting each finished section as a Server-Sent Event.
+
+    Emits `overview`, one `day` per entry in daily_plans, `meal_prep` and
+    `grocery_lists`, then `done` once the full plan is validated and saved,
+    or `error` if anything fails. A cached plan is replayed through the same
+    events without calling Claude.
+    """
+    schema = get_meal_plan_schema()
+    parser = IncrementalJSONParser(MEAL_PLAN_STREAM_SECTIONS)
+    prompt = get_meal_prompt()
+    tool = get_meal_plan_tool()
+    key = cache_key(MEAL_PLAN_MODEL, prompt, tool, MEAL_PLAN_TEMPERATURE, MEAL_PLAN_MAX_TOKENS)
+    try:
+        cached = cached_response(key, cache_mode)
+        if cached is None:
+            print("Streaming meal plan generation from Claude...")
+            fragments = stream_claude_tool_input(prompt, tool)
+        else:
+            fragments = replay_cached_plan(cached)
+        async for fragment in fragments:
+            for path, value in parser.feed(fragment):
+                section_schema = subschema(schema, path)
+                errors = validate(value, section_schema) if section_schema else [f"Unexpected section {'.'.join(path)}"]
+                if path[1] == "daily_plans":
+                    yield sse_event("day", {"day": path[2], "plan": value, "errors": errors})
+                else:
+                    yield sse_event(path[1], {path[1]: value, "errors": errors})
+
+        if not parser.buffer:
+            yield sse_event("error", {"detail": "No structured meal plan found in the response"})
+            return
+        meal_plan = parser.result()
+        errors = validate(meal_plan, schema)
+        if errors:
+            print(f"Streamed meal plan failed validation: {errors[:5]}")
+            yield sse_event("error", {"detail": "Invalid meal plan structure", "errors": errors})
+            return
+
+        if cached is None and cache_mode != "bypass":
+            response_cache.put(key, meal_plan)
+        week_key = get_week_key()
+        save_meal_plan(week_key, meal_plan)
+        print("Streamed meal plan saved successfully")
+        yield sse_event("done", {"status": "success", "week_key": week_key})
+    except Exception as e:
+        print(f"Unexpected error in stream_meal_plan_events: {str(e)}")
+        print(f"Error traceback: {traceback.format_exc()}")
+        yield sse_event("error", {"detail": str(e)})
+
 def process_plan_update(meal_plan, response, context, day=None):
     try:
         week_key = get_week_key()
@@ -412,30 +623,42 @@ def process_plan_update(meal_plan, response, context, day=None):
         print(f"Error processing plan update: {str(e)}")
         return False
 
+def format_day_totals(full_plan, day):
+    summary = summarize_plan(full_plan)
+    totals = summary["days"].get(day)
+    if not totals:
+        return "No macro data for this day."
+    line = (f"Protein: {totals['protein']:g}g, Carbs: {totals['carbs']:g}g, "
+            f"Fats: {totals['fats']:g}g, Calories: {totals['calories']:g}")
+    calorie_low, calorie_high = summary["goals"]["calories"]
+    if calorie_low is not None and totals["calorie_deviation"]:
+        direction = "over" if totals["calorie_deviation"] > 0 else "under"
+        line += f"\n{abs(totals['calorie_deviation']):g} kcal {direction} the {calorie_low:g}-{calorie_high:g} kcal goal"
+    protein_low, protein_high = summary["goals"]["protein"]
+    if protein_low is not None and totals["protein_deviation"]:
+        direction = "over" if totals["protein_deviation"] > 0 else "under"
+        line += f"\n{abs(totals['protein_deviation']):g}g protein {direction} the {protein_low:g}-{protein_high:g}g goal"
+    return line
+
 def build_today_prompt(today_plan, day, message, full_plan):
+    meals = []
+    for meal_name in MEALS:
+        meal = today_plan.get(meal_name)
+        if not isinstance(meal, dict):
+            continue
+        meals.append(
+            f"{meal_name.replace('_', ' ').upper()}:\n{meal.get('description', '')}\n"
+            f"Protein: {meal.get('protein')}g, Carbs: {meal.get('carbs')}g, Fats: {meal.get('fats')}g, Calories: {meal.get('calories')}"
+        )
+    meals_text = "\n\n".join(meals)
     prompt = f"""You are MAGI, an AI assistant for a meal planning application in the style of NERV terminals from Evangelion.
 
 Current meal plan for {day.capitalize()}:
 
-BREAKFAST:
-{today_plan['breakfast']['description']}
-Protein: {today_plan['breakfast']['protein']}g, Carbs: {today_plan['breakfast']['carbs']}g, Fats: {today_plan['breakfast']['fats']}g, Calories: {today_plan['breakfast']['calories']}
-
-AM SNACK:
-{today_plan['am_snack']['description']}
-Protein: {today_plan['am_snack']['protein']}g, Carbs: {today_plan['am_snack']['carbs']}g, Fats: {today_plan['am_snack']['fats']}g, Calories: {today_plan['am_snack']['calories']}
+{meals_text}
 
-LUNCH:
-{today_plan['lunch']['description']}
-Protein: {today_plan['lunch']['protein']}g, Carbs: {today_plan['lunch']['carbs']}g, Fats: {today_plan['lunch']['fats']}g, Calories: {today_plan['lunch']['calories']}
-
-PM SNACK:
-{today_plan['pm_snack']['description']}
-Protein: {today_plan['pm_snack']['protein']}g, Carbs: {today_plan['pm_snack']['carbs']}g, Fats: {today_plan['pm_snack']['fats']}g, Calories: {today_plan['pm_snack']['calories']}
-
-DINNER:
-{today_plan['dinner']['description']}
-Protein: {today_plan['dinner']['protein']}g, Carbs: {today_plan['dinner']['carbs']}g, Fats: {today_plan['dinner']['fats']}g, Calories: {today_plan['dinner']['calories']}
+DAY TOTALS:
+{format_day_totals(full_plan, day)}
 
 USER QUERY: {message}
 
@@ -502,34 +725,83 @@ def generate_otp():
 
 
 # ---------- FastAPI Application ----------
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 templates = Jinja2Templates(directory="templates")  # Optional if you use templates
 
 
+# Background generation jobs; job kinds map to the coroutine that runs them
+job_queue = JobQueue(db, {"generate_meal_plan": generate_meal_plan})
+
+# Login codes; OTP_STORE=sqlite shares them between workers
+otp_store = make_otp_store(db, OTP_EXPIRATION_MINUTES * 60)
+otp_purger = OTPPurger(otp_store)
+
+
+def rate_limit_identity(headers):
+    """user_id from a valid Bearer token, for per-user rate limit buckets."""
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    if not authorization.startswith("Bearer "):
+        return None
+    try:
+        return jwt.decode(authorization[7:], AUTH_SECRET_KEY, algorithms=[ALGORITHM]).get("user_id")
+    except jwt.PyJWTError:
+        return None
+
+
+# Throttle the Claude-backed and code-sending endpoints before they run
+rate_limiter = TokenBucketLimiter(db)
+if os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true":
+    otp_limit = RouteLimit(per_ip=env_rate("RATE_LIMIT_OTP_IP", "5/minute"))
+    app.add_middleware(
+        RateLimitMiddleware,
+        limits={
+            # Also covers /api/generate/stream, which takes GET as well as POST
+            "/api/generate": RouteLimit(
+                per_user=env_rate("RATE_LIMIT_GENERATE_USER", "10/hour"),
+                per_ip=env_rate("RATE_LIMIT_GENERATE_IP", "10/hour"),
+                methods=("GET", "POST"),
+            ),
+            "/api/chat": RouteLimit(
+                per_user=env_rate("RATE_LIMIT_CHAT_USER", "60/hour"),
+                per_ip=env_rate("RATE_LIMIT_CHAT_IP", "30/hour"),
+            ),
+            "/auth/request-otp": otp_limit,
+            "/auth/verify-otp": otp_limit,
+        },
+        limiter=rate_limiter,
+        identify=rate_limit_identity,
+    )
+
+
+@app.on_event("startup")
+async def start_job_queue():
+    await job_queue.start()
+    await otp_purger.start()
+    await rate_limiter.start()
+
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
+    await otp_purger.stop()
+    await rate_limiter.stop()
+
+
+@app.on_event("shutdown")
+def close_db_pool():
+    db.close_all()
+
+
 @app.post("/auth/request-otp")
 def request_otp(data: RequestOTP):
     phone = data.phone
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     # Create a user record if it doesn't exist
-    cursor.execute("SELECT * FROM users WHERE phone = ?", (phone,))
-    user = cursor.fetchone()
-    if not user:
-        cursor.execute("INSERT INTO users (phone) VALUES (?)", (phone,))
-        conn.commit()  # commit the new user
-    
-    # Generate OTP and store it
+    with db.connection() as conn:
+        conn.execute("INSERT OR IGNORE INTO users (phone) VALUES (?)", (phone,))
+
     otp = generate_otp()
-    expires_at = datetime.utcnow() + timedelta(minutes=OTP_EXPIRATION_MINUTES)
-    cursor.execute(
-        "INSERT INTO otps (phone, otp, expires_at) VALUES (?, ?, ?)",
-        (phone, otp, expires_at.isoformat())
-    )
-    conn.commit()
-    conn.close()
-    
+    otp_store.issue(phone, otp)
     send_sms(phone, otp)  # Replace this with actual SMS sending in production
     return {"message": "OTP sent"}
 
@@ -537,31 +809,18 @@ def request_otp(data: RequestOTP):
 @app.post("/auth/verify-otp", response_model=Token)
 def verify_otp(data: VerifyOTP):
     phone = data.phone
-    otp = data.otp
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM otps WHERE phone = ? AND otp = ? AND used = 0", (phone, otp))
-    row = cursor.fetchone()
-    if not row:
-        conn.close()
-        raise HTTPException(status_code=400, detail="Invalid OTP")
-    
-    expires_at = datetime.fromisoformat(row["expires_at"])
-    if datetime.utcnow() > expires_at:
-        conn.close()
+    result = otp_store.verify(phone, data.otp)
+    if result == EXPIRED:
         raise HTTPException(status_code=400, detail="OTP expired")
-    
-    cursor.execute("UPDATE otps SET used = 1 WHERE id = ?", (row["id"],))
-    cursor.execute("SELECT * FROM users WHERE phone = ?", (phone,))
-    user = cursor.fetchone()
-    if not user:
-        cursor.execute("INSERT INTO users (phone) VALUES (?)", (phone,))
-        conn.commit()
-        user_id = cursor.lastrowid
-    else:
-        user_id = user["id"]
-    conn.commit()
-    conn.close()
+    if result != VALID:
+        raise HTTPException(status_code=400, detail="Invalid OTP")
+
+    with db.connection() as conn:
+        user = conn.execute("SELECT id FROM users WHERE phone = ?", (phone,)).fetchone()
+        if user:
+            user_id = user["id"]
+        else:
+            user_id = conn.execute("INSERT INTO users (phone) VALUES (?)", (phone,)).lastrowid
     
     payload = {
         "sub": phone,
@@ -587,6 +846,20 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(http_be
 def get_profile(current_user: dict = Depends(get_current_user)):
     return {"phone": current_user["sub"], "user_id": current_user["user_id"]}
 
+@app.get("/api/metrics")
+def api_metrics():
+    return {
+        "db_pool": db.stats(),
+        "plan_cache": plan_cache.stats(),
+        "llm_cache": response_cache.stats(),
+        "blob_codec": blob_codec.stats(),
+        "json_codec": jsoncodec.BACKEND,
+        "jobs": job_queue.stats(),
+        "otp_store": otp_store.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "generation_flight": generation_flight.stats()
+    }
+
 
 
 
@@ -627,47 +900,61 @@ def api_weekly():
         print(f"Error traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/today")
-def api_today():
+@app.get("/api/stats")
+def api_stats():
     try:
         week_key = get_week_key()
-        today = datetime.now().strftime("%A").lower()
         meal_plan = get_meal_plan(week_key)
-        if not meal_plan or "meal_plan" not in meal_plan or "daily_plans" not in meal_plan["meal_plan"]:
+        if not meal_plan or "meal_plan" not in meal_plan:
             raise HTTPException(status_code=404, detail="No meal plan found")
-        if today not in meal_plan["meal_plan"]["daily_plans"]:
+        return {"status": "success", "week_key": week_key, "stats": summarize_plan(meal_plan)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/today")
+def api_today():
+    try:
+        today = datetime.now().strftime("%A").lower()
+        today_plan = get_today_meal_plan()
+        if today_plan is None:
             raise HTTPException(status_code=404, detail=f"No meal plan found for {today}")
-        today_plan = meal_plan["meal_plan"]["daily_plans"][today]
         return {"status": "success", "plan": today_plan}
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/chat")
-def api_chat(data: dict):
+async def api_chat(data: dict):
     try:
         if "message" not in data:
             raise HTTPException(status_code=400, detail="No message provided")
         message = data["message"]
         context = data.get("context", "general")
+        cache_mode = data.get("cache", "use")
+        check_cache_mode(cache_mode)
         week_key = get_week_key()
-        meal_plan = get_meal_plan(week_key)
-        if not meal_plan:
-            raise HTTPException(status_code=404, detail="No meal plan found")
-        if "meal_plan" not in meal_plan:
-            raise HTTPException(status_code=500, detail="Invalid meal plan structure")
         today = datetime.now().strftime("%A").lower()
-        if today not in meal_plan["meal_plan"]["daily_plans"]:
+        day = get_meal_plan_day(week_key, today)
+        if day is None:
             raise HTTPException(status_code=404, detail=f"No meal plan found for {today}")
-        today_plan = meal_plan["meal_plan"]["daily_plans"][today]
-        prompt = build_today_prompt(today_plan, today, message, meal_plan["meal_plan"])
-        response = call_anthropic(prompt)
+        today_plan = day["plan"]
+        # build_today_prompt only needs this day and the goals
+        day_view = {"overview": day["overview"], "daily_plans": {today: today_plan}}
+        prompt = build_today_prompt(today_plan, today, message, day_view)
+        response = await call_anthropic(prompt, cache_mode=cache_mode)
         print("Recieved update from anthropic")
         plan_updated = False
         if "PLAN_UPDATE:" in response:
-            plan_updated = process_plan_update(meal_plan, response, context, today if context=="today" else None)
+            plan_updated = process_plan_update(day_view, response, context, today if context=="today" else None)
             response = response.replace("PLAN_UPDATE:", "").strip()
         return {"status": "success", "message": response, "plan_updated": plan_updated}
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
@@ -677,22 +964,19 @@ async def request_otp(phone_number: str):
     try:
         # In a real application, you would send an OTP via SMS
         # For development, we'll just create a user and return a token
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Check if user exists
-        cursor.execute("SELECT user_id FROM users WHERE phone_number = ?", (phone_number,))
-        user = cursor.fetchone()
-        
-        if not user:
-            # Create new user
-            cursor.execute("INSERT INTO users (phone_number) VALUES (?)", (phone_number,))
-            user_id = cursor.lastrowid
-            conn.commit()
-        else:
-            user_id = user["user_id"]
-        
-        conn.close()
+        with db.connection() as conn:
+            cursor = conn.cursor()
+            
+            # Check if user exists
+            cursor.execute("SELECT user_id FROM users WHERE phone_number = ?", (phone_number,))
+            user = cursor.fetchone()
+            
+            if not user:
+                # Create new user
+                cursor.execute("INSERT INTO users (phone_number) VALUES (?)", (phone_number,))
+                user_id = cursor.lastrowid
+            else:
+                user_id = user["user_id"]
         
         # Create access token
         access_token = create_access_token({"user_id": user_id})
@@ -710,17 +994,12 @@ async def verify_otp(phone_number: str, otp: str):
     try:
         # In a real application, you would verify the OTP
         # For development, we'll just return a token
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT user_id FROM users WHERE phone_number = ?", (phone_number,))
-        user = cursor.fetchone()
+        with db.connection() as conn:
+            user = conn.execute("SELECT user_id FROM users WHERE phone_number = ?", (phone_number,)).fetchone()
         
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        conn.close()
-        
         # Create access token
         access_token = create_access_token({"user_id": user["user_id"]})
         
@@ -733,44 +1012,53 @@ async def verify_otp(phone_number: str, otp: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/generate")
-async def generate_meal_plan_endpoint():
-    try:
-        print("Starting meal plan generation...")
-        
-        print("Calling Claude API to generate meal plan...")
-        meal_plan = call_claude(get_meal_prompt())
-        
-        if "error" in meal_plan:
-            print(f"Error generating meal plan: {meal_plan['error']}")
-            raise HTTPException(status_code=500, detail=meal_plan["error"])
-        
-        # Validate meal plan structure
-        if not isinstance(meal_plan, dict):
-            print("Error: Meal plan is not a dictionary")
-            raise HTTPException(status_code=500, detail="Invalid meal plan format")
-        
-        if "meal_plan" not in meal_plan:
-            print("Error: No 'meal_plan' key in response")
-            raise HTTPException(status_code=500, detail="Invalid meal plan structure")
-        
-        if "daily_plans" not in meal_plan["meal_plan"]:
-            print("Error: No 'daily_plans' key in meal plan")
-            raise HTTPException(status_code=500, detail="Invalid meal plan structure")
-        
-        print("Meal plan generated successfully, saving to database...")
-        # Save the meal plan
-        week_key = get_week_key()
-        save_meal_plan(week_key, meal_plan)
-        print("Meal plan saved successfully")
-        
-        return {"status": "success", "plan": meal_plan}
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"Unexpected error in generate_meal_plan: {str(e)}")
-        print(f"Error traceback: {traceback.format_exc()}")
-        raise HTTPException(status_code=500, detail=str(e))
+async def generate_meal_plan_endpoint(cache: str = "use", background: bool = False, engine: str = "single"):
+    check_cache_mode(cache)
+    if engine not in GENERATION_ENGINES:
+        raise HTTPException(status_code=400, detail=f"engine must be one of {', '.join(GENERATION_ENGINES)}")
+    if background:
+        job_id = job_queue.enqueue("generate_meal_plan", {"cache_mode": cache, "engine": engine})
+        return JSONResponse(status_code=202, content={"status": "queued", "job_id": job_id})
+    return await generate_meal_plan(cache_mode=cache, engine=engine)
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """Poll a background job. With `wait`, long-poll up to that many seconds for a state change."""
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if wait > 0 and job["status"] not in TERMINAL_STATUSES:
+        job = await job_queue.wait(job_id, min(wait, 60))
+    return job
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Push job status changes as Server-Sent Events until the job finishes."""
+    if job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        job = job_queue.get(job_id)
+        yield sse_event("status", job)
+        while job["status"] not in TERMINAL_STATUSES:
+            # Re-sends the current status every 15s as a keep-alive
+            job = await job_queue.wait(job_id, 15)
+            yield sse_event("status", job)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.api_route("/api/generate/stream", methods=["GET", "POST"])
+async def generate_meal_plan_stream_endpoint(cache: str = "use"):
+    check_cache_mode(cache)
+    return StreamingResponse(
+        stream_meal_plan_events(cache_mode=cache),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 # ---------- Run the Application ----------
 # Use: uvicorn main:app --host 0.0.0.0 --port 8080
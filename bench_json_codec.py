@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Time encoding and decoding a weekly plan with every installed JSON backend.
+Usage: python bench_json_codec.py [--rounds N] [--plan meal_plan_2025-03-09.json]
+
+The encode column is what save_meal_plan and every API response pay, the
+decode column what every plan cache miss pays. Set JSON_CODEC to pin the
+server to one backend; by default it uses the fastest one installed.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+from jsoncodec import BACKENDS, BACKEND, _available, make_codec
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def timed(fn, rounds):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--plan", default=os.path.join(ROOT, "meal_plan_2025-03-09.json"))
+    args = parser.parse_args()
+
+    with open(args.plan) as f:
+        plan = json.load(f)
+
+    results = {}
+    for backend in BACKENDS:
+        if not _available(backend):
+            print(f"{backend:<8} not installed")
+            continue
+        dumps_bytes, loads = make_codec(backend)
+        encoded = dumps_bytes(plan)
+        assert loads(encoded) == plan
+        results[backend] = (
+            timed(lambda: dumps_bytes(plan), args.rounds),
+            timed(lambda: loads(encoded), args.rounds),
+        )
+
+    stdlib_encode, stdlib_decode = results["stdlib"]
+    print(f"Plan: {len(json.dumps(plan))} bytes, {args.rounds} rounds, server default: {BACKEND}")
+    for backend, (encode, decode) in results.items():
+        print(
+            f"{backend:<8} encode p50 {encode:7.1f}us ({stdlib_encode / encode:4.1f}x)  "
+            f"decode p50 {decode:7.1f}us ({stdlib_decode / decode:4.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
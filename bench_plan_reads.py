@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Compare the two ways /api/today and /api/chat can read one day of a plan:
+decoding the weekly blob from meal_plans, or the single meal_plan_days row.
+Usage: python bench_plan_reads.py [--weeks N] [--reads N] [--plan meal_plan_2025-03-09.json]
+
+Runs against a throwaway database in a temp directory. The plan cache is
+cleared before every blob read, since a cache hit hides the decode cost
+the day rows are there to avoid (cold caches, other workers, restarts).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+
+def timed(fn, reads):
+    samples = []
+    for i in range(reads):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def report(name, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{name:<28} mean {statistics.mean(samples):8.1f}us  p50 {statistics.median(samples):8.1f}us  p95 {p95:8.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weeks", type=int, default=200)
+    parser.add_argument("--reads", type=int, default=5000)
+    parser.add_argument("--plan", default=os.path.join(ROOT, "meal_plan_2025-03-09.json"))
+    args = parser.parse_args()
+
+    with open(args.plan) as f:
+        plan = json.load(f)
+
+    os.environ.setdefault("AUTH_SECRET_KEY", "bench")
+    os.environ.setdefault("ANTHROPIC_API_KEY", "bench")
+    sys.path.insert(0, ROOT)
+    workdir = tempfile.mkdtemp(prefix="bench_plan_reads_")
+    os.chdir(workdir)  # app.py opens meal_plans.db relative to the cwd
+    import app
+
+    monday = date(2025, 3, 10)
+    week_keys = [(monday - timedelta(weeks=i)).strftime("%Y-%m-%d") for i in range(args.weeks)]
+    for week_key in week_keys:
+        app.save_meal_plan(week_key, plan)
+    blob_bytes = len(json.dumps(plan))
+    day_bytes = len(json.dumps(plan["meal_plan"]["daily_plans"]["monday"]))
+    print(f"{args.weeks} weeks saved in {workdir}; blob {blob_bytes} bytes, one day {day_bytes} bytes")
+
+    def blob_read(i):
+        app.plan_cache.clear()
+        meal_plan = app.get_meal_plan(week_keys[i % len(week_keys)])
+        return meal_plan["meal_plan"]["daily_plans"][DAYS[i % 7]]
+
+    def day_read(i):
+        return app.get_meal_plan_day(week_keys[i % len(week_keys)], DAYS[i % 7])["plan"]
+
+    assert blob_read(3) == day_read(3)
+    blob = timed(blob_read, args.reads)
+    day = timed(day_read, args.reads)
+    report("weekly blob (uncached)", blob)
+    report("meal_plan_days row", day)
+    print(f"Speedup: {statistics.mean(blob) / statistics.mean(day):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import os
+import struct
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # optional; zlib is always available
+    zstandard = None
+
+# ---------- Compressed Blob Storage ----------
+# Weekly plans and LLM replies are stored as JSON text, which is mostly
+# repeated keys and phrasing and compresses 4-10x. Encoded values are bytes
+# (stored as SQLite BLOBs in the existing TEXT columns) with a small header:
+#
+#   MAGIC (4 bytes) | algorithm (1 byte) | dictionary id (uint32, 0 = none) | payload
+#
+# Anything without the header, including every row written before this
+# existed, is returned as-is, so old and new rows mix freely and compression
+# can be switched on or off at any time. Dictionaries trained on existing
+# plans are kept in the blob_dictionaries table; rows name the dictionary
+# they were written with, so retraining never strands old rows.
+
+MAGIC = b"\x00BZ1"
+HEADER = struct.Struct(">4scI")
+ALGORITHMS = ("none", "zlib", "zstd")
+_ALGORITHM_BYTES = {"zlib": b"z", "zstd": b"s"}
+_BYTE_ALGORITHMS = {v: k for k, v in _ALGORITHM_BYTES.items()}
+
+# zlib can only look back 32KB, so a longer preset dictionary is wasted
+ZLIB_MAX_DICTIONARY = 32 * 1024
+DEFAULT_DICTIONARY_SIZE = 32 * 1024
+
+
+class BlobCodecError(Exception):
+    pass
+
+
+def check_algorithm(algorithm):
+    if algorithm not in ALGORITHMS:
+        raise BlobCodecError(f"Unknown compression {algorithm!r}, expected one of {', '.join(ALGORITHMS)}")
+    if algorithm == "zstd" and zstandard is None:
+        raise BlobCodecError("BLOB_COMPRESSION=zstd needs the zstandard package (pip install zstandard)")
+
+
+def train_dictionary(algorithm, samples, size=DEFAULT_DICTIONARY_SIZE):
+    """Build a compression dictionary from sample texts (e.g. existing plans)."""
+    check_algorithm(algorithm)
+    encoded = [s.encode("utf-8") if isinstance(s, str) else s for s in samples if s]
+    if algorithm == "zstd":
+        return zstandard.train_dictionary(size, encoded).as_bytes()
+    if algorithm == "zlib":
+        # A zlib preset dictionary is just text that later data can reference;
+        # the end of it is cheapest to reference, so put the newest samples last
+        data = b"".join(encoded)
+        return data[-min(size, ZLIB_MAX_DICTIONARY):]
+    raise BlobCodecError("Nothing to train without compression")
+
+
+class BlobCodec:
+    """Encodes and decodes blobs. loader(dictionary_id) -> (algorithm, data) or
+    None fetches a dictionary this process hasn't seen, e.g. one trained by
+    recompress_blobs.py while the server was running."""
+
+    def __init__(self, algorithm=None, level=None, loader=None):
+        self.algorithm = (algorithm or os.environ.get("BLOB_COMPRESSION", "none")).lower()
+        check_algorithm(self.algorithm)
+        default_level = "3" if self.algorithm == "zstd" else "6"
+        self.level = int(level if level is not None else os.environ.get("BLOB_COMPRESSION_LEVEL", default_level))
+        self._dictionaries = {}  # id -> (algorithm, bytes)
+        self._zstd_dictionaries = {}  # id -> ZstdCompressionDict
+        self.active_dictionary_id = 0
+        self.loader = loader
+        self._lock = threading.Lock()
+        self.encoded = 0
+        self.stored_raw = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.decoded = 0
+        self.decode_ms = 0.0
+
+    # ---- dictionaries ----
+
+    def add_dictionary(self, dictionary_id, algorithm, data, activate=True):
+        with self._lock:
+            self._dictionaries[dictionary_id] = (algorithm, bytes(data))
+            if algorithm == "zstd" and zstandard is not None:
+                self._zstd_dictionaries[dictionary_id] = zstandard.ZstdCompressionDict(bytes(data))
+            if activate and algorithm == self.algorithm:
+                self.active_dictionary_id = dictionary_id
+
+    def _dictionary(self, dictionary_id, algorithm):
+        entry = self._dictionaries.get(dictionary_id)
+        if entry is None and self.loader is not None:
+            # Not active: rows already written with the current one stay readable
+            loaded = self.loader(dictionary_id)
+            if loaded is not None:
+                self.add_dictionary(dictionary_id, *loaded, activate=False)
+                entry = self._dictionaries[dictionary_id]
+        if entry is None or entry[0] != algorithm:
+            raise BlobCodecError(f"Blob needs {algorithm} dictionary {dictionary_id}, which is not loaded")
+        return entry[1]
+
+    # ---- encode/decode ----
+
+    def encode(self, text):
+        """Compress text for storage; returns text unchanged when compression is off or doesn't help."""
+        if text is None or self.algorithm == "none":
+            return text
+        raw = text.encode("utf-8")
+        dictionary_id = self.active_dictionary_id
+        if self.algorithm == "zstd":
+            options = {"level": self.level}
+            if dictionary_id:
+                options["dict_data"] = self._zstd_dictionaries[dictionary_id]
+            payload = zstandard.ZstdCompressor(**options).compress(raw)
+        else:
+            options = {"zdict": self._dictionary(dictionary_id, "zlib")} if dictionary_id else {}
+            compressor = zlib.compressobj(self.level, **options)
+            payload = compressor.compress(raw) + compressor.flush()
+        blob = HEADER.pack(MAGIC, _ALGORITHM_BYTES[self.algorithm], dictionary_id) + payload
+        self.bytes_in += len(raw)
+        if len(blob) >= len(raw):
+            self.stored_raw += 1
+            self.bytes_out += len(raw)
+            return text
+        self.encoded += 1
+        self.bytes_out += len(blob)
+        return blob
+
+    def decode(self, value):
+        """Return the stored text, decompressing if it was written by encode()."""
+        if value is None or isinstance(value, str):
+            return value
+        value = bytes(value)
+        if not value.startswith(MAGIC):
+            return value.decode("utf-8")
+        start = time.perf_counter()
+        _, algorithm_byte, dictionary_id = HEADER.unpack_from(value)
+        algorithm = _BYTE_ALGORITHMS.get(algorithm_byte)
+        payload = value[HEADER.size:]
+        if algorithm == "zstd":
+            if zstandard is None:
+                raise BlobCodecError("Blob is zstd-compressed but the zstandard package is not installed")
+            options = {}
+            if dictionary_id:
+                self._dictionary(dictionary_id, "zstd")
+                options["dict_data"] = self._zstd_dictionaries[dictionary_id]
+            raw = zstandard.ZstdDecompressor(**options).decompress(payload)
+        elif algorithm == "zlib":
+            options = {"zdict": self._dictionary(dictionary_id, "zlib")} if dictionary_id else {}
+            decompressor = zlib.decompressobj(**options)
+            raw = decompressor.decompress(payload) + decompressor.flush()
+        else:
+            raise BlobCodecError(f"Unknown blob algorithm byte {algorithm_byte!r}")
+        self.decoded += 1
+        self.decode_ms += (time.perf_counter() - start) * 1000
+        return raw.decode("utf-8")
+
+    def stats(self):
+        return {
+            "algorithm": self.algorithm,
+            "level": self.level,
+            "dictionary_id": self.active_dictionary_id,
+            "encoded": self.encoded,
+            "stored_raw": self.stored_raw,
+            "ratio": round(self.bytes_in / self.bytes_out, 2) if self.bytes_out else None,
+            "decoded": self.decoded,
+            "avg_decode_ms": round(self.decode_ms / self.decoded, 4) if self.decoded else 0.0,
+        }
+
+
+# ---------- SQLite dictionary storage ----------
+
+def init_dictionary_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS blob_dictionaries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            algorithm TEXT NOT NULL,
+            data BLOB NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def load_dictionaries(conn, codec):
+    """Register every stored dictionary; the newest one for the codec's algorithm becomes active."""
+    for row in conn.execute("SELECT id, algorithm, data FROM blob_dictionaries ORDER BY id"):
+        codec.add_dictionary(row["id"], row["algorithm"], row["data"])
+
+
+def fetch_dictionary(conn, dictionary_id):
+    row = conn.execute("SELECT algorithm, data FROM blob_dictionaries WHERE id = ?", (dictionary_id,)).fetchone()
+    return None if row is None else (row["algorithm"], row["data"])
+
+
+def dictionary_loader(db):
+    """A BlobCodec loader reading blob_dictionaries through an SQLitePool."""
+    def load(dictionary_id):
+        with db.connection() as conn:
+            return fetch_dictionary(conn, dictionary_id)
+    return load
+
+
+def save_dictionary(conn, codec, data):
+    cursor = conn.execute(
+        "INSERT INTO blob_dictionaries (algorithm, data) VALUES (?, ?)", (codec.algorithm, data)
+    )
+    codec.add_dictionary(cursor.lastrowid, codec.algorithm, data)
+    return cursor.lastrowid
@@ -0,0 +1,194 @@
+import asyncio
+import os
+import time
+import traceback
+import uuid
+
+from fastapi import HTTPException
+
+import jsoncodec
+
+# ---------- Background Job Queue ----------
+# Long-running work (meal plan generation) runs on a bounded pool of asyncio
+# workers instead of inside the HTTP request. Job state lives in the jobs
+# table, so anything queued or interrupted mid-run is picked up again after
+# a restart. Finished jobs keep their result for JOB_RETENTION seconds (so
+# clients can still poll them) and are then swept away.
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+
+class JobQueue:
+    def __init__(self, db, handlers, workers=None, max_pending=None, retention=None, sweep_interval=None):
+        """handlers maps a job kind to an async callable taking the job's params as kwargs;
+        retention (seconds, 0 keeps everything) is how long finished jobs are kept."""
+        self.db = db
+        self.handlers = handlers
+        self.workers = int(workers if workers is not None else os.environ.get("JOB_WORKERS", "2"))
+        self.max_pending = int(max_pending if max_pending is not None else os.environ.get("JOB_MAX_PENDING", "100"))
+        self.retention = float(retention if retention is not None else os.environ.get("JOB_RETENTION", str(7 * 86400)))
+        self.sweep_interval = float(
+            sweep_interval if sweep_interval is not None else os.environ.get("JOB_SWEEP_INTERVAL", "3600")
+        )
+        self.swept = 0
+        self._queue = None
+        self._tasks = []
+        self._waiters = {}  # job id -> [asyncio.Future]
+        self._init_table()
+
+    def _init_table(self):
+        with self.db.connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_updated ON jobs (status, updated_at)")
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        # Anything left running when the process died never finished; run it again
+        with self.db.connection() as conn:
+            conn.execute("UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running'", (time.time(),))
+            rows = conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at").fetchall()
+        for row in rows:
+            self._queue.put_nowait(row["id"])
+        if rows:
+            print(f"Recovered {len(rows)} queued job(s)")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.retention > 0:
+            self._tasks.append(asyncio.create_task(self._sweeper()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def enqueue(self, kind, params=None):
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self._queue is None:
+            raise HTTPException(status_code=503, detail="Job queue is not running")
+        if self._queue.qsize() >= self.max_pending:
+            raise HTTPException(status_code=503, detail="Too many pending jobs, try again later")
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self.db.connection() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, params, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (job_id, kind, jsoncodec.dumps(params or {}), now, now)
+            )
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    def get(self, job_id):
+        with self.db.connection() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "result": jsoncodec.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    async def wait(self, job_id, timeout):
+        """Block until the job changes state (or timeout), then return it."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(job_id, []).append(future)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            waiters = self._waiters.get(job_id, [])
+            if future in waiters:
+                waiters.remove(future)
+            if not waiters:
+                self._waiters.pop(job_id, None)
+        return self.get(job_id)
+
+    def _set_status(self, job_id, status, result=None, error=None):
+        with self.db.connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, jsoncodec.dumps(result) if result is not None else None, error, time.time(), job_id)
+            )
+        for future in self._waiters.pop(job_id, []):
+            if not future.done():
+                future.set_result(status)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id):
+        with self.db.connection() as conn:
+            row = conn.execute("SELECT kind, params, status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row["status"] != "queued":
+            return
+        self._set_status(job_id, "running")
+        try:
+            result = await self.handlers[row["kind"]](**jsoncodec.loads(row["params"]))
+        except asyncio.CancelledError:
+            # Shutting down: leave the job for the next process to pick up
+            raise
+        except HTTPException as e:
+            self._set_status(job_id, "failed", error=str(e.detail))
+        except Exception as e:
+            print(f"Job {job_id} failed: {str(e)}")
+            print(f"Error traceback: {traceback.format_exc()}")
+            self._set_status(job_id, "failed", error=str(e))
+        else:
+            self._set_status(job_id, "succeeded", result=result)
+
+    def sweep(self):
+        """Delete succeeded and failed jobs last updated more than retention seconds ago."""
+        placeholders = ", ".join("?" * len(TERMINAL_STATUSES))
+        with self.db.connection() as conn:
+            cursor = conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({placeholders}) AND updated_at < ?",
+                (*TERMINAL_STATUSES, time.time() - self.retention)
+            )
+        self.swept += cursor.rowcount
+        return cursor.rowcount
+
+    async def _sweeper(self):
+        # Once at startup, then every sweep_interval
+        while True:
+            try:
+                removed = await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                print(f"Job sweep failed: {e}")
+            else:
+                if removed:
+                    print(f"Swept {removed} finished job(s)")
+            await asyncio.sleep(self.sweep_interval)
+
+    def stats(self):
+        with self.db.connection() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {
+            "workers": self.workers,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "retention": self.retention,
+            "swept": self.swept,
+            "by_status": {row["status"]: row["n"] for row in rows},
+        }
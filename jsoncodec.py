@@ -0,0 +1,70 @@
+import json
+import os
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# ---------- JSON Codec ----------
+# Plans are serialized on every save, parsed on every cache miss and
+# serialized again into every API response. orjson and msgspec do both
+# several times faster than the stdlib; this picks the fastest one that is
+# installed (or the one named by JSON_CODEC) so the rest of the app calls
+# dumps/loads without caring which. The stdlib is always the fallback.
+
+BACKENDS = ("orjson", "msgspec", "stdlib")
+
+
+def _available(backend):
+    return {"orjson": orjson, "msgspec": msgspec, "stdlib": json}[backend] is not None
+
+
+def _pick_backend(requested):
+    requested = (requested or "auto").lower()
+    if requested == "auto":
+        return next(backend for backend in BACKENDS if _available(backend))
+    if requested not in BACKENDS:
+        raise ValueError(f"Unknown JSON_CODEC {requested!r}, expected auto or one of {', '.join(BACKENDS)}")
+    if not _available(requested):
+        raise ValueError(f"JSON_CODEC={requested} but the {requested} package is not installed")
+    return requested
+
+
+def _stdlib_dumps_bytes(obj):
+    # Same output settings as Starlette's JSONResponse
+    return json.dumps(obj, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def make_codec(backend):
+    """(dumps_bytes, loads) for a backend; loads accepts str or bytes."""
+    if backend == "orjson":
+        # Plan dicts are str-keyed, but job params and metrics may not be
+        return (lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)), orjson.loads
+    if backend == "msgspec":
+        encoder, decoder = msgspec.json.Encoder(), msgspec.json.Decoder()
+        return encoder.encode, decoder.decode
+    return _stdlib_dumps_bytes, json.loads
+
+
+BACKEND = _pick_backend(os.environ.get("JSON_CODEC"))
+dumps_bytes, loads = make_codec(BACKEND)
+
+
+def dumps(obj):
+    """Serialize to str, for TEXT columns and SSE frames."""
+    return dumps_bytes(obj).decode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with the configured codec; the app's default response class."""
+
+    def render(self, content):
+        return dumps_bytes(content)
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import jsoncodec
+
+# ---------- LLM Response Cache ----------
+# Content-addressed cache for Claude responses, keyed on the model, prompt,
+# tool schema and sampling parameters. Hot entries live in an in-process LRU;
+# everything is also written to an llm_cache table so entries survive
+# restarts and are shared between worker processes.
+
+CACHE_MODES = ("use", "bypass", "refresh")
+
+
+def _sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def cache_key(model, prompt, tool_schema=None, temperature=None, max_tokens=None):
+    schema_hash = _sha256(json.dumps(tool_schema, sort_keys=True)) if tool_schema is not None else "-"
+    parts = [model, _sha256(prompt), schema_hash, repr(temperature), repr(max_tokens)]
+    return _sha256("|".join(parts))
+
+
+class ResponseCache:
+    def __init__(self, db, maxsize=None, ttl=None, max_disk_entries=None):
+        self.db = db
+        self.maxsize = int(maxsize if maxsize is not None else os.environ.get("LLM_CACHE_SIZE", "128"))
+        self.ttl = float(ttl if ttl is not None else os.environ.get("LLM_CACHE_TTL", str(24 * 60 * 60)))
+        self.max_disk_entries = int(max_disk_entries if max_disk_entries is not None else os.environ.get("LLM_CACHE_DISK_MAX", "5000"))
+        self._memory = OrderedDict()  # key -> (expires_at, value_json)
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.bypasses = 0
+        self._init_table()
+
+    def _init_table(self):
+        with self.db.connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache (created_at)")
+
+    def _remember(self, key, expires_at, value_json):
+        with self._lock:
+            self._memory[key] = (expires_at, value_json)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached value or None. Values are decoded fresh on every hit."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] < now:
+                del self._memory[key]
+                entry = None
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return jsoncodec.loads(entry[1])
+
+        with self.db.connection() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.disk_hits += 1
+        self._remember(key, row["expires_at"], row["value"])
+        return jsoncodec.loads(row["value"])
+
+    def put(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl
+        value_json = jsoncodec.dumps(value)
+        self._remember(key, expires_at, value_json)
+        with self.db.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                (key, value_json, now, expires_at)
+            )
+            self._puts += 1
+            if self._puts % 50 == 0:
+                self._trim(conn, now)
+        self.writes += 1
+
+    def _trim(self, conn, now):
+        conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+        conn.execute('''
+            DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM llm_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_disk_entries,))
+
+    def stats(self):
+        with self._lock:
+            memory_size = len(self._memory)
+        with self.db.connection() as conn:
+            disk_size = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return {
+            "memory_size": memory_size,
+            "disk_size": disk_size,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "bypasses": self.bypasses,
+            "ttl": self.ttl,
+        }
@@ -0,0 +1,216 @@
+import math
+import re
+
+import numpy as np
+
+# ---------- Vectorized Macro Aggregation ----------
+# Meal plans are nested dicts (days x meals x nutrients). Consumers used to
+# walk them by hand for every total; this packs a plan into a float array of
+# shape (7 days, 5 meals, 4 nutrients) once, with NaN for anything missing,
+# and computes totals, averages, goal deviations and the 4/4/9 kcal check as
+# array operations. Leading batch dimensions are allowed everywhere, so the
+# same code runs over thousands of stored plans at once.
+
+DAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+MEALS = ("breakfast", "am_snack", "lunch", "pm_snack", "dinner")
+NUTRIENTS = ("protein", "carbs", "fats", "calories")
+PROTEIN, CARBS, FATS, CALORIES = range(4)
+
+# kcal per gram of protein, carbs and fat
+KCAL_PER_GRAM = np.array([4.0, 4.0, 9.0])
+
+# Meals whose listed calories differ from 4/4/9 x macros by more than this are flagged
+KCAL_TOLERANCE = 0.15
+
+_NUMBER = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+
+def _number(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str):
+        match = _NUMBER.search(value)
+        if match:
+            return float(match.group().replace(",", ""))
+    return math.nan
+
+
+def _plan_body(plan_data):
+    if not isinstance(plan_data, dict):
+        return {}
+    body = plan_data.get("meal_plan", plan_data)
+    return body if isinstance(body, dict) else {}
+
+
+def meal_to_array(meal):
+    """One meal's NUTRIENTS as a length-4 array; NaN where missing."""
+    values = np.full(len(NUTRIENTS), np.nan)
+    if not isinstance(meal, dict):
+        return values
+    # Some plans nest the numbers under "macros" rather than on the meal itself
+    macros = meal.get("macros")
+    if isinstance(macros, dict) and macros:
+        meal = macros
+    for n, nutrient in enumerate(NUTRIENTS):
+        value = meal.get(nutrient)
+        if value is None and nutrient == "fats":
+            value = meal.get("fat")
+        values[n] = _number(value)
+    return values
+
+
+def meal_macros(meal):
+    """One meal's NUTRIENTS as a dict, 0 where missing."""
+    return {nutrient: float(value) for nutrient, value in zip(NUTRIENTS, np.nan_to_num(meal_to_array(meal)))}
+
+
+def plan_to_array(plan_data):
+    """Pack a plan into a (7, 5, 4) array of DAYS x MEALS x NUTRIENTS; NaN where missing."""
+    array = np.full((len(DAYS), len(MEALS), len(NUTRIENTS)), np.nan)
+    daily_plans = _plan_body(plan_data).get("daily_plans")
+    if not isinstance(daily_plans, dict):
+        return array
+    days = {str(name).lower(): meals for name, meals in daily_plans.items()}
+    for d, day in enumerate(DAYS):
+        meals = days.get(day)
+        if not isinstance(meals, dict):
+            continue
+        for m, meal_name in enumerate(MEALS):
+            array[d, m] = meal_to_array(meals.get(meal_name))
+    return array
+
+
+def parse_goal(text):
+    """"2000-2200 calories per day" -> (2000, 2200); a single number is a point goal; NaN if none."""
+    if isinstance(text, (int, float)) and not isinstance(text, bool):
+        return float(text), float(text)
+    numbers = [float(n.replace(",", "")) for n in _NUMBER.findall(text or "")] if isinstance(text, str) else []
+    if not numbers:
+        return math.nan, math.nan
+    low, high = numbers[0], numbers[1] if len(numbers) > 1 else numbers[0]
+    return min(low, high), max(low, high)
+
+
+def plan_goals(plan_data):
+    """(2, 2) array of [calorie (low, high), protein (low, high)] from the plan overview."""
+    overview = _plan_body(plan_data).get("overview")
+    overview = overview if isinstance(overview, dict) else {}
+    return np.array([parse_goal(overview.get("calorie_goal")), parse_goal(overview.get("protein_goal"))])
+
+
+def plans_to_arrays(plans):
+    """Batch form: (N, 7, 5, 4) plan values and (N, 2, 2) goals."""
+    if not plans:
+        return np.empty((0, len(DAYS), len(MEALS), len(NUTRIENTS))), np.empty((0, 2, 2))
+    return np.stack([plan_to_array(p) for p in plans]), np.stack([plan_goals(p) for p in plans])
+
+
+def _deviation(values, goal):
+    """Signed distance outside the [low, high] goal range; 0 inside it, NaN without a goal."""
+    low, high = goal[..., 0, None], goal[..., 1, None]
+    return values - np.clip(values, low, high)
+
+
+def analyze(plan_array, goals=None, tolerance=KCAL_TOLERANCE):
+    """
+    Everything about one or many plans in one pass.
+
+    plan_array is (..., 7, 5, 4) and goals (..., 2, 2) as returned by
+    plan_to_array/plan_goals or plans_to_arrays. Returns arrays with the same
+    leading dimensions:
+        daily            (..., 7, 4)  per-day nutrient totals
+        day_present      (..., 7)     whether the day has any meals
+        weekly_average   (..., 4)     mean over the days present
+        calorie_deviation, protein_deviation  (..., 7)  outside the goal range
+        macro_calories   (..., 7, 5)  4/4/9 kcal from each meal's macros
+        kcal_error       (..., 7, 5)  relative difference from listed calories
+        kcal_inconsistent (..., 7, 5) meals off by more than tolerance
+    """
+    plan_array = np.asarray(plan_array, dtype=float)
+    meal_present = ~np.isnan(plan_array).all(axis=-1)
+    day_present = meal_present.any(axis=-1)
+
+    daily = np.nansum(plan_array, axis=-2)
+    days_present = day_present.sum(axis=-1)
+    weekly_average = daily.sum(axis=-2) / np.maximum(days_present, 1)[..., None]
+
+    macro_calories = np.nansum(plan_array[..., :CALORIES] * KCAL_PER_GRAM, axis=-1)
+    listed = plan_array[..., CALORIES]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kcal_error = (macro_calories - listed) / listed
+    kcal_inconsistent = meal_present & (np.abs(kcal_error) > tolerance)
+
+    if goals is None:
+        goals = np.full(plan_array.shape[:-3] + (2, 2), np.nan)
+    goals = np.asarray(goals, dtype=float)
+    calorie_deviation = np.where(day_present, _deviation(daily[..., CALORIES], goals[..., 0, :]), np.nan)
+    protein_deviation = np.where(day_present, _deviation(daily[..., PROTEIN], goals[..., 1, :]), np.nan)
+
+    return {
+        "daily": daily,
+        "day_present": day_present,
+        "weekly_average": weekly_average,
+        "calorie_deviation": calorie_deviation,
+        "protein_deviation": protein_deviation,
+        "macro_calories": macro_calories,
+        "kcal_error": kcal_error,
+        "kcal_inconsistent": kcal_inconsistent,
+    }
+
+
+def _clean(value, digits=1):
+    return None if math.isnan(value) else round(float(value), digits)
+
+
+def summarize_plan(plan_data):
+    """JSON-friendly analysis of a single plan."""
+    plan_array = plan_to_array(plan_data)
+    goals = plan_goals(plan_data)
+    result = analyze(plan_array, goals)
+    days = {}
+    for d, day in enumerate(DAYS):
+        if not result["day_present"][d]:
+            continue
+        totals = {nutrient: _clean(result["daily"][d, n]) for n, nutrient in enumerate(NUTRIENTS)}
+        totals["calorie_deviation"] = _clean(result["calorie_deviation"][d])
+        totals["protein_deviation"] = _clean(result["protein_deviation"][d])
+        days[day] = totals
+    inconsistent = [
+        {
+            "day": DAYS[d],
+            "meal": MEALS[m],
+            "listed_calories": _clean(plan_array[d, m, CALORIES]),
+            "macro_calories": _clean(result["macro_calories"][d, m]),
+        }
+        for d, m in zip(*np.nonzero(result["kcal_inconsistent"]))
+    ]
+    return {
+        "days": days,
+        "weekly_average": {nutrient: _clean(result["weekly_average"][n]) for n, nutrient in enumerate(NUTRIENTS)},
+        "goals": {
+            "calories": [_clean(v, 0) for v in goals[0]],
+            "protein": [_clean(v, 0) for v in goals[1]],
+        },
+        "inconsistent_meals": inconsistent,
+    }
+
+
+def summarize_plans(plans):
+    """Aggregate analytics over many plans, e.g. every stored plan."""
+    plan_arrays, goals = plans_to_arrays(plans)
+    result = analyze(plan_arrays, goals)
+    present = result["day_present"]
+    with np.errstate(invalid="ignore"):
+        on_calorie_target = np.where(present, result["calorie_deviation"] == 0, False)
+        on_protein_target = np.where(present, result["protein_deviation"] == 0, False)
+    day_count = int(present.sum())
+    meal_count = int((~np.isnan(plan_arrays).all(axis=-1)).sum())
+    mean_daily = result["daily"][present].mean(axis=0) if day_count else np.full(len(NUTRIENTS), np.nan)
+    return {
+        "plans": len(plans),
+        "days": day_count,
+        "mean_daily": {nutrient: _clean(mean_daily[n]) for n, nutrient in enumerate(NUTRIENTS)},
+        "calorie_target_rate": _clean(on_calorie_target.sum() / day_count, 4) if day_count else None,
+        "protein_target_rate": _clean(on_protein_target.sum() / day_count, 4) if day_count else None,
+        "kcal_inconsistent_rate": _clean(result["kcal_inconsistent"].sum() / meal_count, 4) if meal_count else None,
+    }
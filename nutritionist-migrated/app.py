@@ -1,9 +1,6 @@
 from fastapi import FastAPI, Depends, Request, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy import create_engine
 import os
 from contextlib import contextmanager
 from datetime import datetime
@@ -20,12 +17,34 @@ from routes.meal_plan import router as meal_plan_router
 from routes.main import router as main_router
 from routes.waitlist import router as waitlist_router
 from routes.nutrition import router as nutrition_router
+from routes.jobs import router as jobs_router
 
 # Import configuration
-from config import DATABASE_URL, PROJECT_NAME
+from config import (
+    PROJECT_NAME, IMAGE_MAX_UPLOAD_BYTES, IMAGE_BATCH_MAX_IMAGES, RATE_LIMIT_ENABLED,
+    RATE_LIMIT_GENERATE_USER, RATE_LIMIT_VISION_USER, RATE_LIMIT_VISION_IP, RATE_LIMIT_AUTH_IP,
+)
+from models.database import init_db, pool_stats
+from services.plan_cache import plan_cache
+from services.job_queue import job_queue
+from services.meal_plan_service import generate_meal_plan_for_user, generation_flight
+from services.image_preprocess import shutdown_executor as shutdown_image_executor
+from services.image_cache import image_cache
+from services.grocery_engine import grocery_cache
+from services.user_cache import user_cache
+from services.password_hasher import password_hasher
+from services.food_log_writer import food_log_writer
+from services.nutrition_rollups import create_rollup_tables
+from services.meal_plan_days import init_plan_days
+from services.blob_codec import blob_codec
+from services.blob_dictionaries import init_dictionaries
+from services.jsoncodec import FastJSONResponse, BACKEND as JSON_BACKEND
+from middleware.upload_limit import UploadSizeLimitMiddleware
+from middleware.rate_limit import RateLimitMiddleware, RouteLimit
+from services.rate_limiter import rate_limiter, parse_rate
 
 # Create the FastAPI app
-app = FastAPI(title=PROJECT_NAME)
+app = FastAPI(title=PROJECT_NAME, default_response_class=FastJSONResponse)
 
 # Configure CORS
 app.add_middleware(
@@ -36,37 +55,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
-
-# Set up database with proper SQLite threading configuration
-Base = declarative_base()
-engine = create_engine(
-    DATABASE_URL,
-    # Fix SQLite threading issues
-    connect_args={"check_same_thread": False},
-    # Pool settings for better async handling
-    pool_pre_ping=True,
-    pool_recycle=300,
-    echo=False  # Set to True for SQL debugging
+# Reject oversized image uploads before they are buffered
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits={
+        "/api/nutrition": IMAGE_MAX_UPLOAD_BYTES,
+        "/api/nutrition/analyze-images": IMAGE_MAX_UPLOAD_BYTES * IMAGE_BATCH_MAX_IMAGES,
+    },
 )
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Import models
-from models.user import User
-from models.waitlist import WaitlistEmail
-from models.meal_plan import MealPlan, Modification
+# Throttle Claude-backed and credential endpoints; added last so it runs first
+if RATE_LIMIT_ENABLED:
+    generate_limit = RouteLimit(per_user=parse_rate(RATE_LIMIT_GENERATE_USER))
+    auth_limit = RouteLimit(per_ip=parse_rate(RATE_LIMIT_AUTH_IP))
+    app.add_middleware(
+        RateLimitMiddleware,
+        limits={
+            "/api/meal-plan/generate": generate_limit,
+            "/api/generate": generate_limit,
+            # Also covers /api/nutrition/analyze-images, which charges per image
+            "/api/nutrition/analyze-image": RouteLimit(
+                per_user=parse_rate(RATE_LIMIT_VISION_USER), per_ip=parse_rate(RATE_LIMIT_VISION_IP)
+            ),
+            "/auth/login-form": auth_limit,
+            "/auth/register": auth_limit,
+        },
+    )
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Mount static files
+app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Database session dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Create database tables
+init_db()
 
 # Set up templates
 templates = Jinja2Templates(directory="templates")
@@ -78,6 +98,28 @@ app.include_router(meal_plan_router, prefix="/api", tags=["meal-plan"])
 app.include_router(main_router, prefix="/app", tags=["main"])
 app.include_router(waitlist_router, prefix="/api", tags=["waitlist"])
 app.include_router(nutrition_router, prefix="/api/nutrition", tags=["nutrition"])
+app.include_router(jobs_router, prefix="/api", tags=["jobs"])
+
+# Background jobs
+job_queue.register("generate_meal_plan", generate_meal_plan_for_user)
+
+@app.on_event("startup")
+async def start_job_queue():
+    await job_queue.start()
+    create_rollup_tables()
+    # Dictionaries first; the plan day backfill decodes stored plans
+    init_dictionaries()
+    init_plan_days()
+    await food_log_writer.start()
+    await rate_limiter.start()
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
+    await food_log_writer.stop()
+    await rate_limiter.stop()
+    shutdown_image_executor()
+    password_hasher.shutdown()
 
 # Root endpoint - serve landing page
 @app.get("/")
@@ -94,6 +136,24 @@ async def landing(request: Request):
 async def health_check():
     return {"status": "ok"}
 
+# Cache and pool metrics
+@app.get("/health/metrics")
+async def health_metrics():
+    return {
+        "db_pool": pool_stats(),
+        "plan_cache": plan_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "image_cache": image_cache.stats(),
+        "grocery_cache": grocery_cache.stats(),
+        "blob_codec": blob_codec.stats(),
+        "json_codec": JSON_BACKEND,
+        "food_log_writer": food_log_writer.stats(),
+        "jobs": job_queue.stats(),
+        "generation_flight": generation_flight.stats()
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
@@ -9,6 +9,11 @@ PROJECT_NAME = os.getenv("PROJECT_NAME", "nutritionist")
 
 # Database configurations
 DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///./data/{PROJECT_NAME}.db")
+# Connection pool shared by every session (see models.database)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))
 
 # Secret key for JWT token
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-here")
@@ -28,4 +33,76 @@ EMAIL_PORT = int(os.getenv("EMAIL_PORT", "587"))
 # Nutritionist-specific configurations
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 MEAL_PLAN_DB = os.getenv("MEAL_PLAN_DB", "meal_plans.db")
-OTP_EXPIRATION_MINUTES = int(os.getenv("OTP_EXPIRATION_MINUTES", "5")) 
\ No newline at end of file
+OTP_EXPIRATION_MINUTES = int(os.getenv("OTP_EXPIRATION_MINUTES", "5"))
+
+# Decoded meal plan cache
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "256"))
+PLAN_CACHE_TTL = float(os.getenv("PLAN_CACHE_TTL", "300"))
+
+# Verified session token -> user snapshot; entries never outlive the token
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "4096"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+# Password hashing: bcrypt cost and the thread pool it runs on. Logins and
+# registrations beyond PASSWORD_HASH_MAX_PENDING waiting hashes get a 503.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+# Background job queue
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "100"))
+# Finished jobs (and their results) are deleted this many seconds after they
+# finish, checked every JOB_SWEEP_INTERVAL seconds; 0 keeps them forever
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", str(7 * 24 * 60 * 60)))
+JOB_SWEEP_INTERVAL = float(os.getenv("JOB_SWEEP_INTERVAL", "3600"))
+# Food image preprocessing before Claude Vision
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1568"))
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").upper()
+IMAGE_PREPROCESS_WORKERS = int(os.getenv("IMAGE_PREPROCESS_WORKERS", "2"))
+# Raw uploads can be larger than Claude's 5MB limit since they are downscaled first
+IMAGE_MAX_UPLOAD_BYTES = int(os.getenv("IMAGE_MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+
+# Food image analysis cache (exact sha256 + perceptual dHash match)
+IMAGE_CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE", "512"))
+IMAGE_CACHE_TTL = float(os.getenv("IMAGE_CACHE_TTL", str(24 * 60 * 60)))
+IMAGE_CACHE_MAX_DISTANCE = int(os.getenv("IMAGE_CACHE_MAX_DISTANCE", "6"))
+# Uploads are read from the spooled temp file in chunks of this size
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+
+# Batch image analysis
+IMAGE_BATCH_MAX_IMAGES = int(os.getenv("IMAGE_BATCH_MAX_IMAGES", "10"))
+IMAGE_BATCH_CONCURRENCY = int(os.getenv("IMAGE_BATCH_CONCURRENCY", "3"))
+
+# Food log write-behind buffer
+FOOD_LOG_BATCH_SIZE = int(os.getenv("FOOD_LOG_BATCH_SIZE", "100"))
+FOOD_LOG_FLUSH_INTERVAL = float(os.getenv("FOOD_LOG_FLUSH_INTERVAL", "1.0"))
+FOOD_LOG_MAX_BUFFER = int(os.getenv("FOOD_LOG_MAX_BUFFER", "10000"))
+
+# Grocery lists built from plan portion sizes, cached per plan
+GROCERY_CACHE_SIZE = int(os.getenv("GROCERY_CACHE_SIZE", "256"))
+
+# Compressed meal plan storage: "none", "zlib" or "zstd" (needs the zstandard package)
+BLOB_COMPRESSION = os.getenv("BLOB_COMPRESSION", "none").lower()
+# 0 uses the algorithm's default level
+BLOB_COMPRESSION_LEVEL = int(os.getenv("BLOB_COMPRESSION_LEVEL", "0")) or None
+
+# JSON codec for stored plans and API responses: "auto" picks the fastest
+# installed of orjson, msgspec, stdlib
+JSON_CODEC = os.getenv("JSON_CODEC", "auto").lower()
+
+# Token-bucket rate limits for LLM-backed and auth endpoints, as
+# "<requests>/<second|minute|hour|day>"; empty disables that bucket.
+# Logged-in requests use the per-user bucket, anonymous ones the per-IP bucket.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_GENERATE_USER = os.getenv("RATE_LIMIT_GENERATE_USER", "10/hour")
+RATE_LIMIT_VISION_USER = os.getenv("RATE_LIMIT_VISION_USER", "60/hour")
+RATE_LIMIT_VISION_IP = os.getenv("RATE_LIMIT_VISION_IP", "10/hour")
+RATE_LIMIT_AUTH_IP = os.getenv("RATE_LIMIT_AUTH_IP", "10/minute")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Use the first X-Forwarded-For address as the client IP (only behind a proxy that sets it)
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() == "true"
+# Save buckets to the database every interval seconds and reload them on startup
+RATE_LIMIT_PERSIST = os.getenv("RATE_LIMIT_PERSIST", "false").lower() == "true"
+RATE_LIMIT_PERSIST_INTERVAL = float(os.getenv("RATE_LIMIT_PERSIST_INTERVAL", "30"))
@@ -0,0 +1,125 @@
+import json
+import logging
+import math
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from jose import JWTError, jwt
+
+from config import JWT_SECRET_KEY, ALGORITHM, RATE_LIMIT_TRUST_PROXY
+from services.rate_limiter import RateLimit, TokenBucketLimiter, rate_limiter
+from services.user_cache import user_cache
+
+logger = logging.getLogger(__name__)
+
+# Throttles the expensive endpoints before they run: a logged-in request
+# takes a token from its user's bucket for the route, an anonymous one from
+# its client IP's bucket. Over-limit requests get a 429 with Retry-After and
+# never reach the route, so they cost neither Claude calls nor a DB session.
+# The middleware takes one token; routes that do more work per request (the
+# batch image endpoint) take the rest with charge() once they know how much.
+
+class RouteLimit(NamedTuple):
+    per_user: Optional[RateLimit] = None
+    per_ip: Optional[RateLimit] = None
+    methods: Tuple[str, ...] = ("POST",)
+
+class RateLimitMiddleware:
+    def __init__(self, app, limits: Dict[str, RouteLimit], limiter: TokenBucketLimiter = rate_limiter):
+        """limits maps a path prefix to its RouteLimit; the longest matching prefix wins."""
+        self.app = app
+        self.limits = sorted(limits.items(), key=lambda item: len(item[0]), reverse=True)
+        self.limiter = limiter
+
+    def _limit_for(self, path: str, method: str) -> Tuple[Optional[str], Optional[RouteLimit]]:
+        for prefix, limit in self.limits:
+            if path.startswith(prefix):
+                return (prefix, limit) if method in limit.methods else (None, None)
+        return None, None
+
+    @staticmethod
+    def _username(headers: Dict[bytes, bytes]) -> Optional[str]:
+        """The user named by a valid access_token cookie, or None."""
+        cookie = headers.get(b"cookie", b"").decode("latin-1")
+        token = None
+        for part in cookie.split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == "access_token":
+                token = value.strip('"')
+                break
+        if not token:
+            return None
+        if token.startswith("Bearer "):
+            token = token[7:]
+        cached = user_cache.get(token)
+        if cached is not None:
+            return cached.username
+        try:
+            return jwt.decode(token, JWT_SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+        except JWTError:
+            return None
+
+    @staticmethod
+    def _client_ip(scope, headers: Dict[bytes, bytes]) -> str:
+        if RATE_LIMIT_TRUST_PROXY and b"x-forwarded-for" in headers:
+            return headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        prefix, limit = self._limit_for(scope["path"], scope["method"])
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        username = self._username(headers) if limit.per_user is not None else None
+        if username is not None:
+            key, bucket = f"{prefix}|user:{username}", limit.per_user
+        else:
+            key, bucket = f"{prefix}|ip:{self._client_ip(scope, headers)}", limit.per_ip
+        if bucket is None:
+            await self.app(scope, receive, send)
+            return
+        retry_after = self.limiter.acquire(key, bucket)
+        if retry_after > 0:
+            await self._reject(send, key, retry_after)
+            return
+        scope.setdefault("state", {})["rate_limit"] = (self.limiter, key, bucket)
+        await self.app(scope, receive, send)
+
+    async def _reject(self, send, key: str, retry_after: float):
+        logger.warning(f"Rate limited {key}")
+        seconds = max(1, math.ceil(retry_after))
+        body = json.dumps({"detail": rate_limited_detail(seconds)}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(seconds).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+def rate_limited_detail(seconds: int) -> Dict[str, str]:
+    return {"error": f"Too many requests. Try again in {seconds} seconds", "code": "RATE_LIMITED"}
+
+def charge(request: Request, cost: float) -> None:
+    """
+    Take `cost` more tokens from the bucket the middleware charged for this
+    request, or raise a 429. A no-op when the request wasn't rate limited.
+    """
+    charged = getattr(request.state, "rate_limit", None)
+    if charged is None or cost <= 0:
+        return
+    limiter, key, bucket = charged
+    retry_after = limiter.acquire(key, bucket, cost)
+    if retry_after > 0:
+        logger.warning(f"Rate limited {key} ({cost:g} extra tokens)")
+        seconds = max(1, math.ceil(retry_after))
+        raise HTTPException(status_code=429, detail=rate_limited_detail(seconds), headers={"Retry-After": str(seconds)})
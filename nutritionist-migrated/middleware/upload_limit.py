@@ -0,0 +1,97 @@
+import json
+import logging
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Starlette parses multipart bodies before the endpoint runs, so a size check
+# in the route only happens after the whole upload has been received and
+# spooled. This ASGI middleware rejects oversized bodies up front from
+# Content-Length, and counts bytes as they arrive for chunked uploads or
+# clients that lie about the length, cutting the body off as soon as the
+# limit is crossed.
+
+# Room for the multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    def __init__(self, app, limits: Dict[str, int]):
+        """limits maps a path prefix to its maximum upload size; the longest matching prefix wins."""
+        self.app = app
+        self.limits = sorted(limits.items(), key=lambda item: len(item[0]), reverse=True)
+        self.rejected = 0
+
+    def _limit_for(self, path: str) -> Optional[int]:
+        for prefix, max_bytes in self.limits:
+            if path.startswith(prefix):
+                return max_bytes
+        return None
+
+    async def __call__(self, scope, receive, send):
+        max_bytes = self._limit_for(scope["path"]) if scope["type"] == "http" else None
+        if max_bytes is None or scope["method"] not in ("POST", "PUT", "PATCH"):
+            await self.app(scope, receive, send)
+            return
+        max_body_bytes = max_bytes + MULTIPART_OVERHEAD
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > max_body_bytes:
+            await self._reject(scope, send, max_bytes)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            if exceeded:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_body_bytes:
+                    # Stop reading; the parser sees a disconnect and the
+                    # error response it produces is swapped for a 413 below
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if exceeded:
+                if message["type"] == "http.response.start" and not response_started:
+                    response_started = True
+                    await self._reject(scope, send, max_bytes)
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            # Errors from the body being cut off (e.g. ClientDisconnect) are ours
+            if not exceeded:
+                raise
+        if exceeded and not response_started:
+            await self._reject(scope, send, max_bytes)
+
+    async def _reject(self, scope, send, max_bytes: int):
+        self.rejected += 1
+        logger.warning(f"Rejected oversized upload to {scope['path']}")
+        max_mb = max_bytes // (1024 * 1024)
+        body = json.dumps({
+            "detail": {"error": f"File too large. Maximum size is {max_mb}MB", "code": "FILE_TOO_LARGE"}
+        }).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String, LargeBinary, DateTime
+from datetime import datetime
+from .base import Base
+
+class BlobDictionary(Base):
+    """A compression dictionary trained on stored plans, referenced by id from compressed rows."""
+    __tablename__ = "blob_dictionaries"
+
+    id = Column(Integer, primary_key=True)
+    algorithm = Column(String(10), nullable=False)  # "zlib" or "zstd"
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
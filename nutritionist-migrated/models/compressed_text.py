@@ -0,0 +1,18 @@
+from sqlalchemy.types import Text, TypeDecorator
+
+from services.blob_codec import blob_codec
+
+class CompressedText(TypeDecorator):
+    """Text column stored through blob_codec.
+
+    Values are compressed on write when BLOB_COMPRESSION is set, and always
+    come back as str; rows written as plain text still read unchanged.
+    """
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return blob_codec.encode(value)
+
+    def process_result_value(self, value, dialect):
+        return blob_codec.decode(value)
@@ -1,44 +1,97 @@
+import os
+import threading
+import time
+from typing import Any, Dict
+
 from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-import os
-from dotenv import load_dotenv
+from sqlalchemy.pool import QueuePool
 
-# Load environment variables
-load_dotenv()
+from config import DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
+from .base import Base
 
-# Get database URL from environment variable
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/nutritionist.db")
+# The one engine and session factory for the app, its services and scripts.
+# Routes and auth both depend on get_db, which FastAPI resolves once per
+# request, so a request holds a single session and a single pooled connection.
 
 # Ensure data directory exists
 data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
 os.makedirs(data_dir, exist_ok=True)
 
-# Create SQLAlchemy engine
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-)
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_ms = 0.0
+        self.max_checkout_ms = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            with self._stats_lock:
+                self.checkouts += 1
+                self.checkout_ms += elapsed
+                self.max_checkout_ms = max(self.max_checkout_ms, elapsed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": max(self.overflow(), 0),
+            "max_overflow": self._max_overflow,
+            "checkouts": self.checkouts,
+            "avg_checkout_ms": round(self.checkout_ms / self.checkouts, 4) if self.checkouts else 0.0,
+            "max_checkout_ms": round(self.max_checkout_ms, 4),
+            "timeouts": self.timeouts,
+        }
+
+def _engine_options(url: str) -> Dict[str, Any]:
+    options: Dict[str, Any] = {"pool_pre_ping": True, "pool_recycle": DB_POOL_RECYCLE}
+    if url.startswith("sqlite"):
+        options["connect_args"] = {"check_same_thread": False}
+        if ":memory:" in url or url in ("sqlite://", "sqlite:///"):
+            # Every connection would get its own empty database
+            return options
+    options.update(
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    return options
+
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
 
-# Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Create base class for models
-Base = declarative_base()
+def pool_stats() -> Dict[str, Any]:
+    pool = engine.pool
+    if isinstance(pool, TimedQueuePool):
+        return pool.stats()
+    return {"pool": type(pool).__name__, "status": pool.status()}
 
 def init_db():
-    # Import models here to avoid circular imports
-    from .user import User
-    from .meal_plan import MealPlan, Modification
-    from .waitlist import WaitlistEmail
-    
-    # Create all tables
+    # Import models here so they are registered on Base before create_all
+    from . import user, meal_plan, meal_plan_day, waitlist, job, food_log, nutrition_rollup, blob_dictionary  # noqa: F401
+
     Base.metadata.create_all(bind=engine)
 
 def get_db():
-    """Get a database session."""
+    """Get a database session; FastAPI hands every dependency of a request the same one."""
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
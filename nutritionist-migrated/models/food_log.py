@@ -0,0 +1,35 @@
+from sqlalchemy import Column, Integer, String, Text, Float, ForeignKey, DateTime, Index
+from datetime import datetime
+from .base import Base
+
+class FoodLog(Base):
+    """One analyzed food photo in a user's nutrition history."""
+    __tablename__ = "food_logs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    logged_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    calories = Column(Integer, nullable=False, default=0)
+    protein = Column(Float, nullable=False, default=0)
+    carbs = Column(Float, nullable=False, default=0)
+    fat = Column(Float, nullable=False, default=0)
+    description = Column(Text)
+    filename = Column(String(255))
+    image_sha256 = Column(String(64))
+
+    __table_args__ = (
+        # History pages and day ranges are always "this user's logs by time"
+        Index("ix_food_logs_user_logged_at", "user_id", "logged_at", "id"),
+    )
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "logged_at": self.logged_at.isoformat() if self.logged_at else None,
+            "calories": self.calories,
+            "protein": self.protein,
+            "carbs": self.carbs,
+            "fat": self.fat,
+            "description": self.description,
+            "filename": self.filename,
+        }
@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Index
+from datetime import datetime
+from .base import Base
+from services import jsoncodec
+
+class Job(Base):
+    """A background job (e.g. meal plan generation) persisted so it survives restarts."""
+    __tablename__ = "jobs"
+
+    id = Column(String(32), primary_key=True)  # uuid4 hex
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    kind = Column(String(50), nullable=False)
+    params = Column(Text, nullable=False, default="{}")  # JSON string of handler kwargs
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, succeeded, failed
+    result = Column(Text)  # JSON string of the handler's return value
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_jobs_status_created_at", "status", "created_at"),
+    )
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": jsoncodec.loads(self.result) if self.result else None,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
@@ -1,9 +1,12 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, JSON, event
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from pydantic import BaseModel
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 from .base import Base
+from .compressed_text import CompressedText
+from services import jsoncodec
+from services.grocery_engine import grocery_cache, grocery_list_sections
 
 class MealPlan(Base):
     __tablename__ = "meal_plans"
@@ -11,7 +14,7 @@ class MealPlan(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     week_key = Column(String(10), nullable=False)  # Format: YYYY-MM-DD
-    plan_data = Column(Text, nullable=False)  # JSON string of meal plan data
+    plan_data = Column(CompressedText, nullable=False)  # JSON string of meal plan data
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -19,17 +22,54 @@ class MealPlan(Base):
     user = relationship("User", back_populates="meal_plans")
     modifications = relationship("Modification", back_populates="meal_plan", cascade="all, delete-orphan")
 
-    def get_daily_plans(self) -> dict:
-        """Get the daily plans from the plan_data JSON string."""
-        import json
-        data = json.loads(self.plan_data)
-        return data.get("daily_plans", {})
-
-    def get_grocery_list(self) -> dict:
-        """Get the grocery list from the plan_data JSON string."""
-        import json
-        data = json.loads(self.plan_data)
-        return data.get("grocery_list", {})
+    @property
+    def plan(self) -> Dict[str, Any]:
+        """The decoded plan_data, parsed once per instance.
+
+        Cleared whenever plan_data is assigned, refreshed or expired. The dict
+        is shared by every accessor below and must not be mutated; assign a new
+        plan_data instead.
+        """
+        cached = self.__dict__.get("_decoded_plan")
+        if cached is None or cached[0] is not self.plan_data:
+            cached = (self.plan_data, jsoncodec.loads(self.plan_data))
+            self.__dict__["_decoded_plan"] = cached
+        return cached[1]
+
+    @property
+    def plan_body(self) -> Dict[str, Any]:
+        """The plan itself, whether stored bare or wrapped in {"meal_plan": ...}."""
+        body = self.plan.get("meal_plan", self.plan)
+        return body if isinstance(body, dict) else {}
+
+    def get_daily_plans(self) -> Dict[str, Dict[str, Any]]:
+        """Daily plans keyed by day name."""
+        return self.plan_body.get("daily_plans") or {}
+
+    def get_day(self, day: str) -> Optional[Dict[str, Any]]:
+        """One day's meals keyed by meal name, or None if the plan has no such day."""
+        return self.get_daily_plans().get(day.lower())
+
+    def get_meal(self, day: str, meal: str) -> Optional[Dict[str, Any]]:
+        meals = self.get_day(day)
+        return meals.get(meal) if isinstance(meals, dict) else None
+
+    def get_grocery_list(self) -> Dict[str, Any]:
+        """The grocery list the plan was generated with."""
+        return self.plan_body.get("grocery_list") or {}
+
+    def get_grocery_sections(self) -> Dict[str, List[str]]:
+        """Grocery list built from portion sizes, grouped by shopping window and category."""
+        return grocery_list_sections(grocery_cache.get(self.plan))
+
+@event.listens_for(MealPlan.plan_data, "set")
+def _plan_data_set(target: MealPlan, value, oldvalue, initiator):
+    target.__dict__.pop("_decoded_plan", None)
+
+@event.listens_for(MealPlan, "refresh")
+@event.listens_for(MealPlan, "expire")
+def _plan_data_reloaded(target: MealPlan, *args):
+    target.__dict__.pop("_decoded_plan", None)
 
 class Modification(Base):
     __tablename__ = "modifications"
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, ForeignKey
+from .base import Base
+from .compressed_text import CompressedText
+
+class MealPlanDay(Base):
+    """One day of a meal plan, kept alongside MealPlan.plan_data.
+
+    Written in the same transaction as the plan, so single-day reads
+    (today's meals, the iOS day view) load one small row instead of
+    decoding the whole week.
+    """
+    __tablename__ = "meal_plan_days"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    week_key = Column(String(10), primary_key=True)
+    day = Column(String(10), primary_key=True)  # lower-case weekday name
+    plan_data = Column(CompressedText, nullable=False)  # JSON string of the day's meals
+    calorie_goal = Column(String(100))
+    protein_goal = Column(String(100))
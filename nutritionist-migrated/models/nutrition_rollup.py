@@ -0,0 +1,42 @@
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date, DateTime
+from datetime import datetime
+from .base import Base
+
+class RollupColumns:
+    """Macro totals shared by the daily and weekly rollups.
+
+    logged_* sum the user's food logs, planned_* the meals of their meal plan.
+    Both are kept up to date as logs are written and plans are saved, so
+    summaries read one row per day or week instead of scanning the sources.
+    """
+    logged_entries = Column(Integer, nullable=False, default=0)
+    logged_calories = Column(Float, nullable=False, default=0)
+    logged_protein = Column(Float, nullable=False, default=0)
+    logged_carbs = Column(Float, nullable=False, default=0)
+    logged_fat = Column(Float, nullable=False, default=0)
+    planned_calories = Column(Float, nullable=False, default=0)
+    planned_protein = Column(Float, nullable=False, default=0)
+    planned_carbs = Column(Float, nullable=False, default=0)
+    planned_fat = Column(Float, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def totals(self, source: str) -> dict:
+        """Rounded macro totals for "logged" or "planned"."""
+        return {
+            "calories": int(round(getattr(self, f"{source}_calories") or 0)),
+            "protein": round(getattr(self, f"{source}_protein") or 0.0, 1),
+            "carbs": round(getattr(self, f"{source}_carbs") or 0.0, 1),
+            "fat": round(getattr(self, f"{source}_fat") or 0.0, 1),
+        }
+
+class DailyNutritionRollup(RollupColumns, Base):
+    __tablename__ = "daily_nutrition_rollups"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+
+class WeeklyNutritionRollup(RollupColumns, Base):
+    __tablename__ = "weekly_nutrition_rollups"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    week_key = Column(String(10), primary_key=True)  # Monday of the week, YYYY-MM-DD
@@ -0,0 +1,10 @@
+from sqlalchemy import Column, String, Float
+from .base import Base
+
+class RateLimitBucket(Base):
+    """A persisted token bucket, so rate limits survive restarts (RATE_LIMIT_PERSIST)."""
+    __tablename__ = "rate_limit_buckets"
+
+    key = Column(String(200), primary_key=True)  # "<route>|user:<name>" or "<route>|ip:<addr>"
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)  # Unix time the tokens were counted at
@@ -2,7 +2,7 @@ from sqlalchemy import Column, Integer, String, Boolean, DateTime
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .base import Base
-import bcrypt
+from services.password_hasher import hash_password, verify_password
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,29 +22,14 @@ class User(Base):
     # Relationships
     meal_plans = relationship("MealPlan", back_populates="user")
 
+    # Both run bcrypt inline; async handlers use services.password_hasher instead
     def verify_password(self, plain_password: str) -> bool:
-        try:
-            if not self.hashed_password:
-                logger.error("No password hash found for user")
-                return False
-                
-            return bcrypt.checkpw(
-                plain_password.encode('utf-8'),
-                self.hashed_password.encode('utf-8')
-            )
-        except Exception as e:
-            logger.error(f"Password verification error: {e}")
-            return False
+        return verify_password(plain_password, self.hashed_password)
 
     def set_password(self, plain_password: str) -> None:
         try:
-            if not plain_password:
-                raise ValueError("Password cannot be empty")
-                
-            salt = bcrypt.gensalt()
-            hashed = bcrypt.hashpw(plain_password.encode('utf-8'), salt)
-            self.hashed_password = hashed.decode('utf-8')
+            self.hashed_password = hash_password(plain_password)
             logger.debug(f"Password set for user {self.username}")
         except Exception as e:
             logger.error(f"Password hashing error: {e}")
-            raise 
\ No newline at end of file
+            raise
@@ -1,6 +1,6 @@
 from sqlalchemy import Column, Integer, String, DateTime
 from sqlalchemy.sql import func
-from .database import Base
+from .base import Base
 
 class WaitlistEmail(Base):
     __tablename__ = "waitlist_emails"
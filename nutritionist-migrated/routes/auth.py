@@ -7,7 +7,6 @@ from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from typing import Optional
 from pydantic import BaseModel
-import bcrypt
 import logging
 
 # Set up logging
@@ -15,6 +14,9 @@ logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 from models.user import User
+from models.database import get_db
+from services.user_cache import UserSnapshot, user_cache
+from services.password_hasher import password_hasher, PasswordHasherBusyError
 from config import JWT_SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
 
 router = APIRouter()
@@ -29,15 +31,6 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     username: Optional[str] = None
 
-# Dependency to get the current user
-def get_db():
-    from app import SessionLocal
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -48,9 +41,9 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(request: Request, db: Session = Depends(get_db)):
+async def get_current_user(request: Request, db: Session = Depends(get_db)) -> UserSnapshot:
+    """The logged-in user as a UserSnapshot; verified tokens are cached in user_cache."""
     token = request.cookies.get("access_token")
-    logger.debug(f"Token from cookie: {token}")
     
     if not token:
         logger.debug("No token found in cookies")
@@ -60,11 +53,15 @@ async def get_current_user(request: Request, db: Session = Depends(get_db)):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Remove 'Bearer ' prefix if present
+    if token.startswith("Bearer "):
+        token = token[7:]
+
+    cached = user_cache.get(token)
+    if cached is not None:
+        return cached
+
     try:
-        # Remove 'Bearer ' prefix if present
-        if token.startswith("Bearer "):
-            token = token[7:]
-            
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
@@ -82,6 +79,7 @@ async def get_current_user(request: Request, db: Session = Depends(get_db)):
             headers={"WWW-Authenticate": "Bearer"},
         )
         
+    generation = user_cache.generation()
     user = db.query(User).filter(User.username == username).first()
     if user is None:
         logger.debug(f"User not found in database: {username}")
@@ -90,7 +88,24 @@ async def get_current_user(request: Request, db: Session = Depends(get_db)):
             detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return user
+    snapshot = UserSnapshot.from_user(user)
+    user_cache.put(token, snapshot, payload.get("exp"), generation)
+    return snapshot
+
+async def get_optional_user(request: Request, db: Session = Depends(get_db)) -> Optional[UserSnapshot]:
+    """The logged-in user, or None for anonymous requests to public endpoints"""
+    if not request.cookies.get("access_token"):
+        return None
+    try:
+        return await get_current_user(request, db)
+    except HTTPException:
+        return None
+
+async def hash_password_or_503(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
 
 # Routes
 @router.get("/login", response_class=HTMLResponse)
@@ -124,9 +139,9 @@ async def register(
         username=username,
         email=email,
         is_active=True,
-        is_superuser=False
+        is_admin=False,
+        hashed_password=await hash_password_or_503(password)
     )
-    new_user.set_password(password)
     
     db.add(new_user)
     db.commit()
@@ -153,20 +168,21 @@ async def login_form(
         )
     
     try:
-        if not user.verify_password(password):
-            logger.debug(f"Invalid password for user: {username}")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Incorrect username or password",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-    except Exception as e:
-        logger.error(f"Password verification error: {e}")
+        valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    except PasswordHasherBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    if not valid:
+        logger.debug(f"Invalid password for user: {username}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash is not None:
+        # BCRYPT_ROUNDS changed since this hash was made
+        user.hashed_password = new_hash
+        db.commit()
+        logger.debug(f"Rehashed password for user: {username}")
     
     logger.debug(f"Login successful for user: {username}")
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -187,7 +203,10 @@ async def login_form(
     return response
 
 @router.get("/logout")
-async def logout():
+async def logout(request: Request):
+    token = request.cookies.get("access_token")
+    if token:
+        user_cache.invalidate_token(token[7:] if token.startswith("Bearer ") else token)
     response = RedirectResponse(url="/auth/login", status_code=status.HTTP_302_FOUND)
     response.delete_cookie("access_token", path="/")
     return response 
\ No newline at end of file
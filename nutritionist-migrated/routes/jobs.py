@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+
+from routes.auth import get_current_user
+from services.user_cache import UserSnapshot
+from services.job_queue import job_queue, TERMINAL_STATUSES
+from services import jsoncodec
+
+router = APIRouter()
+
+def get_user_job(job_id: str, user_id: int):
+    job = job_queue.get(job_id)
+    if job is None or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    wait: float = 0,
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """Poll a background job. With `wait`, long-poll up to that many seconds for a state change."""
+    job = get_user_job(job_id, current_user.id)
+    if wait > 0 and job.status not in TERMINAL_STATUSES:
+        job = await job_queue.wait(job_id, min(wait, 60))
+    return job.to_dict()
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(
+    job_id: str,
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """Push job status changes as Server-Sent Events until the job finishes."""
+    job = get_user_job(job_id, current_user.id)
+
+    async def events():
+        current = job
+        yield f"event: status\ndata: {jsoncodec.dumps(current.to_dict())}\n\n"
+        while current.status not in TERMINAL_STATUSES:
+            # Re-sends the current status every 15s as a keep-alive
+            current = await job_queue.wait(job_id, 15)
+            yield f"event: status\ndata: {jsoncodec.dumps(current.to_dict())}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
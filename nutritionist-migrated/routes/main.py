@@ -2,12 +2,16 @@ from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 from models.database import get_db
-from models.user import User
-from services.meal_plan_service import get_meal_plan, get_all_meal_plans
+from services.user_cache import UserSnapshot
+from services.meal_plan_service import get_meal_plan_data, get_all_meal_plans, generate_grocery_list
+from services.nutrition_rollups import get_daily_rollups
+from services.macro_engine import summarize_plan
+from services.grocery_engine import grocery_list_sections
 from routes.auth import get_current_user
+from services.food_log_writer import food_log_writer
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
@@ -18,55 +22,89 @@ def get_week_key() -> str:
     return start_of_week.strftime("%Y-%m-%d")
 
 @router.get("/")
-async def main_page(request: Request, current_user: User = Depends(get_current_user)):
+async def main_page(request: Request, current_user: UserSnapshot = Depends(get_current_user)):
     return templates.TemplateResponse(
         "main.html",
         {"request": request, "current_user": current_user}
     )
 
 @router.get("/dashboard")
-async def dashboard(request: Request, current_user: User = Depends(get_current_user)):
+async def dashboard(request: Request, current_user: UserSnapshot = Depends(get_current_user)):
     return templates.TemplateResponse(
         "dashboard.html",
         {"request": request, "current_user": current_user}
     )
 
 @router.get("/profile")
-async def profile(request: Request, current_user: User = Depends(get_current_user)):
+async def profile(request: Request, current_user: UserSnapshot = Depends(get_current_user)):
     return templates.TemplateResponse(
         "profile.html",
         {"request": request, "user": current_user}
     )
 
 @router.get("/meal-plan")
-async def meal_plan(request: Request, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def meal_plan(request: Request, current_user: UserSnapshot = Depends(get_current_user), db: Session = Depends(get_db)):
     week_key = get_week_key()
-    meal_plan = get_meal_plan(db, current_user.id, week_key)
+    meal_plan = get_meal_plan_data(db, current_user.id, week_key)
     
     return templates.TemplateResponse(
         "meal_plan.html",
         {"request": request, "current_user": current_user, "meal_plan": meal_plan}
     )
 
+def day_totals(rollup) -> Dict[str, Any]:
+    """What the user logged that day, or what their plan called for if they logged nothing"""
+    if rollup is None:
+        return {"calories": 0, "protein": 0.0, "carbs": 0.0, "fat": 0.0}
+    return rollup.totals("logged" if rollup.logged_entries else "planned")
+
+DEFAULT_RECOMMENDATIONS = [
+    "Increase protein intake by 10g per day",
+    "Consider adding more vegetables to your meals",
+    "Stay hydrated throughout the day"
+]
+
+def plan_recommendations(plan_data) -> List[str]:
+    """Recommendations from this week's plan against its own calorie and protein goals"""
+    if plan_data is None:
+        return DEFAULT_RECOMMENDATIONS
+    summary = summarize_plan(plan_data)
+    days = summary["days"].values()
+    recommendations = []
+    for goal, unit, label in (("calories", " kcal", "calorie"), ("protein", "g", "protein")):
+        low, high = summary["goals"][goal]
+        deviations = [day[f"{label}_deviation"] for day in days if day[f"{label}_deviation"]]
+        if low is None or not deviations:
+            continue
+        average = sum(deviations) / len(deviations)
+        direction = "above" if average > 0 else "below"
+        recommendations.append(
+            f"{len(deviations)} planned days are {direction} the {low:g}-{high:g}{unit} {label} goal "
+            f"by {abs(average):.0f}{unit} on average"
+        )
+    if summary["inconsistent_meals"]:
+        recommendations.append(
+            f"{len(summary['inconsistent_meals'])} planned meals list calories that don't match their macros"
+        )
+    return recommendations or ["This week's plan is within its calorie and protein goals"]
+
 @router.get("/nutrition-stats")
-async def nutrition_stats(request: Request, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    # Get the last 7 days of meal plans
-    week_key = get_week_key()
-    meal_plans = get_all_meal_plans(db, current_user.id, week_key)
+async def nutrition_stats(request: Request, current_user: UserSnapshot = Depends(get_current_user), db: Session = Depends(get_db)):
+    # The last 7 days, one rollup row each
+    today = datetime.utcnow().date()
+    start = today - timedelta(days=6)
+    await food_log_writer.flush_user(current_user.id)
+    week = [day_totals(rollup) for rollup in get_daily_rollups(db, current_user.id, start, 7)]
+    today_totals = week[-1]
     
-    # Calculate nutrition stats
     nutrition_stats = {
-        "daily_calories": 2000,  # Example value
-        "daily_protein": 150,    # Example value
-        "daily_carbs": 250,      # Example value
-        "daily_fat": 70,         # Example value
-        "weekly_labels": [f"Day {i+1}" for i in range(7)],
-        "weekly_calories": [2000] * 7,  # Example values
-        "recommendations": [
-            "Increase protein intake by 10g per day",
-            "Consider adding more vegetables to your meals",
-            "Stay hydrated throughout the day"
-        ]
+        "daily_calories": today_totals["calories"],
+        "daily_protein": today_totals["protein"],
+        "daily_carbs": today_totals["carbs"],
+        "daily_fat": today_totals["fat"],
+        "weekly_labels": [(start + timedelta(days=i)).strftime("%a") for i in range(7)],
+        "weekly_calories": [totals["calories"] for totals in week],
+        "recommendations": plan_recommendations(get_meal_plan_data(db, current_user.id, get_week_key()))
     }
     
     return templates.TemplateResponse(
@@ -75,17 +113,11 @@ async def nutrition_stats(request: Request, current_user: User = Depends(get_cur
     )
 
 @router.get("/grocery-list")
-async def grocery_list(request: Request, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def grocery_list(request: Request, current_user: UserSnapshot = Depends(get_current_user), db: Session = Depends(get_db)):
     week_key = get_week_key()
-    meal_plan = get_meal_plan(db, current_user.id, week_key)
+    meal_plan = get_meal_plan_data(db, current_user.id, week_key)
     
-    # Example grocery list structure
-    grocery_list = {
-        "Produce": ["Apples", "Bananas", "Spinach", "Carrots"],
-        "Dairy": ["Milk", "Cheese", "Yogurt"],
-        "Meat": ["Chicken breast", "Ground beef", "Salmon"],
-        "Pantry": ["Rice", "Pasta", "Olive oil", "Spices"]
-    } if meal_plan else None
+    grocery_list = grocery_list_sections(generate_grocery_list(meal_plan)) if meal_plan is not None else None
     
     return templates.TemplateResponse(
         "grocery_list.html",
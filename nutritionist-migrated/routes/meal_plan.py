@@ -3,23 +3,26 @@ from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
-import json
 import os
 
 from services.meal_plan_service import (
     get_meal_plan,
+    get_meal_plan_data,
     create_meal_plan,
     update_meal_plan,
     delete_meal_plan,
     get_all_meal_plans,
-    call_claude,
-    get_meal_prompt,
     get_week_key,
-    generate_grocery_list
+    generate_grocery_list,
+    generate_meal_plan_for_user
 )
+from services.job_queue import job_queue, JobQueueFullError
+from services.macro_engine import meal_macros, summarize_plan
+from services.meal_plan_days import get_meal_plan_day
+from services import jsoncodec
 from models.database import get_db
 from routes.auth import get_current_user
-from models.user import User
+from services.user_cache import UserSnapshot
 from models.meal_plan import MealPlan, MealPlanCreate, MealPlanResponse, Macros, Meal, DailyPlan, GroceryList
 
 router = APIRouter()
@@ -42,14 +45,15 @@ def create_meal_from_dict(meal_dict: Any) -> Meal:
         )
     
     # If it's a dictionary, extract the values
+    macros = meal_macros(meal_dict)
     return Meal(
         description=meal_dict.get("description", ""),
         ingredients=meal_dict.get("ingredients", []),
         macros=Macros(
-            calories=meal_dict.get("macros", {}).get("calories", 0),
-            protein=meal_dict.get("macros", {}).get("protein", 0),
-            carbs=meal_dict.get("macros", {}).get("carbs", 0),
-            fat=meal_dict.get("macros", {}).get("fat", 0)
+            calories=macros["calories"],
+            protein=macros["protein"],
+            carbs=macros["carbs"],
+            fat=macros["fats"]
         )
     )
 
@@ -73,7 +77,7 @@ def create_grocery_list_from_dict(grocery_dict: Dict[str, List[str]]) -> Grocery
 
 @router.get("/meal-plan", response_model=MealPlanResponse)
 async def get_meal_plan(
-    current_user: User = Depends(get_current_user),
+    current_user: UserSnapshot = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get the current meal plan for the user"""
@@ -85,8 +89,8 @@ async def get_meal_plan(
         raise HTTPException(status_code=404, detail="No meal plan found")
     
     try:
-        plan_data = json.loads(meal_plan.plan_data)
-    except json.JSONDecodeError:
+        plan_data = meal_plan.plan
+    except jsoncodec.DecodeError:
         # If the plan_data is not valid JSON, create a default structure
         plan_data = {
             "daily_plans": {},
@@ -117,10 +121,18 @@ async def get_meal_plan(
 
 @router.post("/meal-plan/generate", response_model=MealPlanResponse)
 async def generate_meal_plan(
-    current_user: User = Depends(get_current_user),
+    background: bool = False,
+    current_user: UserSnapshot = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Generate a new meal plan for the user"""
+    """Generate a new meal plan for the user.
+
+    With `background=true` the plan is generated by Claude in a background job;
+    the response is 202 with a job id to poll at /api/jobs/{job_id}.
+    """
+    if background:
+        return enqueue_meal_plan_generation(current_user.id, get_week_key())
+
     # Example meal plan with nutrition facts
     example_plan = {
         "daily_plans": {
@@ -185,18 +197,8 @@ async def generate_meal_plan(
         }
     }
     
-    # Create new meal plan
-    meal_plan = MealPlan(
-        user_id=current_user.id,
-        week_key=get_week_key(),
-        plan_data=json.dumps(example_plan),
-        created_at=datetime.utcnow(),
-        updated_at=datetime.utcnow()
-    )
-    
-    db.add(meal_plan)
-    db.commit()
-    db.refresh(meal_plan)
+    # Create new meal plan (also writes day rows, rollups and invalidates the plan cache)
+    meal_plan = create_meal_plan(db, current_user.id, get_week_key(), example_plan)
     
     # Convert the plan data to the proper structure
     daily_plans = {
@@ -214,46 +216,71 @@ async def generate_meal_plan(
         grocery_list=grocery_list
     )
 
+@router.get("/meal-plan/today")
+async def get_today_meal_plan(
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get today's meals from the current week's plan, reading only that day."""
+    today = datetime.now().strftime("%A").lower()
+    day = get_meal_plan_day(db, current_user.id, get_week_key(), today)
+    if day is None:
+        raise HTTPException(status_code=404, detail=f"No meal plan found for {today}")
+    return day
+
+@router.get("/meal-plan/{week_key}/days/{day}")
+async def get_meal_plan_day_by_week(
+    week_key: str,
+    day: str,
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get one day of a specific meal plan."""
+    plan_day = get_meal_plan_day(db, current_user.id, week_key, day)
+    if plan_day is None:
+        raise HTTPException(status_code=404, detail="Meal plan day not found")
+    return plan_day
+
 @router.get("/meal-plan/{week_key}")
 async def get_meal_plan_by_week(
     week_key: str,
-    current_user: User = Depends(get_current_user),
+    current_user: UserSnapshot = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get a specific meal plan by week key."""
-    meal_plan = get_meal_plan(db, current_user.id, week_key)
-    if meal_plan:
-        return json.loads(meal_plan.plan_data)
+    plan_data = get_meal_plan_data(db, current_user.id, week_key)
+    if plan_data is not None:
+        return plan_data
     raise HTTPException(status_code=404, detail="Meal plan not found")
 
 @router.post("/meal-plan/{week_key}")
 async def create_meal_plan_by_week(
     week_key: str,
     plan_data: dict,
-    current_user: User = Depends(get_current_user),
+    current_user: UserSnapshot = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Create a meal plan for a specific week."""
     meal_plan = create_meal_plan(db, current_user.id, week_key, plan_data)
-    return json.loads(meal_plan.plan_data)
+    return meal_plan.plan
 
 @router.put("/meal-plan/{week_key}")
 async def update_meal_plan_by_week(
     week_key: str,
     plan_data: dict,
-    current_user: User = Depends(get_current_user),
+    current_user: UserSnapshot = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Update a meal plan for a specific week."""
     meal_plan = update_meal_plan(db, current_user.id, week_key, plan_data)
     if meal_plan:
-        return json.loads(meal_plan.plan_data)
+        return meal_plan.plan
     raise HTTPException(status_code=404, detail="Meal plan not found")
 
 @router.delete("/meal-plan/{week_key}")
 async def delete_meal_plan_by_week(
     week_key: str,
-    current_user: User = Depends(get_current_user),
+    current_user: UserSnapshot = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Delete a meal plan for a specific week."""
@@ -265,21 +292,32 @@ async def delete_meal_plan_by_week(
 @router.get("/meal-plan/{week_key}/grocery-list")
 async def get_grocery_list(
     week_key: str,
-    current_user: User = Depends(get_current_user),
+    current_user: UserSnapshot = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get the grocery list for a specific meal plan."""
-    meal_plan = get_meal_plan(db, current_user.id, week_key)
-    if not meal_plan:
+    plan_data = get_meal_plan_data(db, current_user.id, week_key)
+    if plan_data is None:
         raise HTTPException(status_code=404, detail="Meal plan not found")
     
-    plan_data = json.loads(meal_plan.plan_data)
     return generate_grocery_list(plan_data)
 
+@router.get("/meal-plan/{week_key}/stats")
+async def get_meal_plan_stats(
+    week_key: str,
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Daily totals, weekly averages, goal deviations and kcal consistency for a meal plan."""
+    plan_data = get_meal_plan_data(db, current_user.id, week_key)
+    if plan_data is None:
+        raise HTTPException(status_code=404, detail="Meal plan not found")
+    return summarize_plan(plan_data)
+
 @router.get("/")
 async def read_meal_plans_old(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     week_key = get_week_key()
     meal_plans = get_all_meal_plans(db, current_user.id, week_key)
@@ -289,7 +327,7 @@ async def read_meal_plans_old(
 async def read_meal_plan(
     meal_plan_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     meal_plan = get_meal_plan(db, meal_plan_id)
     if meal_plan is None:
@@ -300,7 +338,7 @@ async def read_meal_plan(
 async def create_meal_plan_endpoint(
     meal_plan: dict,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     return create_meal_plan(db, meal_plan)
 
@@ -309,7 +347,7 @@ async def update_meal_plan_endpoint(
     meal_plan_id: int,
     meal_plan: dict,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     updated_meal_plan = update_meal_plan(db, meal_plan_id, meal_plan)
     if updated_meal_plan is None:
@@ -320,7 +358,7 @@ async def update_meal_plan_endpoint(
 async def delete_meal_plan_endpoint(
     meal_plan_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
     success = delete_meal_plan(db, meal_plan_id)
     if not success:
@@ -329,50 +367,24 @@ async def delete_meal_plan_endpoint(
 
 @router.post("/generate")
 async def generate_meal_plan_old(
+    background: bool = False,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: UserSnapshot = Depends(get_current_user)
 ):
+    # Get the current week key
+    week_key = get_week_key()
+    
+    if background:
+        return enqueue_meal_plan_generation(current_user.id, week_key)
+    
     try:
-        # Get the current week key
-        week_key = get_week_key()
-        
-        # Generate meal plan using Claude
-        prompt = get_meal_prompt()
-        response = call_claude(prompt)
-        
-        if isinstance(response, dict) and "error" in response:
-            raise HTTPException(
-                status_code=500,
-                detail=f"Failed to generate meal plan: {response['error']}"
-            )
-        
-        # Parse the response into a structured format
-        try:
-            plan_data = json.loads(response)
-        except json.JSONDecodeError:
-            # If response is not JSON, create a structured format
-            plan_data = {
-                "overview": response,
-                "daily_plans": {},
-                "grocery_list": {
-                    "sunday": [],
-                    "wednesday": []
-                }
-            }
-        
-        # Save the meal plan
-        meal_plan = create_meal_plan(
-            db=db,
-            user_id=current_user.id,
-            week_key=week_key,
-            plan_data=plan_data
-        )
+        result = await generate_meal_plan_for_user(current_user.id, week_key)
         
         return JSONResponse(
             status_code=status.HTTP_201_CREATED,
             content={
                 "message": "Meal plan generated successfully",
-                "meal_plan": meal_plan
+                "meal_plan": result["plan"]
             }
         )
         
@@ -380,4 +392,20 @@ async def generate_meal_plan_old(
         raise HTTPException(
             status_code=500,
             detail=f"Failed to generate meal plan: {str(e)}"
-        ) 
\ No newline at end of file
+        )
+
+def enqueue_meal_plan_generation(user_id: int, week_key: str) -> JSONResponse:
+    """Queue a background generation job and return its id for polling."""
+    try:
+        job_id = job_queue.enqueue(
+            "generate_meal_plan",
+            {"user_id": user_id, "week_key": week_key},
+            user_id=user_id
+        )
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={"status": "queued", "job_id": job_id}
+    )
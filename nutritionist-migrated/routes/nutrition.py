@@ -1,27 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, File, Request, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import Optional
+from sqlalchemy import and_, or_
+from typing import Optional, List, Dict, Any, Tuple
+from datetime import datetime, date, timedelta
+import asyncio
 import logging
 
 from services.nutrition_service import (
     analyze_food_image, 
-    validate_image_file, 
+    read_image_upload,
     save_nutrition_analysis,
     NutritionAnalysisError
 )
 from models.database import get_db
-from routes.auth import get_current_user
-from models.user import User
+from routes.auth import get_current_user, get_optional_user
+from services.user_cache import UserSnapshot
+from models.food_log import FoodLog
+from models.nutrition_rollup import DailyNutritionRollup
+from services.food_log_writer import food_log_writer
+from services.nutrition_rollups import get_daily_rollups
+from services import jsoncodec
+from middleware.rate_limit import charge
+from config import IMAGE_BATCH_MAX_IMAGES, IMAGE_BATCH_CONCURRENCY
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Error codes caused by the upload itself rather than by the service
+CLIENT_ERROR_CODES = ["INVALID_FILE_TYPE", "FILE_TOO_LARGE", "INVALID_IMAGE"]
+
+def analysis_response(analysis_result: Dict[str, Any]) -> Dict[str, Any]:
+    """Public shape of a successful analysis"""
+    return {
+        "success": True,
+        "analysis": {
+            "calories": analysis_result["calories"],
+            "description": analysis_result["description"],
+            "protein": analysis_result.get("protein", 0),
+            "carbs": analysis_result.get("carbs", 0),
+            "fat": analysis_result.get("fat", 0),
+            "timestamp": analysis_result["timestamp"]
+        },
+        "cached": analysis_result["cached"],
+        "preprocessing": analysis_result["preprocessing"]
+    }
+
 @router.post("/analyze-image")
 async def analyze_food_image_endpoint(
-    image: UploadFile = File(...)
+    image: UploadFile = File(...),
+    current_user: Optional[UserSnapshot] = Depends(get_optional_user)
 ):
     """
     Analyze a food image and return calorie and nutrition information
@@ -29,41 +59,28 @@ async def analyze_food_image_endpoint(
     This endpoint accepts an image file and uses Anthropic's Claude Vision API to analyze
     the food content and provide nutritional estimates.
     
-    No authentication required - this is a public endpoint.
+    No authentication required - this is a public endpoint. For logged-in users the
+    result is also added to their nutrition history.
     """
     try:
-        # Read file contents
-        contents = await image.read()
-        
-        # Validate file
-        validate_image_file(image.content_type, len(contents))
+        # Validate and hash the upload in chunks; the spooled file is then
+        # handed to the decoder as-is instead of being read into memory
+        image_file, sha, _ = await read_image_upload(image)
         
         # Analyze the image
-        analysis_result = await analyze_food_image(contents, image.content_type)
+        analysis_result = await analyze_food_image(image_file, image.content_type, sha=sha)
         
-        # Note: Not saving to database since this is now a public endpoint
-        # If you want to save analysis history, you'll need authentication
+        # Anonymous analyses aren't kept; logged-in users get a history entry
+        if current_user is not None:
+            await save_nutrition_analysis(current_user.id, analysis_result, image.filename, sha)
         
         # Return successful response
-        return JSONResponse(
-            status_code=200,
-            content={
-                "success": True,
-                "analysis": {
-                    "calories": analysis_result["calories"],
-                    "description": analysis_result["description"],
-                    "protein": analysis_result.get("protein", 0),
-                    "carbs": analysis_result.get("carbs", 0),
-                    "fat": analysis_result.get("fat", 0),
-                    "timestamp": analysis_result["timestamp"]
-                }
-            }
-        )
+        return JSONResponse(status_code=200, content=analysis_response(analysis_result))
         
     except NutritionAnalysisError as e:
         logger.error(f"Nutrition analysis error: {e.message}")
         raise HTTPException(
-            status_code=400 if e.code in ["INVALID_FILE_TYPE", "FILE_TOO_LARGE"] else 500,
+            status_code=400 if e.code in CLIENT_ERROR_CODES else 500,
             detail={"error": e.message, "code": e.code}
         )
     except Exception as e:
@@ -73,25 +90,152 @@ async def analyze_food_image_endpoint(
             detail={"error": "Internal server error", "code": "INTERNAL_ERROR"}
         )
 
+async def analyze_batch_item(index: int, image: UploadFile, semaphore: asyncio.Semaphore, user_id: Optional[int]) -> Dict[str, Any]:
+    """Analyze one image of a batch, turning failures into a per-image error result"""
+    result = {"index": index, "filename": image.filename}
+    try:
+        async with semaphore:
+            image_file, sha, _ = await read_image_upload(image)
+            analysis_result = await analyze_food_image(image_file, image.content_type, sha=sha)
+        if user_id is not None:
+            await save_nutrition_analysis(user_id, analysis_result, image.filename, sha)
+        result.update(analysis_response(analysis_result))
+    except NutritionAnalysisError as e:
+        logger.error(f"Nutrition analysis error for batch image {index}: {e.message}")
+        result.update({"success": False, "error": {"error": e.message, "code": e.code}})
+    except Exception as e:
+        logger.error(f"Unexpected error analyzing batch image {index}: {e}")
+        result.update({"success": False, "error": {"error": "Internal server error", "code": "INTERNAL_ERROR"}})
+    return result
+
+@router.post("/analyze-images")
+async def analyze_food_images_endpoint(
+    request: Request,
+    images: List[UploadFile] = File(...),
+    stream: bool = False,
+    current_user: Optional[UserSnapshot] = Depends(get_optional_user)
+):
+    """
+    Analyze several food images from one multipart request
+    
+    Images are analyzed concurrently, at most IMAGE_BATCH_CONCURRENCY at a time.
+    Every image gets its own result: the same shape as /analyze-image on success,
+    or {"success": false, "error": {"error", "code"}} on failure, so one bad photo
+    doesn't fail the batch. With `stream=true`, results are pushed as Server-Sent
+    Events in completion order as each image finishes. Each image costs one
+    request against the /analyze-image rate limit.
+    
+    No authentication required - this is a public endpoint. For logged-in users
+    successful results are also added to their nutrition history.
+    """
+    if len(images) > IMAGE_BATCH_MAX_IMAGES:
+        raise HTTPException(
+            status_code=400,
+            detail={"error": f"Too many images. Maximum is {IMAGE_BATCH_MAX_IMAGES}", "code": "TOO_MANY_IMAGES"}
+        )
+    # The rate limit middleware already took one token for the request
+    charge(request, len(images) - 1)
+    
+    semaphore = asyncio.Semaphore(IMAGE_BATCH_CONCURRENCY)
+    user_id = current_user.id if current_user is not None else None
+    tasks = [asyncio.ensure_future(analyze_batch_item(i, image, semaphore, user_id)) for i, image in enumerate(images)]
+    
+    if not stream:
+        results = await asyncio.gather(*tasks)
+        return JSONResponse(status_code=200, content={
+            "success": all(result["success"] for result in results),
+            "results": results
+        })
+    
+    async def events():
+        succeeded = 0
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                result = await next_result
+                succeeded += result["success"]
+                yield f"event: result\ndata: {jsoncodec.dumps(result)}\n\n"
+            yield f"event: done\ndata: {jsoncodec.dumps({'total': len(tasks), 'succeeded': succeeded})}\n\n"
+        finally:
+            # Client went away mid-batch; don't keep paying for the rest
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/health")
 async def nutrition_health_check():
     """Health check endpoint for nutrition service"""
     return {"status": "ok", "service": "nutrition"}
 
-# TODO: Add endpoints for nutrition history
-# @router.get("/history")
-# async def get_nutrition_history(
-#     current_user: User = Depends(get_current_user),
-#     db: Session = Depends(get_db)
-# ):
-#     """Get user's nutrition analysis history"""
-#     pass
+def parse_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Cursors are "<logged_at isoformat>_<id>" of the last entry on the previous page"""
+    try:
+        logged_at, entry_id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(logged_at), int(entry_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail={"error": "Invalid cursor", "code": "INVALID_CURSOR"})
+
+@router.get("/history")
+async def get_nutrition_history(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get the user's nutrition analysis history, newest first
+    
+    Uses keyset pagination on (logged_at, id): pass the returned `next_cursor` to
+    get the next page. Every page is a single index range scan on
+    (user_id, logged_at, id), however far back the user scrolls.
+    """
+    limit = max(1, min(limit, 200))
+    await food_log_writer.flush_user(current_user.id)
+    
+    query = db.query(FoodLog).filter(FoodLog.user_id == current_user.id)
+    if cursor:
+        logged_at, entry_id = parse_history_cursor(cursor)
+        query = query.filter(or_(
+            FoodLog.logged_at < logged_at,
+            and_(FoodLog.logged_at == logged_at, FoodLog.id < entry_id)
+        ))
+    entries = query.order_by(FoodLog.logged_at.desc(), FoodLog.id.desc()).limit(limit + 1).all()
+    
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    next_cursor = f"{entries[-1].logged_at.isoformat()}_{entries[-1].id}" if has_more else None
+    return {"entries": [entry.to_dict() for entry in entries], "next_cursor": next_cursor}
+
+def rollup_summary(day: date, rollup: Optional[DailyNutritionRollup]) -> Dict[str, Any]:
+    if rollup is None:
+        empty = {"calories": 0, "protein": 0.0, "carbs": 0.0, "fat": 0.0}
+        return {"date": day.isoformat(), "entries": 0, "logged": empty, "planned": dict(empty)}
+    return {
+        "date": day.isoformat(),
+        "entries": rollup.logged_entries,
+        "logged": rollup.totals("logged"),
+        "planned": rollup.totals("planned"),
+    }
 
-# TODO: Add endpoint for daily nutrition summary
-# @router.get("/daily-summary")
-# async def get_daily_nutrition_summary(
-#     current_user: User = Depends(get_current_user),
-#     db: Session = Depends(get_db)
-# ):
-#     """Get daily nutrition summary for the user"""
-#     pass 
\ No newline at end of file
+@router.get("/daily-summary")
+async def get_daily_nutrition_summary(
+    day: Optional[date] = None,
+    days: int = 1,
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Get daily nutrition totals for the user: what was logged and what the meal
+    plan called for, for `days` consecutive UTC days starting at `day`
+    (defaults to today). Reads one rollup row per day.
+    """
+    days = max(1, min(days, 366))
+    start = day or datetime.utcnow().date()
+    await food_log_writer.flush_user(current_user.id)
+    
+    rollups = get_daily_rollups(db, current_user.id, start, days)
+    return {"days": [rollup_summary(start + timedelta(days=offset), rollup) for offset, rollup in enumerate(rollups)]}
@@ -2,7 +2,6 @@ import os
 import sys
 from sqlalchemy.orm import Session
 from datetime import datetime
-import bcrypt
 
 # Add the project root directory to the Python path
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -11,6 +10,7 @@ sys.path.insert(0, project_root)
 from models.database import Base, engine, get_db
 from models.user import User
 from models.meal_plan import MealPlan, Modification
+from services.password_hasher import hash_password
 
 def init_db():
     # Ensure data directory exists
@@ -27,13 +27,10 @@ def create_admin_user(db: Session):
         return
 
     # Create admin user
-    salt = bcrypt.gensalt()
-    hashed_password = bcrypt.hashpw("admin".encode(), salt)
-    
     admin = User(
         username="admin",
         email="admin@example.com",
-        hashed_password=hashed_password.decode(),
+        hashed_password=hash_password("admin"),
         is_active=True,
         is_admin=True,
         created_at=datetime.utcnow(),
@@ -0,0 +1,40 @@
+import argparse
+import os
+import sys
+import time
+
+# Add the project root directory to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from models.database import SessionLocal, engine
+from models.food_log import FoodLog
+from services.nutrition_rollups import create_rollup_tables, rebuild_rollups
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the daily and weekly nutrition rollups from food logs and meal plans")
+    parser.add_argument("--user-id", type=int, help="Only rebuild this user's rollups")
+    args = parser.parse_args()
+
+    create_rollup_tables()
+    FoodLog.__table__.create(bind=engine, checkfirst=True)
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        counts = rebuild_rollups(db, user_id=args.user_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    elapsed = time.perf_counter() - started
+    scope = f"user {args.user_id}" if args.user_id is not None else "all users"
+    print(f"Rebuilt rollups for {scope} in {elapsed:.2f}s")
+    print(f"  Logged days: {counts['log_days']}")
+    print(f"  Planned weeks: {counts['plan_weeks']}")
+
+if __name__ == "__main__":
+    main()
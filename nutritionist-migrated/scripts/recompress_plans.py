@@ -0,0 +1,115 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+# Add the project root directory to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from sqlalchemy import inspect, text
+
+from config import BLOB_COMPRESSION
+from models.database import SessionLocal, engine
+from services.blob_codec import ALGORITHMS, DEFAULT_DICTIONARY_SIZE, BlobCodec, train_dictionary
+from services.blob_dictionaries import init_dictionaries, load_dictionaries, save_dictionary
+
+# (table, column) pairs stored through CompressedText
+BLOB_COLUMNS = [
+    ("meal_plans", "plan_data"),
+    ("meal_plan_days", "plan_data"),
+]
+
+def database_size(db) -> int:
+    if engine.dialect.name != "sqlite":
+        return 0
+    page_size = db.execute(text("PRAGMA page_size")).scalar()
+    pages = db.execute(text("PRAGMA page_count")).scalar()
+    free = db.execute(text("PRAGMA freelist_count")).scalar()
+    return (pages - free) * page_size
+
+def plan_read_latency(db, codec: BlobCodec, rounds: int = 5):
+    """Median microseconds to select, decode and parse one weekly plan."""
+    ids = db.execute(text("SELECT id FROM meal_plans")).scalars().all()
+    if not ids:
+        return None
+    samples = []
+    for _ in range(rounds):
+        for plan_id in ids:
+            start = time.perf_counter()
+            value = db.execute(text("SELECT plan_data FROM meal_plans WHERE id = :id"), {"id": plan_id}).scalar()
+            json.loads(codec.decode(value))
+            samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+def report(label: str, db, codec: BlobCodec, columns) -> None:
+    latency = plan_read_latency(db, codec)
+    print(f"{label}:")
+    print(f"  Database size: {database_size(db) / 1024:.1f}KB")
+    for table, column in columns:
+        size = db.execute(text(f"SELECT COALESCE(SUM(LENGTH(CAST({column} AS BLOB))), 0) FROM {table}")).scalar()
+        print(f"  {table}.{column}: {size / 1024:.1f}KB")
+    print(f"  Plan read latency (p50): {latency:.1f}us" if latency is not None else "  No plans stored")
+
+def main():
+    parser = argparse.ArgumentParser(description="Rewrite stored meal plans with the given compression and report size and read latency before and after")
+    parser.add_argument("--algorithm", choices=ALGORITHMS, default=BLOB_COMPRESSION if BLOB_COMPRESSION != "none" else "zlib")
+    parser.add_argument("--level", type=int)
+    parser.add_argument("--train-dictionary", action="store_true", help="Train a dictionary on the stored plans first")
+    parser.add_argument("--dictionary-size", type=int, default=DEFAULT_DICTIONARY_SIZE)
+    parser.add_argument("--no-vacuum", action="store_true", help="Skip VACUUM (freed pages stay in the file)")
+    args = parser.parse_args()
+
+    init_dictionaries()
+    codec = BlobCodec(args.algorithm, args.level)
+    tables = set(inspect(engine).get_table_names())
+    columns = [(table, column) for table, column in BLOB_COLUMNS if table in tables]
+
+    db = SessionLocal()
+    try:
+        load_dictionaries(db, codec)
+        report("Before", db, codec, columns)
+
+        if args.train_dictionary and args.algorithm != "none":
+            rows = db.execute(text("SELECT plan_data FROM meal_plans ORDER BY updated_at")).scalars()
+            samples = [codec.decode(value) for value in rows]
+            dictionary = train_dictionary(args.algorithm, samples, args.dictionary_size)
+            dictionary_id = save_dictionary(db, dictionary, codec)
+            db.commit()
+            print(f"Trained {args.algorithm} dictionary {dictionary_id} ({len(dictionary)} bytes) on {len(samples)} plans")
+
+        # Raw SQL so values are re-encoded with this codec rather than the app's
+        started = time.perf_counter()
+        rewritten = 0
+        for table, column in columns:
+            rows = db.execute(text(f"SELECT rowid AS row_id, {column} AS value FROM {table}")).all()
+            if rows:
+                db.execute(
+                    text(f"UPDATE {table} SET {column} = :value WHERE rowid = :row_id"),
+                    [{"value": codec.encode(codec.decode(row.value)), "row_id": row.row_id} for row in rows],
+                )
+            db.commit()
+            rewritten += len(rows)
+        print(f"Rewrote {rewritten} values with {args.algorithm} in {time.perf_counter() - started:.2f}s")
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    if not args.no_vacuum and engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+
+    db = SessionLocal()
+    try:
+        report("After", db, codec, columns)
+    finally:
+        db.close()
+    if args.algorithm != BLOB_COMPRESSION:
+        print(f"Set BLOB_COMPRESSION={args.algorithm} for the server so new plans are stored the same way")
+
+if __name__ == "__main__":
+    main()
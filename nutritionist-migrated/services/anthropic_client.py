@@ -0,0 +1,23 @@
+import anthropic
+import logging
+
+from config import ANTHROPIC_API_KEY
+
+logger = logging.getLogger(__name__)
+
+# Shared async client so every LLM call awaits on the event loop instead of
+# blocking it, and HTTP connections are pooled across requests and services.
+_async_anthropic_client = None
+
+def get_async_anthropic_client() -> anthropic.AsyncAnthropic:
+    """Get the shared AsyncAnthropic client, creating it on first use"""
+    global _async_anthropic_client
+    if _async_anthropic_client is None:
+        if not ANTHROPIC_API_KEY:
+            raise ValueError("ANTHROPIC_API_KEY environment variable not set")
+        try:
+            _async_anthropic_client = anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
+        except Exception as e:
+            logger.error(f"Failed to initialize Anthropic client: {e}")
+            raise
+    return _async_anthropic_client
@@ -0,0 +1,42 @@
+from typing import Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models.blob_dictionary import BlobDictionary
+from models.database import SessionLocal, engine
+from services.blob_codec import BlobCodec, blob_codec
+
+# Trained dictionaries live in the database so every worker, and every row
+# ever written with one, can find it by id.
+
+def init_dictionaries() -> None:
+    """Create blob_dictionaries and load it into blob_codec; call before reading plans."""
+    BlobDictionary.__table__.create(bind=engine, checkfirst=True)
+    db = SessionLocal()
+    try:
+        load_dictionaries(db)
+    finally:
+        db.close()
+    blob_codec.loader = fetch_dictionary
+
+def fetch_dictionary(dictionary_id: int) -> Optional[Tuple[str, bytes]]:
+    """Read one dictionary, for rows written with one trained after startup."""
+    db = SessionLocal()
+    try:
+        row = db.get(BlobDictionary, dictionary_id)
+        return None if row is None else (row.algorithm, row.data)
+    finally:
+        db.close()
+
+def load_dictionaries(db: Session, codec: BlobCodec = blob_codec) -> None:
+    """Register every stored dictionary; the newest one for the codec's algorithm becomes active."""
+    for row in db.query(BlobDictionary).order_by(BlobDictionary.id):
+        codec.add_dictionary(row.id, row.algorithm, row.data)
+
+def save_dictionary(db: Session, data: bytes, codec: BlobCodec = blob_codec) -> int:
+    """Store a trained dictionary and make it the codec's active one; the caller commits."""
+    row = BlobDictionary(algorithm=codec.algorithm, data=data)
+    db.add(row)
+    db.flush()
+    codec.add_dictionary(row.id, codec.algorithm, data)
+    return row.id
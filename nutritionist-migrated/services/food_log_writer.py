@@ -0,0 +1,133 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set
+
+from models.database import SessionLocal, engine
+from models.food_log import FoodLog
+from services.nutrition_rollups import apply_food_logs
+from config import FOOD_LOG_BATCH_SIZE, FOOD_LOG_FLUSH_INTERVAL, FOOD_LOG_MAX_BUFFER
+
+logger = logging.getLogger(__name__)
+
+class FoodLogWriter:
+    """
+    Write-behind buffer for food log rows.
+
+    The analyze endpoints only append to an in-memory buffer; a background task
+    inserts the buffer in one transaction every flush_interval seconds, or as
+    soon as batch_size rows are waiting, so a request never waits on a commit.
+    The same transaction adds the rows to the daily and weekly rollups.
+    Whatever is still buffered is flushed on shutdown.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = FOOD_LOG_BATCH_SIZE,
+        flush_interval: float = FOOD_LOG_FLUSH_INTERVAL,
+        max_buffer: int = FOOD_LOG_MAX_BUFFER,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer: List[Dict[str, Any]] = []
+        self._writing: Set[int] = set()  # users in the batch being written
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failures = 0
+
+    async def start(self) -> None:
+        FoodLog.__table__.create(bind=engine, checkfirst=True)
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def add(self, row: Dict[str, Any]) -> None:
+        """Buffer a FoodLog row (as column values); never blocks."""
+        if len(self._buffer) >= self.max_buffer:
+            # The database has been failing for a while; shed load rather than grow without bound
+            self.dropped += 1
+            logger.warning("Food log buffer full, dropping entry")
+            return
+        self._buffer.append(row)
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def has_pending(self, user_id: int) -> bool:
+        """True while this user has entries buffered or in a batch not yet committed."""
+        return user_id in self._writing or any(row["user_id"] == user_id for row in self._buffer)
+
+    async def flush_user(self, user_id: int) -> None:
+        """
+        Flush if this user has uncommitted entries, so their reads see their own
+        writes. flush() takes the flush lock, so this also waits out a batch of
+        theirs that a background flush is already writing.
+        """
+        if self.has_pending(user_id):
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write everything buffered so far."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            batch, self._buffer = self._buffer, []
+            self._writing = {row["user_id"] for row in batch}
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(None, self._write, batch)
+            except Exception as e:
+                logger.error(f"Failed to write {len(batch)} food log entries: {e}")
+                self.failures += 1
+                # Keep them for the next flush, ahead of anything newer
+                self._buffer[:0] = batch[:max(self.max_buffer - len(self._buffer), 0)]
+                return
+            finally:
+                self._writing = set()
+            self.written += len(batch)
+            self.batches += 1
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        db = SessionLocal()
+        try:
+            db.bulk_insert_mappings(FoodLog, batch)
+            # Rollups commit with the rows they count
+            apply_food_logs(db, batch)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._buffer),
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failures": self.failures,
+        }
+
+food_log_writer = FoodLogWriter()
@@ -0,0 +1,239 @@
+import re
+import threading
+from collections import OrderedDict
+from fractions import Fraction
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from config import GROCERY_CACHE_SIZE
+
+# Builds the weekly grocery list from each meal's portion_sizes strings
+# ("5 oz chicken breast", "1/2 cup quinoa", "1 scoop protein powder").
+# Every string is parsed into quantity, unit and ingredient, the unit is
+# normalized (weights to oz, volumes to cups), and quantities are summed per
+# shopping window. The list is requested far more often than plans change,
+# so parsed strings are memoized and finished lists are cached per plan.
+
+# Plans are shopped for twice a week; each run covers the days up to the next one
+SHOPPING_WINDOWS = {
+    "sunday": ("monday", "tuesday", "wednesday"),
+    "wednesday": ("thursday", "friday", "saturday", "sunday"),
+}
+
+# portion_sizes keys -> grocery list category
+CATEGORIES = {
+    "meat": "Protein",
+    "carbs": "Carbs",
+    "vegetables": "Produce",
+}
+
+EACH = "each"
+
+# unit spelling -> (canonical unit, factor to canonical)
+UNITS = {
+    "oz": ("oz", 1.0), "ounce": ("oz", 1.0), "ounces": ("oz", 1.0),
+    "lb": ("oz", 16.0), "lbs": ("oz", 16.0), "pound": ("oz", 16.0), "pounds": ("oz", 16.0),
+    "g": ("oz", 1 / 28.3495), "gram": ("oz", 1 / 28.3495), "grams": ("oz", 1 / 28.3495),
+    "kg": ("oz", 35.274),
+    "cup": ("cup", 1.0), "cups": ("cup", 1.0), "c": ("cup", 1.0),
+    "tbsp": ("cup", 1 / 16), "tablespoon": ("cup", 1 / 16), "tablespoons": ("cup", 1 / 16),
+    "tsp": ("cup", 1 / 48), "teaspoon": ("cup", 1 / 48), "teaspoons": ("cup", 1 / 48),
+    "ml": ("cup", 1 / 236.588),
+    "scoop": ("scoop", 1.0), "scoops": ("scoop", 1.0),
+    "slice": ("slice", 1.0), "slices": ("slice", 1.0),
+    "serving": ("serving", 1.0), "servings": ("serving", 1.0),
+    "can": ("can", 1.0), "cans": ("can", 1.0),
+}
+
+# Size words carry no quantity; "1 medium apple" is one apple
+SIZE_WORDS = {"small", "medium", "large"}
+
+UNICODE_FRACTIONS = {"½": "1/2", "⅓": "1/3", "⅔": "2/3", "¼": "1/4", "¾": "3/4", "⅛": "1/8"}
+
+PORTION_PATTERN = re.compile(
+    r"^\s*(?P<quantity>\d+\s+\d+/\d+|\d+/\d+|\d+(?:\.\d+)?)"
+    r"(?:\s*-\s*(?P<upper>\d+/\d+|\d+(?:\.\d+)?))?"
+    r"\s*(?P<unit>" + "|".join(sorted(map(re.escape, UNITS), key=len, reverse=True)) + r")?(?:\.|\b)"
+    r"\s*(?:of\s+)?(?P<ingredient>.*?)\s*$",
+    re.IGNORECASE,
+)
+
+
+class Portion(NamedTuple):
+    quantity: float
+    unit: str
+    ingredient: str
+
+
+def _quantity(text: str) -> float:
+    return float(sum(Fraction(part) for part in text.split()))
+
+
+def _ingredient_key(name: str, unit: str) -> str:
+    name = " ".join(name.lower().split())
+    # Counted items are written singular or plural ("1 banana", "2 eggs")
+    if unit == EACH and name.endswith("s") and not name.endswith("ss"):
+        name = name[:-1]
+    return name
+
+
+@lru_cache(maxsize=4096)
+def parse_portion(text: str) -> Optional[Portion]:
+    """"1/2 cup quinoa" -> Portion(0.5, "cup", "quinoa"); None if there is no leading quantity."""
+    for symbol, fraction in UNICODE_FRACTIONS.items():
+        text = text.replace(symbol, f" {fraction}")
+    match = PORTION_PATTERN.match(text)
+    if not match or not match.group("ingredient"):
+        return None
+    quantity = _quantity(match.group("quantity"))
+    if match.group("upper"):
+        # A range ("1-2 cups") is shopped for at the top end
+        quantity = _quantity(match.group("upper"))
+    unit, factor = UNITS.get((match.group("unit") or "").lower(), (EACH, 1.0))
+    words = match.group("ingredient").split()
+    if unit == EACH and len(words) > 1 and words[0].lower() in SIZE_WORDS:
+        words = words[1:]
+    return Portion(quantity * factor, unit, " ".join(words))
+
+
+def format_quantity(quantity: float) -> str:
+    """2.5 -> "2 1/2"; falls back to decimals for anything that isn't a simple fraction."""
+    fraction = Fraction(quantity).limit_denominator(8)
+    if abs(float(fraction) - quantity) > 0.01:
+        return f"{quantity:.2f}".rstrip("0").rstrip(".")
+    whole, remainder = divmod(fraction, 1)
+    if not remainder:
+        return str(int(whole))
+    return f"{int(whole)} {remainder}" if whole else str(remainder)
+
+
+def _item_text(quantity: float, unit: str, name: str) -> str:
+    amount = format_quantity(quantity)
+    if unit == EACH:
+        if quantity > 1 and not name.endswith("s"):
+            name += "s"
+        return f"{amount} {name}"
+    if unit == "cup" and quantity < 0.25:
+        # Small volumes read better in tablespoons
+        quantity, unit = quantity * 16, "tbsp"
+        amount = format_quantity(quantity)
+    elif unit not in ("oz", "tbsp") and quantity > 1:
+        unit += "s"
+    return f"{amount} {unit} {name}"
+
+
+def build_grocery_list(plan_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Sum the plan's portion_sizes per shopping window.
+
+    Returns {"windows": {window: {"days": [...], "items": [...]}}, "unparsed": [...]}
+    where each item is {"ingredient", "quantity", "unit", "category", "text"},
+    sorted by category and ingredient.
+    """
+    body = plan_data.get("meal_plan", plan_data) if isinstance(plan_data, dict) else {}
+    daily_plans = body.get("daily_plans") if isinstance(body, dict) else None
+    daily_plans = {str(day).lower(): meals for day, meals in (daily_plans or {}).items()}
+
+    windows = {}
+    unparsed = []
+    for window, days in SHOPPING_WINDOWS.items():
+        totals: Dict[tuple, Dict[str, Any]] = {}
+        for day in days:
+            meals = daily_plans.get(day)
+            if not isinstance(meals, dict):
+                continue
+            for meal in meals.values():
+                portions = meal.get("portion_sizes") if isinstance(meal, dict) else None
+                if not isinstance(portions, dict):
+                    continue
+                for portion_type, text in portions.items():
+                    if not isinstance(text, str) or not text.strip():
+                        continue
+                    portion = parse_portion(text.strip())
+                    if portion is None:
+                        unparsed.append(text.strip())
+                        continue
+                    key = (_ingredient_key(portion.ingredient, portion.unit), portion.unit)
+                    item = totals.get(key)
+                    if item is None:
+                        item = totals[key] = {
+                            "ingredient": portion.ingredient,
+                            "quantity": 0.0,
+                            "unit": portion.unit,
+                            "category": CATEGORIES.get(portion_type, str(portion_type).title()),
+                        }
+                    item["quantity"] += portion.quantity
+        items = sorted(totals.values(), key=lambda item: (item["category"], item["ingredient"].lower()))
+        for item in items:
+            item["text"] = _item_text(item["quantity"], item["unit"], item["ingredient"])
+            item["quantity"] = round(item["quantity"], 3)
+        windows[window] = {"days": list(days), "items": items}
+
+    return {"windows": windows, "unparsed": sorted(set(unparsed))}
+
+
+def grocery_list_sections(grocery_list: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Flatten a build_grocery_list() result into {"Sunday: Produce": ["2 cups spinach", ...]} for display."""
+    sections: Dict[str, List[str]] = {}
+    for window, contents in grocery_list["windows"].items():
+        for item in contents["items"]:
+            sections.setdefault(f"{window.title()}: {item['category']}", []).append(item["text"])
+    if grocery_list["unparsed"]:
+        sections["Other"] = list(grocery_list["unparsed"])
+    return sections
+
+
+class GroceryListCache:
+    """
+    Finished grocery lists keyed by plan object identity.
+
+    get_meal_plan_data() hands out the same decoded dict for as long as a plan
+    is cached and a new one once it changes, so identity is the plan version.
+    Entries hold a reference to their plan so the id can't be reused while
+    cached. Lists are shared between requests and must be treated as read-only.
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = GROCERY_CACHE_SIZE if maxsize is None else maxsize
+        self._data = OrderedDict()  # id(plan) -> (plan, grocery list)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, plan_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        key = id(plan_data)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] is plan_data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        grocery_list = build_grocery_list(plan_data)
+        if self.maxsize > 0 and plan_data is not None:
+            with self._lock:
+                self._data[key] = (plan_data, grocery_list)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return grocery_list
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        parser = parse_portion.cache_info()
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "parsed_portions": parser.currsize,
+            "parser_hits": parser.hits,
+        }
+
+
+grocery_cache = GroceryListCache()
@@ -0,0 +1,147 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import BinaryIO, Union
+
+from PIL import Image
+
+from config import IMAGE_CACHE_SIZE, IMAGE_CACHE_TTL, IMAGE_CACHE_MAX_DISTANCE, UPLOAD_CHUNK_SIZE
+
+# Users re-upload the same photo (retries, duplicate shares from the iOS app)
+# and every upload is a paid Vision call. Analyses are cached by the sha256 of
+# the raw upload, which is checked before any decoding, and by a 64-bit dHash
+# of the decoded image, so a re-encoded, resized or re-shared copy within
+# max_distance bits still hits. The near-duplicate scan is linear, which is
+# microseconds at these sizes. Flat images (a blank plate, a dark frame) all
+# hash to nearly 0 or nearly all ones whatever their colour, so they only
+# ever hit on the exact hash.
+
+DHASH_SIZE = 8
+
+
+def content_hash(image_data: Union[bytes, BinaryIO]) -> str:
+    """sha256 of the upload; a file is read in chunks and rewound for the next reader."""
+    if isinstance(image_data, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(image_data).hexdigest()
+    digest = hashlib.sha256()
+    image_data.seek(0)
+    for chunk in iter(lambda: image_data.read(UPLOAD_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    image_data.seek(0)
+    return digest.hexdigest()
+
+
+def dhash(image: Image.Image, hash_size: int = DHASH_SIZE) -> int:
+    """Difference hash: one bit per horizontally adjacent pixel pair of a tiny grayscale copy."""
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def is_flat(image_hash: int, max_distance: int, hash_size: int = DHASH_SIZE) -> bool:
+    """True when the hash is too close to all-0 or all-1 to tell images apart."""
+    bits = bin(image_hash).count("1")
+    return bits <= max_distance or bits >= hash_size * hash_size - max_distance
+
+
+class ImageAnalysisCache:
+    """LRU/TTL cache of analysis results keyed by content hash with a perceptual-hash fallback."""
+
+    def __init__(self, maxsize=None, ttl=None, max_distance=None):
+        self.maxsize = IMAGE_CACHE_SIZE if maxsize is None else maxsize
+        self.ttl = IMAGE_CACHE_TTL if ttl is None else ttl
+        self.max_distance = IMAGE_CACHE_MAX_DISTANCE if max_distance is None else max_distance
+        self._data = OrderedDict()  # sha256 -> (expires_at, dhash, analysis)
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.flat_skips = 0
+        self.evictions = 0
+
+    def _live(self, sha, now):
+        entry = self._data.get(sha)
+        if entry is not None and entry[0] < now:
+            del self._data[sha]
+            return None
+        return entry
+
+    def get_exact(self, sha):
+        """Return a copy of the analysis stored for this exact upload, or None."""
+        with self._lock:
+            entry = self._live(sha, time.monotonic())
+            if entry is None:
+                return None
+            self._data.move_to_end(sha)
+            self.exact_hits += 1
+            return copy.deepcopy(entry[2])
+
+    def get_similar(self, image_hash):
+        """Return (analysis copy, distance) for the closest entry within max_distance, or (None, None)."""
+        now = time.monotonic()
+        with self._lock:
+            if is_flat(image_hash, self.max_distance):
+                # Not a fingerprint; any other flat image would match it
+                self.flat_skips += 1
+                self.misses += 1
+                return None, None
+            best_sha, best_distance = None, None
+            for sha, (expires_at, stored_hash, _) in list(self._data.items()):
+                if expires_at < now:
+                    del self._data[sha]
+                    continue
+                distance = hamming_distance(image_hash, stored_hash)
+                if distance <= self.max_distance and (best_distance is None or distance < best_distance):
+                    best_sha, best_distance = sha, distance
+            if best_sha is None:
+                self.misses += 1
+                return None, None
+            self._data.move_to_end(best_sha)
+            self.similar_hits += 1
+            return copy.deepcopy(self._data[best_sha][2]), best_distance
+
+    def put(self, sha, image_hash, analysis):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[sha] = (time.monotonic() + self.ttl, image_hash, copy.deepcopy(analysis))
+            self._data.move_to_end(sha)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._data)
+        hits = self.exact_hits + self.similar_hits
+        lookups = hits + self.misses
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "max_distance": self.max_distance,
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "flat_skips": self.flat_skips,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+image_cache = ImageAnalysisCache()
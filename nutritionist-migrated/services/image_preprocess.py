@@ -0,0 +1,169 @@
+import asyncio
+import io
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Union, BinaryIO
+
+from PIL import Image, ImageOps
+
+from config import IMAGE_MAX_EDGE, IMAGE_QUALITY, IMAGE_FORMAT, IMAGE_PREPROCESS_WORKERS
+from services.image_cache import dhash
+
+logger = logging.getLogger(__name__)
+
+# Phone photos are often 4000px+ and several MB, but Claude Vision downsizes
+# anything over ~1568px on the long edge anyway. Shrinking and re-encoding
+# here cuts upload bandwidth, input tokens and latency without losing detail
+# the model would have used. PIL does the heavy lifting outside the GIL, so a
+# small thread pool keeps the event loop free.
+
+MEDIA_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+# Claude bills roughly width * height / 750 input tokens per image, after
+# scaling anything larger down to CLAUDE_MAX_EDGE itself
+TOKENS_PER_PIXEL = 1 / 750
+CLAUDE_MAX_EDGE = 1568
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+class ImagePreprocessError(Exception):
+    """Raised when the upload can't be decoded as an image"""
+
+
+@dataclass
+class PreprocessedImage:
+    data: bytes
+    media_type: str
+    width: int
+    height: int
+    original_bytes: int
+    original_width: int
+    original_height: int
+    preprocess_ms: float
+    # Perceptual hash of the oriented, downscaled image for near-duplicate lookups
+    dhash: int
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - len(self.data)
+
+    @property
+    def tokens_saved(self) -> int:
+        """Estimated input tokens saved versus sending the original"""
+        return _estimate_tokens(self.original_width, self.original_height) - _estimate_tokens(self.width, self.height)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "original_bytes": self.original_bytes,
+            "bytes": len(self.data),
+            "bytes_saved": self.bytes_saved,
+            "original_size": [self.original_width, self.original_height],
+            "size": [self.width, self.height],
+            "estimated_tokens_saved": self.tokens_saved,
+            "preprocess_ms": round(self.preprocess_ms, 1),
+        }
+
+
+def _estimate_tokens(width: int, height: int) -> int:
+    scale = min(1.0, CLAUDE_MAX_EDGE / max(width, height))
+    return int(width * scale * height * scale * TOKENS_PER_PIXEL)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=IMAGE_PREPROCESS_WORKERS, thread_name_prefix="image-preprocess"
+        )
+    return _executor
+
+
+def preprocess_image(
+    image_data: Union[bytes, BinaryIO],
+    max_edge: int = IMAGE_MAX_EDGE,
+    quality: int = IMAGE_QUALITY,
+    image_format: str = IMAGE_FORMAT,
+) -> PreprocessedImage:
+    """
+    Apply EXIF orientation, downscale so the long edge is at most max_edge and
+    re-encode as JPEG or WebP. The dHash is computed here while the decoded
+    image is at hand.
+
+    image_data may be the raw bytes or a seekable file, e.g. the spooled
+    upload, which Pillow then decodes straight from the file.
+
+    Raises:
+        ImagePreprocessError: If the data isn't a readable image
+    """
+    started = time.perf_counter()
+    if image_format not in MEDIA_TYPES:
+        raise ValueError(f"Unsupported image format: {image_format}")
+
+    if isinstance(image_data, (bytes, bytearray)):
+        original_bytes = len(image_data)
+        source = io.BytesIO(image_data)
+    else:
+        source = image_data
+        original_bytes = source.seek(0, io.SEEK_END)
+        source.seek(0)
+
+    try:
+        image = Image.open(source)
+        original_width, original_height = image.size
+        # draft() lets the JPEG decoder skip straight to a smaller scale
+        image.draft("RGB", (max_edge, max_edge))
+        decoded_size = image.size
+        image = ImageOps.exif_transpose(image)
+    except Exception as e:
+        raise ImagePreprocessError(f"Could not read image: {e}")
+
+    if image.size != decoded_size:
+        # Rotated by 90 degrees per the EXIF orientation
+        original_width, original_height = original_height, original_width
+    if max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    if image.mode not in ("RGB", "L"):
+        # Flatten transparency onto white rather than letting it turn black
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        rgba = image.convert("RGBA")
+        background.paste(rgba, mask=rgba.getchannel("A"))
+        image = background
+
+    image_hash = dhash(image)
+    output = io.BytesIO()
+    image.save(output, format=image_format, quality=quality, optimize=True)
+
+    return PreprocessedImage(
+        data=output.getvalue(),
+        media_type=MEDIA_TYPES[image_format],
+        width=image.width,
+        height=image.height,
+        original_bytes=original_bytes,
+        original_width=original_width,
+        original_height=original_height,
+        preprocess_ms=(time.perf_counter() - started) * 1000,
+        dhash=image_hash,
+    )
+
+
+async def preprocess_image_async(image_data: Union[bytes, BinaryIO], **kwargs) -> PreprocessedImage:
+    """Run preprocess_image on the preprocessing thread pool"""
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(_get_executor(), lambda: preprocess_image(image_data, **kwargs))
+    logger.info(
+        f"Preprocessed image {result.original_width}x{result.original_height} -> "
+        f"{result.width}x{result.height}, {result.original_bytes} -> {len(result.data)} bytes "
+        f"in {result.preprocess_ms:.1f}ms"
+    )
+    return result
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
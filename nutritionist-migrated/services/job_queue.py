@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from models.database import SessionLocal, engine
+from models.job import Job
+from services import jsoncodec
+from config import JOB_WORKERS, JOB_MAX_PENDING, JOB_RETENTION, JOB_SWEEP_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+class JobQueueFullError(Exception):
+    """Raised when too many jobs are already waiting to run"""
+    pass
+
+class JobQueue:
+    """
+    Bounded pool of asyncio workers running persisted jobs.
+
+    Job rows live in the jobs table, so anything queued (or interrupted while
+    running) is picked up again when the process restarts. Succeeded and
+    failed jobs are deleted `retention` seconds after they finish.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_pending: int = JOB_MAX_PENDING,
+                 retention: float = JOB_RETENTION, sweep_interval: float = JOB_SWEEP_INTERVAL):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retention = retention
+        self.sweep_interval = sweep_interval
+        self.swept = 0
+        self.handlers: Dict[str, Callable[..., Awaitable[Any]]] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._sweep_task: Optional[asyncio.Task] = None
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+
+    def register(self, kind: str, handler: Callable[..., Awaitable[Any]]) -> None:
+        """Register the coroutine that runs jobs of this kind; it receives the job params as kwargs."""
+        self.handlers[kind] = handler
+
+    async def start(self) -> None:
+        Job.__table__.create(bind=engine, checkfirst=True)
+        self._queue = asyncio.Queue()
+
+        db = SessionLocal()
+        try:
+            # Jobs left running by a previous process never finished; run them again
+            db.query(Job).filter(Job.status == "running").update({"status": "queued"})
+            db.commit()
+            job_ids = [row.id for row in db.query(Job.id).filter(Job.status == "queued").order_by(Job.created_at)]
+        finally:
+            db.close()
+
+        for job_id in job_ids:
+            self._queue.put_nowait(job_id)
+        if job_ids:
+            logger.info(f"Recovered {len(job_ids)} queued job(s)")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if self.retention > 0:
+            self._sweep_task = asyncio.create_task(self._sweeper())
+
+    async def stop(self) -> None:
+        tasks = self._tasks + ([self._sweep_task] if self._sweep_task is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._sweep_task = None
+
+    def enqueue(self, kind: str, params: Optional[Dict[str, Any]] = None, user_id: Optional[int] = None) -> str:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self._queue is None or self._queue.qsize() >= self.max_pending:
+            raise JobQueueFullError("Too many pending jobs, try again later")
+
+        job = Job(id=uuid.uuid4().hex, user_id=user_id, kind=kind, params=jsoncodec.dumps(params or {}), status="queued")
+        db = SessionLocal()
+        try:
+            db.add(job)
+            db.commit()
+            job_id = job.id
+        finally:
+            db.close()
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        db = SessionLocal()
+        try:
+            return db.query(Job).filter(Job.id == job_id).first()
+        finally:
+            db.close()
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        """Block until the job changes state (or timeout), then return it."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(job_id, []).append(future)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            waiters = self._waiters.get(job_id, [])
+            if future in waiters:
+                waiters.remove(future)
+            if not waiters:
+                self._waiters.pop(job_id, None)
+        return self.get(job_id)
+
+    def _set_status(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        db = SessionLocal()
+        try:
+            db.query(Job).filter(Job.id == job_id).update({
+                "status": status,
+                "result": jsoncodec.dumps(result) if result is not None else None,
+                "error": error,
+                "updated_at": datetime.utcnow(),
+            })
+            db.commit()
+        finally:
+            db.close()
+        for future in self._waiters.pop(job_id, []):
+            if not future.done():
+                future.set_result(status)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        job = self.get(job_id)
+        if job is None or job.status != "queued":
+            return
+        self._set_status(job_id, "running")
+        try:
+            result = await self.handlers[job.kind](**jsoncodec.loads(job.params))
+        except asyncio.CancelledError:
+            # Shutting down: leave the job for the next process to pick up
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} ({job.kind}) failed: {e}")
+            self._set_status(job_id, "failed", error=str(e))
+        else:
+            self._set_status(job_id, "succeeded", result=result)
+
+    def sweep(self) -> int:
+        """Delete succeeded and failed jobs last updated more than retention seconds ago."""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention)
+        db = SessionLocal()
+        try:
+            removed = db.query(Job).filter(
+                Job.status.in_(TERMINAL_STATUSES),
+                Job.updated_at < cutoff
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        self.swept += removed
+        return removed
+
+    async def _sweeper(self) -> None:
+        # Once at startup, then every sweep_interval
+        while True:
+            try:
+                removed = await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                logger.error(f"Job sweep failed: {e}")
+            else:
+                if removed:
+                    logger.info(f"Swept {removed} finished job(s)")
+            await asyncio.sleep(self.sweep_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "running_tasks": len(self._tasks),
+            "retention": self.retention,
+            "swept": self.swept,
+        }
+
+job_queue = JobQueue()
@@ -0,0 +1,72 @@
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from models.database import SessionLocal, engine
+from models.meal_plan import MealPlan
+from models.meal_plan_day import MealPlanDay
+from services import jsoncodec
+
+def init_plan_days() -> int:
+    """Create meal_plan_days and backfill it for plans saved before it existed."""
+    MealPlanDay.__table__.create(bind=engine, checkfirst=True)
+    db = SessionLocal()
+    try:
+        count = backfill_plan_days(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return count
+
+def write_plan_days(db: Session, user_id: int, week_key: str, plan_data: Optional[Dict[str, Any]]) -> None:
+    """
+    Replace the week's MealPlanDay rows with the days of plan_data (None
+    deletes them). Call before committing the plan change so both land in
+    the same transaction.
+    """
+    db.query(MealPlanDay).filter(
+        MealPlanDay.user_id == user_id,
+        MealPlanDay.week_key == week_key
+    ).delete(synchronize_session=False)
+    body = plan_data.get("meal_plan", plan_data) if isinstance(plan_data, dict) else {}
+    overview = body.get("overview") or {}
+    goals = {
+        name: None if overview.get(name) is None else str(overview[name])
+        for name in ("calorie_goal", "protein_goal")
+    }
+    db.bulk_insert_mappings(MealPlanDay, [
+        {
+            "user_id": user_id,
+            "week_key": week_key,
+            "day": str(day).lower(),
+            "plan_data": jsoncodec.dumps(day_plan),
+            **goals,
+        }
+        for day, day_plan in (body.get("daily_plans") or {}).items()
+    ])
+
+def get_meal_plan_day(db: Session, user_id: int, week_key: str, day: str) -> Optional[Dict[str, Any]]:
+    """One day of a plan as {"day", "plan", "overview"} from its own row; None if missing."""
+    row = db.get(MealPlanDay, (user_id, week_key, day.lower()))
+    if row is None:
+        return None
+    return {
+        "day": row.day,
+        "plan": jsoncodec.loads(row.plan_data),
+        "overview": {"calorie_goal": row.calorie_goal, "protein_goal": row.protein_goal},
+    }
+
+def backfill_plan_days(db: Session) -> int:
+    """Write day rows for plans that have none; the caller commits."""
+    has_days = db.query(MealPlanDay).filter(
+        MealPlanDay.user_id == MealPlan.user_id,
+        MealPlanDay.week_key == MealPlan.week_key
+    ).exists()
+    # Oldest first, so the newest plan of a week with several rows writes last
+    plans = db.query(MealPlan).filter(~has_days).order_by(MealPlan.id).all()
+    for meal_plan in plans:
+        write_plan_days(db, meal_plan.user_id, meal_plan.week_key, meal_plan.plan)
+    return len(plans)
@@ -1,12 +1,19 @@
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from models.meal_plan import MealPlan, Modification
+from models.database import SessionLocal
 from config import MEAL_PLAN_DB
 import json
-import anthropic
 import os
 from typing import List, Optional, Dict, Any
 from dotenv import load_dotenv
+from services.plan_cache import plan_cache, MISSING
+from services.anthropic_client import get_async_anthropic_client
+from services.singleflight import SingleFlight
+from services.nutrition_rollups import refresh_planned_rollups
+from services.grocery_engine import grocery_cache
+from services.meal_plan_days import write_plan_days
+from services import jsoncodec
 
 # Load environment variables
 load_dotenv()
@@ -14,21 +21,8 @@ load_dotenv()
 # Get meal plan database path
 MEAL_PLAN_DB = os.getenv("MEAL_PLAN_DB", "data/meal_plans.db")
 
-# Global client variable to avoid repeated initialization
-_anthropic_client = None
-
-def get_anthropic_client():
-    """Get Anthropic client instance with proper error handling"""
-    global _anthropic_client
-    if _anthropic_client is None:
-        try:
-            anthropic_api_key = os.environ.get("ANTHROPIC_API_KEY")
-            if not anthropic_api_key:
-                raise ValueError("ANTHROPIC_API_KEY environment variable not set")
-            _anthropic_client = anthropic.Anthropic(api_key=anthropic_api_key)
-        except Exception as e:
-            raise ValueError(f"Failed to initialize Anthropic client: {e}")
-    return _anthropic_client
+# In-flight generations keyed by (user_id, week_key)
+generation_flight = SingleFlight()
 
 def get_week_key():
     today = datetime.now()
@@ -36,22 +30,41 @@ def get_week_key():
     return f"meal_plan_{sunday.strftime('%Y-%m-%d')}"
 
 def save_meal_plan(db: Session, week_key: str, plan: dict):
-    plan_json = json.dumps(plan)
+    plan_json = jsoncodec.dumps(plan)
     meal_plan = MealPlan(week_key=week_key, plan=plan)
     db.merge(meal_plan)
     db.commit()
 
 def get_meal_plan(db: Session, user_id: int, week_key: str) -> Optional[Dict[str, Any]]:
-    """Get the meal plan for a specific user and week."""
+    """
+    Get the meal plan for a specific user and week. Older databases can hold
+    several rows for one week; the newest one is the current plan.
+    """
     meal_plan = db.query(MealPlan).filter(
         MealPlan.user_id == user_id,
         MealPlan.week_key == week_key
-    ).first()
+    ).order_by(MealPlan.id.desc()).first()
     
     if meal_plan:
         return meal_plan
     return None
 
+def get_meal_plan_data(db: Session, user_id: int, week_key: str) -> Optional[Dict[str, Any]]:
+    """Get the decoded plan data for a user and week, served from the plan cache when possible.
+
+    The returned dict is shared with other requests and must not be mutated.
+    """
+    key = (user_id, week_key)
+    plan_data = plan_cache.get(key)
+    if plan_data is not MISSING:
+        return plan_data
+
+    generation = plan_cache.generation()
+    meal_plan = get_meal_plan(db, user_id, week_key)
+    plan_data = meal_plan.plan if meal_plan else None
+    plan_cache.put(key, plan_data, generation)
+    return plan_data
+
 def add_modification(db: Session, week_key: str, modification: dict):
     mod = Modification(
         week_key=week_key,
@@ -63,12 +76,12 @@ def add_modification(db: Session, week_key: str, modification: dict):
     db.add(mod)
     db.commit()
 
-def call_claude(prompt, model="claude-3-5-sonnet-20241022", max_tokens=8000, temperature=0.7):
+async def call_claude(prompt, model="claude-3-5-sonnet-20241022", max_tokens=8000, temperature=0.7):
     """Call Claude with proper error handling and client initialization"""
     try:
-        client = get_anthropic_client()
+        client = get_async_anthropic_client()
         
-        response = client.messages.create(
+        response = await client.messages.create(
             model=model,
             max_tokens=max_tokens,
             temperature=temperature,
@@ -78,6 +91,54 @@ def call_claude(prompt, model="claude-3-5-sonnet-20241022", max_tokens=8000, tem
     except Exception as e:
         return {"error": str(e)}
 
+async def generate_and_save_meal_plan(db: Session, user_id: int, week_key: str) -> MealPlan:
+    """Generate a meal plan with Claude and store it for the user and week."""
+    response = await call_claude(get_meal_prompt())
+    
+    if isinstance(response, dict) and "error" in response:
+        raise RuntimeError(response["error"])
+    
+    # Parse the response into a structured format
+    try:
+        plan_data = json.loads(response)
+    except json.JSONDecodeError:
+        # If response is not JSON, create a structured format
+        plan_data = {
+            "overview": response,
+            "daily_plans": {},
+            "grocery_list": {
+                "sunday": [],
+                "wednesday": []
+            }
+        }
+    
+    return create_meal_plan(db=db, user_id=user_id, week_key=week_key, plan_data=plan_data)
+
+async def generate_meal_plan_for_user(user_id: int, week_key: str) -> Dict[str, Any]:
+    """
+    Generate and save a plan for the user and week.
+
+    Concurrent requests for the same (user, week) share one Claude call and
+    one saved plan. Runs in its own session so the shared call doesn't
+    depend on whichever request started it.
+    """
+    return await generation_flight.do(
+        (user_id, week_key),
+        lambda: _generate_meal_plan_for_user(user_id, week_key)
+    )
+
+async def _generate_meal_plan_for_user(user_id: int, week_key: str) -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        meal_plan = await generate_and_save_meal_plan(db, user_id, week_key)
+        return {
+            "meal_plan_id": meal_plan.id,
+            "week_key": meal_plan.week_key,
+            "plan": meal_plan.plan
+        }
+    finally:
+        db.close()
+
 def get_meal_prompt():
     return """
 System:
@@ -139,7 +200,7 @@ def get_all_meal_plans(db: Session, user_id: int, week_key: str) -> List[Dict[st
     meal_plans = db.query(MealPlan).filter(
         MealPlan.user_id == user_id,
         MealPlan.week_key == week_key
-    ).all()
+    ).order_by(MealPlan.id.desc()).all()
     
     return meal_plans
 
@@ -218,76 +279,57 @@ def generate_meal_plan_data() -> Dict[str, Any]:
     }
 
 def create_meal_plan(db: Session, user_id: int, week_key: str, plan_data: Optional[Dict[str, Any]] = None) -> MealPlan:
-    """Create a new meal plan for a user."""
+    """Create a user's meal plan for a week, replacing the week's plan if there is one."""
     if plan_data is None:
         plan_data = generate_meal_plan_data()
     
-    meal_plan = MealPlan(
-        user_id=user_id,
-        week_key=week_key,
-        plan_data=json.dumps(plan_data)
-    )
-    db.add(meal_plan)
+    meal_plan = get_meal_plan(db, user_id, week_key)
+    if meal_plan:
+        meal_plan.plan_data = jsoncodec.dumps(plan_data)
+    else:
+        meal_plan = MealPlan(
+            user_id=user_id,
+            week_key=week_key,
+            plan_data=jsoncodec.dumps(plan_data)
+        )
+        db.add(meal_plan)
+    write_plan_days(db, user_id, week_key, plan_data)
+    refresh_planned_rollups(db, user_id, week_key)
     db.commit()
     db.refresh(meal_plan)
+    plan_cache.invalidate((user_id, week_key))
     return meal_plan
 
-def update_meal_plan(db: Session, user_id: int, week_key: str, plan_data: Dict[str, Any]) -> Optional[MealPlan]:
+def update_meal_plan(db: Session, user_id: int, week_key: str, plan_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """Update an existing meal plan."""
-    meal_plan = db.query(MealPlan).filter(
-        MealPlan.user_id == user_id,
-        MealPlan.week_key == week_key
-    ).first()
+    meal_plan = get_meal_plan(db, user_id, week_key)
     
     if meal_plan:
-        meal_plan.plan_data = json.dumps(plan_data)
+        meal_plan.plan_data = jsoncodec.dumps(plan_data)
+        write_plan_days(db, user_id, week_key, plan_data)
+        refresh_planned_rollups(db, user_id, week_key)
         db.commit()
         db.refresh(meal_plan)
+        plan_cache.invalidate((user_id, week_key))
         return meal_plan
     return None
 
 def delete_meal_plan(db: Session, user_id: int, week_key: str) -> bool:
-    """Delete a meal plan."""
-    meal_plan = db.query(MealPlan).filter(
-        MealPlan.user_id == user_id,
-        MealPlan.week_key == week_key
-    ).first()
+    """Delete a meal plan, along with any older rows for the same week."""
+    meal_plans = get_all_meal_plans(db, user_id, week_key)
     
-    if meal_plan:
-        db.delete(meal_plan)
+    if meal_plans:
+        for meal_plan in meal_plans:
+            db.delete(meal_plan)
+        write_plan_days(db, user_id, week_key, None)
+        refresh_planned_rollups(db, user_id, week_key)
         db.commit()
+        plan_cache.invalidate((user_id, week_key))
         return True
     return False
 
-def generate_grocery_list(meal_plan: Dict[str, Any]) -> Dict[str, List[str]]:
-    """Generate a grocery list from a meal plan."""
+def generate_grocery_list(meal_plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Generate a grocery list from a meal plan's portion sizes, split by shopping window."""
     if not meal_plan:
         return {}
-    
-    grocery_list = {
-        "Produce": [],
-        "Dairy": [],
-        "Meat": [],
-        "Pantry": []
-    }
-    
-    # Example implementation - in a real app, this would analyze the meal plan
-    # and extract ingredients based on recipes
-    for day, meals in meal_plan.get("daily_plans", {}).items():
-        for meal, details in meals.items():
-            # Add example ingredients based on meal type
-            if "breakfast" in meal.lower():
-                grocery_list["Dairy"].append("Milk")
-                grocery_list["Pantry"].append("Cereal")
-            elif "lunch" in meal.lower():
-                grocery_list["Produce"].append("Lettuce")
-                grocery_list["Meat"].append("Chicken")
-            elif "dinner" in meal.lower():
-                grocery_list["Produce"].append("Potatoes")
-                grocery_list["Meat"].append("Beef")
-    
-    # Remove duplicates
-    for category in grocery_list:
-        grocery_list[category] = list(set(grocery_list[category]))
-    
-    return grocery_list 
\ No newline at end of file
+    return grocery_cache.get(meal_plan) 
\ No newline at end of file
@@ -0,0 +1,177 @@
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models.database import engine
+from models.food_log import FoodLog
+from models.meal_plan import MealPlan
+from models.nutrition_rollup import DailyNutritionRollup, WeeklyNutritionRollup
+from services.macro_engine import DAYS, PROTEIN, CARBS, FATS, CALORIES, analyze, plan_to_array
+
+logger = logging.getLogger(__name__)
+
+MACROS = ("calories", "protein", "carbs", "fat")
+
+def create_rollup_tables() -> None:
+    DailyNutritionRollup.__table__.create(bind=engine, checkfirst=True)
+    WeeklyNutritionRollup.__table__.create(bind=engine, checkfirst=True)
+
+def week_key_for(day: date) -> str:
+    """Monday of the day's week, in the same format as get_week_key()"""
+    return (day - timedelta(days=day.weekday())).strftime("%Y-%m-%d")
+
+def _get_or_create(db: Session, model, user_id: int, key_name: str, key) -> Any:
+    rollup = db.get(model, (user_id, key))
+    if rollup is None:
+        # Column defaults only apply at flush; start from explicit zeros so deltas can be added
+        rollup = model(user_id=user_id, **{key_name: key})
+        rollup.logged_entries = 0
+        for source in ("logged", "planned"):
+            for macro in MACROS:
+                setattr(rollup, f"{source}_{macro}", 0.0)
+        db.add(rollup)
+        # Sessions don't autoflush; flush so the next get() for this key finds it
+        db.flush()
+    return rollup
+
+def _daily(db: Session, user_id: int, day: date) -> DailyNutritionRollup:
+    return _get_or_create(db, DailyNutritionRollup, user_id, "day", day)
+
+def _weekly(db: Session, user_id: int, week_key: str) -> WeeklyNutritionRollup:
+    return _get_or_create(db, WeeklyNutritionRollup, user_id, "week_key", week_key)
+
+# ---------- Food logs ----------
+
+def apply_food_logs(db: Session, rows: Iterable[Dict[str, Any]]) -> None:
+    """
+    Add newly inserted food log rows to the rollups. Call in the same
+    transaction as the insert so rollups and logs commit together.
+    """
+    deltas: Dict[Tuple[int, date], Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+    for row in rows:
+        delta = deltas[(row["user_id"], row["logged_at"].date())]
+        delta["entries"] += 1
+        for macro in MACROS:
+            delta[macro] += row.get(macro) or 0
+
+    for (user_id, day), delta in deltas.items():
+        for rollup in (_daily(db, user_id, day), _weekly(db, user_id, week_key_for(day))):
+            rollup.logged_entries += int(delta["entries"])
+            for macro in MACROS:
+                setattr(rollup, f"logged_{macro}", getattr(rollup, f"logged_{macro}") + delta[macro])
+
+# ---------- Meal plans ----------
+
+def planned_day_totals(plan_data: Optional[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Per-weekday macro totals for a plan, keyed by lower-case weekday name"""
+    result = analyze(plan_to_array(plan_data))
+    totals = {}
+    for d, day_name in enumerate(DAYS):
+        if not result["day_present"][d]:
+            continue
+        daily = result["daily"][d]
+        totals[day_name] = {
+            "calories": float(daily[CALORIES]),
+            "protein": float(daily[PROTEIN]),
+            "carbs": float(daily[CARBS]),
+            "fat": float(daily[FATS]),
+        }
+    return totals
+
+def _set_planned(db: Session, user_id: int, week_key: str, plan_data: Optional[Dict[str, Any]]) -> None:
+    monday = datetime.strptime(week_key, "%Y-%m-%d").date()
+    day_totals = planned_day_totals(plan_data)
+    week_totals = {macro: 0.0 for macro in MACROS}
+    for offset, day_name in enumerate(DAYS):
+        totals = day_totals.get(day_name)
+        day = monday + timedelta(days=offset)
+        if totals is None and db.get(DailyNutritionRollup, (user_id, day)) is None:
+            continue
+        rollup = _daily(db, user_id, day)
+        for macro in MACROS:
+            value = totals[macro] if totals else 0.0
+            setattr(rollup, f"planned_{macro}", value)
+            week_totals[macro] += value
+    weekly = _weekly(db, user_id, week_key)
+    for macro in MACROS:
+        setattr(weekly, f"planned_{macro}", week_totals[macro])
+
+def refresh_planned_rollups(db: Session, user_id: int, week_key: str) -> None:
+    """
+    Recompute the planned totals for one user and week from their current plan.
+    Plans replace each other rather than accumulate, so this sets the week's
+    seven days instead of adding. Call before committing the plan change.
+    """
+    db.flush()
+    meal_plan = db.query(MealPlan).filter(
+        MealPlan.user_id == user_id,
+        MealPlan.week_key == week_key
+    ).order_by(MealPlan.id.desc()).first()
+    plan_data = meal_plan.plan if meal_plan else None
+    try:
+        _set_planned(db, user_id, week_key, plan_data)
+    except ValueError:
+        logger.warning(f"Skipping planned rollups for malformed week key {week_key!r}")
+
+# ---------- Reads ----------
+
+def get_daily_rollups(db: Session, user_id: int, start: date, days: int) -> List[Optional[DailyNutritionRollup]]:
+    """Rollups for `days` consecutive days from start; None for days with nothing recorded"""
+    end = start + timedelta(days=days)
+    rows = db.query(DailyNutritionRollup).filter(
+        DailyNutritionRollup.user_id == user_id,
+        DailyNutritionRollup.day >= start,
+        DailyNutritionRollup.day < end
+    ).all()
+    by_day = {row.day: row for row in rows}
+    return [by_day.get(start + timedelta(days=offset)) for offset in range(days)]
+
+# ---------- Bulk rebuild ----------
+
+def rebuild_rollups(db: Session, user_id: Optional[int] = None) -> Dict[str, int]:
+    """
+    Recompute every rollup (or one user's) from food_logs and meal_plans.
+    For backfills and repairs; the caller commits.
+    """
+    for model in (DailyNutritionRollup, WeeklyNutritionRollup):
+        query = db.query(model)
+        if user_id is not None:
+            query = query.filter(model.user_id == user_id)
+        query.delete(synchronize_session="fetch")
+    db.flush()
+
+    log_day = func.date(FoodLog.logged_at)
+    query = db.query(
+        FoodLog.user_id,
+        log_day,
+        func.count(FoodLog.id),
+        func.sum(FoodLog.calories),
+        func.sum(FoodLog.protein),
+        func.sum(FoodLog.carbs),
+        func.sum(FoodLog.fat),
+    )
+    if user_id is not None:
+        query = query.filter(FoodLog.user_id == user_id)
+    log_days = 0
+    for row_user_id, day, entries, calories, protein, carbs, fat in query.group_by(FoodLog.user_id, log_day).all():
+        day = day if isinstance(day, date) else datetime.strptime(day, "%Y-%m-%d").date()
+        totals = {"calories": calories, "protein": protein, "carbs": carbs, "fat": fat}
+        for rollup in (_daily(db, row_user_id, day), _weekly(db, row_user_id, week_key_for(day))):
+            rollup.logged_entries += entries
+            for macro in MACROS:
+                setattr(rollup, f"logged_{macro}", getattr(rollup, f"logged_{macro}") + float(totals[macro] or 0))
+        log_days += 1
+
+    query = db.query(MealPlan.user_id, MealPlan.week_key).distinct()
+    if user_id is not None:
+        query = query.filter(MealPlan.user_id == user_id)
+    plan_weeks = 0
+    for row_user_id, week_key in query.all():
+        refresh_planned_rollups(db, row_user_id, week_key)
+        plan_weeks += 1
+
+    return {"log_days": log_days, "plan_weeks": plan_weeks}
@@ -1,35 +1,22 @@
 import anthropic
 import base64
+import hashlib
 import json
 import os
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Union, BinaryIO, Tuple
 from datetime import datetime
 import logging
-from PIL import Image
-import io
+import time
 
-from config import ANTHROPIC_API_KEY
+from config import IMAGE_MAX_UPLOAD_BYTES, UPLOAD_CHUNK_SIZE
+from services.anthropic_client import get_async_anthropic_client
+from services.image_preprocess import preprocess_image_async, ImagePreprocessError
+from services.image_cache import image_cache, content_hash
+from services.food_log_writer import food_log_writer
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-# Global client variable to avoid repeated initialization
-_anthropic_client = None
-
-def get_anthropic_client():
-    """Get Anthropic client instance with proper error handling for modern API"""
-    global _anthropic_client
-    if _anthropic_client is None:
-        try:
-            if not ANTHROPIC_API_KEY:
-                raise ValueError("ANTHROPIC_API_KEY environment variable not set")
-            # Modern Anthropic client initialization
-            _anthropic_client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-        except Exception as e:
-            logger.error(f"Failed to initialize Anthropic client: {e}")
-            raise
-    return _anthropic_client
-
 class NutritionAnalysisError(Exception):
     """Custom exception for nutrition analysis errors"""
     def __init__(self, message: str, code: str = "ANALYSIS_ERROR"):
@@ -37,41 +24,61 @@ class NutritionAnalysisError(Exception):
         self.code = code
         super().__init__(self.message)
 
-async def analyze_food_image(image_data: bytes, content_type: str) -> Dict[str, Any]:
+async def analyze_food_image(image_data: Union[bytes, BinaryIO], content_type: str, sha: Optional[str] = None) -> Dict[str, Any]:
     """
     Analyze a food image using Anthropic Claude Vision API (modern format)
     
     Args:
-        image_data: Binary image data
+        image_data: Binary image data, or a seekable file holding it
         content_type: MIME type of the image
+        sha: sha256 of the image data if the caller already computed it
         
     Returns:
-        Dict containing calories, description, and timestamp
+        Dict containing calories, description, timestamp, preprocessing stats
+        and whether the result came from the image cache
         
     Raises:
         NutritionAnalysisError: If analysis fails
     """
     try:
+        # The exact same upload is answered before it is even decoded
+        if sha is None:
+            sha = content_hash(image_data)
+        cached = image_cache.get_exact(sha)
+        if cached is not None:
+            return _cached_result(cached, "exact", 0, None)
+        
+        # Orient, downscale and re-encode before upload; this is what keeps
+        # phone photos under Claude's 5MB limit and cuts input tokens
+        try:
+            image = await preprocess_image_async(image_data)
+        except ImagePreprocessError as e:
+            logger.warning(f"Image preprocessing failed: {e}")
+            raise NutritionAnalysisError("Could not read image file", "INVALID_IMAGE")
+        
+        # A re-encoded or resized copy of a recent photo
+        cached, distance = image_cache.get_similar(image.dhash)
+        if cached is not None:
+            image_cache.put(sha, image.dhash, cached)
+            return _cached_result(cached, "similar", distance, image.stats())
+        
         # Validate image size (5MB limit for Claude)
-        if len(image_data) > 5 * 1024 * 1024:
+        if len(image.data) > 5 * 1024 * 1024:
             raise NutritionAnalysisError(
                 "File too large. Maximum size is 5MB for Claude Vision", 
                 "FILE_TOO_LARGE"
             )
         
-        # Convert to base64
-        base64_image = base64.b64encode(image_data).decode('utf-8')
-        
-        # Determine media type for Claude
-        media_type = content_type
-        if media_type not in ["image/jpeg", "image/png", "image/gif", "image/webp"]:
-            media_type = "image/jpeg"  # Default fallback
+        # Convert to base64 (only the downscaled copy, never the raw upload)
+        base64_image = base64.b64encode(image.data).decode('ascii')
+        media_type = image.media_type
         
         # Get client instance
-        client = get_anthropic_client()
+        client = get_async_anthropic_client()
         
         # Call Anthropic Claude Vision API using the modern Messages API
-        response = client.messages.create(
+        started = time.perf_counter()
+        response = await client.messages.create(
             model="claude-3-haiku-20240307",
             max_tokens=500,
             messages=[
@@ -103,6 +110,7 @@ Be as accurate as possible with portion size estimation. If you can't clearly id
                 }
             ]
         )
+        analysis_ms = (time.perf_counter() - started) * 1000
         
         # Parse response from modern API
         content = None
@@ -137,11 +145,18 @@ Be as accurate as possible with portion size estimation. If you can't clearly id
         except (ValueError, TypeError):
             raise NutritionAnalysisError("Invalid numeric values in analysis result", "AI_INVALID_NUMBERS")
         
+        image_cache.put(sha, image.dhash, analysis_result)
+        
         # Add timestamp
         analysis_result["timestamp"] = datetime.now().isoformat()
+        analysis_result["cached"] = False
+        analysis_result["preprocessing"] = {**image.stats(), "analysis_ms": round(analysis_ms, 1)}
+        logger.info(f"Image analysis preprocessing: {analysis_result['preprocessing']}")
         
         return analysis_result
         
+    except NutritionAnalysisError:
+        raise
     except anthropic.RateLimitError:
         raise NutritionAnalysisError("API quota exceeded", "QUOTA_EXCEEDED")
     except anthropic.AuthenticationError:
@@ -153,6 +168,41 @@ Be as accurate as possible with portion size estimation. If you can't clearly id
         logger.error(f"Unexpected error in nutrition analysis: {e}")
         raise NutritionAnalysisError("Internal server error during image analysis", "ANALYSIS_ERROR")
 
+def _cached_result(analysis: Dict[str, Any], match: str, distance: int, preprocessing: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build an analysis response from a cache entry"""
+    logger.info(f"Image analysis cache hit ({match}, distance {distance})")
+    analysis["timestamp"] = datetime.now().isoformat()
+    analysis["cached"] = True
+    analysis["cache_match"] = match
+    analysis["cache_distance"] = distance
+    analysis["preprocessing"] = preprocessing
+    return analysis
+
+async def read_image_upload(upload) -> Tuple[BinaryIO, str, int]:
+    """
+    Stream an UploadFile in chunks, hashing as it goes and stopping as soon
+    as it passes IMAGE_MAX_UPLOAD_BYTES, so the upload is never held in
+    memory as one bytes object.
+    
+    Returns:
+        The rewound underlying file, its sha256 and its size in bytes
+        
+    Raises:
+        NutritionAnalysisError: If the upload isn't an image or is too large
+    """
+    validate_image_file(upload.content_type, 0)
+    hasher = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        validate_image_file(upload.content_type, size)
+        hasher.update(chunk)
+    await upload.seek(0)
+    return upload.file, hasher.hexdigest(), size
+
 def validate_image_file(content_type: str, file_size: int) -> None:
     """
     Validate image file type and size
@@ -168,20 +218,32 @@ def validate_image_file(content_type: str, file_size: int) -> None:
     if not content_type.startswith('image/'):
         raise NutritionAnalysisError("Only image files are allowed", "INVALID_FILE_TYPE")
     
-    # Check file size (5MB limit for Claude)
-    if file_size > 5 * 1024 * 1024:
-        raise NutritionAnalysisError("File too large. Maximum size is 5MB", "FILE_TOO_LARGE")
+    # Check upload size; images are downscaled to fit Claude's 5MB limit afterwards
+    if file_size > IMAGE_MAX_UPLOAD_BYTES:
+        max_mb = IMAGE_MAX_UPLOAD_BYTES // (1024 * 1024)
+        raise NutritionAnalysisError(f"File too large. Maximum size is {max_mb}MB", "FILE_TOO_LARGE")
 
-async def save_nutrition_analysis(user_id: int, analysis_result: Dict[str, Any], filename: str = None) -> None:
+async def save_nutrition_analysis(user_id: int, analysis_result: Dict[str, Any], filename: str = None, image_sha256: str = None) -> None:
     """
-    Save nutrition analysis result to database (placeholder for future implementation)
+    Save nutrition analysis result to the user's food log
+    
+    The row is handed to the write-behind buffer, which commits it within
+    FOOD_LOG_FLUSH_INTERVAL seconds; this never waits on the database.
     
     Args:
         user_id: ID of the user
         analysis_result: Analysis result from Anthropic
         filename: Original filename of the image
+        image_sha256: sha256 of the uploaded image
     """
-    # TODO: Implement database storage for nutrition analysis history
-    # This would create a new table for storing food analysis results
-    logger.info(f"Saving nutrition analysis for user {user_id}: {analysis_result}")
-    pass 
\ No newline at end of file
+    food_log_writer.add({
+        "user_id": user_id,
+        "logged_at": datetime.utcnow(),
+        "calories": analysis_result["calories"],
+        "protein": analysis_result.get("protein", 0),
+        "carbs": analysis_result.get("carbs", 0),
+        "fat": analysis_result.get("fat", 0),
+        "description": analysis_result.get("description"),
+        "filename": filename,
+        "image_sha256": image_sha256,
+    })
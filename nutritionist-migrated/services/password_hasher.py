@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import bcrypt
+
+from config import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+
+logger = logging.getLogger(__name__)
+
+# bcrypt takes 100-300ms of CPU per hash or check at the default cost, and
+# the login and register handlers are async, so calling it inline stalls
+# every other request on the event loop. The async helpers run it on a
+# small dedicated pool instead (bcrypt releases the GIL while hashing) and
+# refuse new work once PASSWORD_HASH_MAX_PENDING calls are waiting, so a
+# burst of logins queues behind itself rather than behind the API.
+
+_COST_PATTERN = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+class PasswordHasherBusyError(Exception):
+    """Raised when too many password hashes are already waiting to run"""
+    pass
+
+def hash_password(plain_password: str, rounds: Optional[int] = None) -> str:
+    if not plain_password:
+        raise ValueError("Password cannot be empty")
+    salt = bcrypt.gensalt(rounds=rounds or BCRYPT_ROUNDS)
+    return bcrypt.hashpw(plain_password.encode('utf-8'), salt).decode('utf-8')
+
+def verify_password(plain_password: str, hashed_password: Optional[str]) -> bool:
+    if not hashed_password:
+        logger.error("No password hash found for user")
+        return False
+    try:
+        return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    except Exception as e:
+        logger.error(f"Password verification error: {e}")
+        return False
+
+def hash_cost(hashed_password: Optional[str]) -> Optional[int]:
+    match = _COST_PATTERN.match(hashed_password or "")
+    return int(match.group(1)) if match else None
+
+def needs_rehash(hashed_password: Optional[str]) -> bool:
+    """True when the hash was made with a different cost than BCRYPT_ROUNDS."""
+    return hash_cost(hashed_password) != BCRYPT_ROUNDS
+
+class PasswordHasher:
+    """Bounded thread pool for bcrypt with queue-depth and latency counters."""
+
+    def __init__(self, workers=None, max_pending=None):
+        self.workers = PASSWORD_HASH_WORKERS if workers is None else workers
+        self.max_pending = PASSWORD_HASH_MAX_PENDING if max_pending is None else max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.busy_ms = 0.0
+        self.max_wait_ms = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def _run(self, fn: Callable[..., Any], *args) -> Any:
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusyError("Too many logins in progress, try again shortly")
+            self.pending += 1
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.busy_ms += (time.perf_counter() - started) * 1000
+                    self.max_wait_ms = max(self.max_wait_ms, (started - submitted) * 1000)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), timed)
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+
+    async def hash(self, plain_password: str) -> str:
+        return await self._run(hash_password, plain_password)
+
+    async def verify(self, plain_password: str, hashed_password: Optional[str]) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """Check a password; on success also return a new hash if the stored one has an outdated cost."""
+        if not await self.verify(plain_password, hashed_password):
+            return False, None
+        if not needs_rehash(hashed_password):
+            return True, None
+        try:
+            new_hash = await self.hash(plain_password)
+        except PasswordHasherBusyError:
+            # The password was right; upgrade the hash on a later login instead
+            return True, None
+        with self._lock:
+            self.rehashed += 1
+        return True, new_hash
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rounds": BCRYPT_ROUNDS,
+            "workers": self.workers,
+            "pending": self.pending,
+            "queued": max(self.pending - self.workers, 0),
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "rehashed": self.rehashed,
+            "avg_hash_ms": round(self.busy_ms / self.completed, 2) if self.completed else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 2),
+        }
+
+password_hasher = PasswordHasher()
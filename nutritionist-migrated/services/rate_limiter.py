@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from models.database import SessionLocal, engine
+from models.rate_limit_bucket import RateLimitBucket
+from config import RATE_LIMIT_MAX_KEYS, RATE_LIMIT_PERSIST, RATE_LIMIT_PERSIST_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Token buckets for the endpoints that spend Anthropic quota or check
+# credentials. Each key (route plus user or IP) holds up to `capacity`
+# tokens, refilled continuously at capacity/period; a request takes one
+# token or is told how long until one is available. Buckets live in this
+# process; with RATE_LIMIT_PERSIST they are also saved to the database
+# periodically and on shutdown, so a restart doesn't hand everyone a full
+# bucket. Nothing is read from the database on the request path.
+
+PERIODS = {"second": 1.0, "minute": 60.0, "hour": 3600.0, "day": 86400.0}
+
+class RateLimit(NamedTuple):
+    capacity: float
+    period: float  # seconds to refill from empty
+
+    @property
+    def rate(self) -> float:
+        return self.capacity / self.period
+
+def parse_rate(text: Optional[str]) -> Optional[RateLimit]:
+    """"10/hour" -> RateLimit(10, 3600); "30/90" means 30 per 90 seconds; empty -> None."""
+    if not text or not text.strip():
+        return None
+    count, _, period = text.strip().partition("/")
+    period = period.strip().lower().rstrip("s") or "second"
+    seconds = PERIODS.get(period)
+    if seconds is None:
+        try:
+            seconds = float(period)
+        except ValueError:
+            raise ValueError(f"Bad rate limit {text!r}, expected e.g. 10/hour")
+    limit = RateLimit(float(count), seconds)
+    if limit.capacity <= 0 or limit.period <= 0:
+        raise ValueError(f"Bad rate limit {text!r}, both sides must be positive")
+    return limit
+
+class TokenBucketLimiter:
+    """In-process token buckets with LRU eviction, optional persistence and counters."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS, persist: bool = RATE_LIMIT_PERSIST,
+                 persist_interval: float = RATE_LIMIT_PERSIST_INTERVAL):
+        self.max_keys = max_keys
+        self.persist = persist
+        self.persist_interval = persist_interval
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()  # key -> [tokens, updated_at]
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.allowed = 0
+        self.limited = 0
+        self.evictions = 0
+
+    def acquire(self, key: str, limit: RateLimit, cost: float = 1.0) -> float:
+        """Take `cost` tokens; returns 0 if allowed, else seconds until they would be available."""
+        now = time.time()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [limit.capacity, now]
+                while len(self._buckets) > self.max_keys:
+                    # An evicted key starts over with a full bucket; only idle keys get here
+                    evicted, _ = self._buckets.popitem(last=False)
+                    self._dirty.discard(evicted)
+                    self.evictions += 1
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(limit.capacity, bucket[0] + (now - bucket[1]) * limit.rate)
+                bucket[1] = now
+            if self.persist:
+                self._dirty.add(key)
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                self.allowed += 1
+                return 0.0
+            self.limited += 1
+            return (cost - bucket[0]) / limit.rate
+
+    def reset(self, key: Optional[str] = None) -> None:
+        with self._lock:
+            if key is None:
+                self._buckets.clear()
+            else:
+                self._buckets.pop(key, None)
+
+    # ---------- Persistence ----------
+
+    def load(self) -> int:
+        """Restore saved buckets; their tokens refill from updated_at on next use."""
+        RateLimitBucket.__table__.create(bind=engine, checkfirst=True)
+        db = SessionLocal()
+        try:
+            # Keep the most recently used keys; insert oldest first so LRU order holds
+            rows = db.query(RateLimitBucket).order_by(RateLimitBucket.updated_at.desc()).limit(self.max_keys).all()
+            with self._lock:
+                for row in reversed(rows):
+                    self._buckets[row.key] = [row.tokens, row.updated_at]
+            return len(rows)
+        finally:
+            db.close()
+
+    def save(self) -> int:
+        """Write buckets touched since the last save."""
+        with self._lock:
+            keys, self._dirty = self._dirty, set()
+            rows = [(key, *self._buckets[key]) for key in keys if key in self._buckets]
+        if not rows:
+            return 0
+        db = SessionLocal()
+        try:
+            for key, tokens, updated_at in rows:
+                db.merge(RateLimitBucket(key=key, tokens=tokens, updated_at=updated_at))
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                self._dirty.update(key for key, _, _ in rows)
+            raise
+        finally:
+            db.close()
+        return len(rows)
+
+    async def start(self) -> None:
+        if not self.persist:
+            return
+        restored = self.load()
+        if restored:
+            logger.info(f"Restored {restored} rate limit bucket(s)")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.persist:
+            self.save()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.persist_interval)
+            try:
+                await asyncio.to_thread(self.save)
+            except Exception as e:
+                logger.error(f"Saving rate limit buckets failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        checked = self.allowed + self.limited
+        return {
+            "keys": len(self._buckets),
+            "max_keys": self.max_keys,
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "limited_rate": round(self.limited / checked, 4) if checked else 0.0,
+            "evictions": self.evictions,
+            "persist": self.persist,
+        }
+
+rate_limiter = TokenBucketLimiter()
@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from config import USER_CACHE_SIZE, USER_CACHE_TTL
+from models.user import User
+
+# Dashboards fire several API calls per page load, and each one used to run
+# jwt.decode and a users query in get_current_user. Verified tokens are
+# cached here with a snapshot of the user's columns for a short TTL (never
+# past the token's own expiry). Logout drops the token; deactivation,
+# password and username changes and deletes drop every token for the user.
+
+class UserSnapshot(NamedTuple):
+    """The columns handlers and templates read from current_user; detached from any session."""
+    id: int
+    username: str
+    email: str
+    is_active: bool
+    is_admin: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        return cls(user.id, user.username, user.email, bool(user.is_active), bool(user.is_admin))
+
+class UserCache:
+    """LRU/TTL cache of token -> UserSnapshot with hit/miss counters."""
+
+    def __init__(self, maxsize=None, ttl=None):
+        self.maxsize = USER_CACHE_SIZE if maxsize is None else maxsize
+        self.ttl = USER_CACHE_TTL if ttl is None else ttl
+        self._data = OrderedDict()  # token -> (expires_at, snapshot)
+        self._tokens: Dict[str, Set[str]] = {}  # username -> cached tokens
+        self._lock = threading.Lock()
+        # Bumped by every invalidation so a lookup that raced a user change
+        # doesn't cache the row it read before the change
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, token: str) -> Optional[UserSnapshot]:
+        with self._lock:
+            entry = self._data.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, snapshot = entry
+            if expires_at < time.time():
+                self._remove(token)
+                self.misses += 1
+                return None
+            self._data.move_to_end(token)
+            self.hits += 1
+            return snapshot
+
+    def generation(self) -> int:
+        return self._generation
+
+    def put(self, token: str, snapshot: UserSnapshot, token_expires_at: Optional[float], generation: int) -> None:
+        """Cache a verified token; callers pass the generation() they saw before querying the user."""
+        if self.maxsize <= 0:
+            return
+        expires_at = time.time() + self.ttl
+        if token_expires_at is not None:
+            expires_at = min(expires_at, token_expires_at)
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._remove(token)
+            self._data[token] = (expires_at, snapshot)
+            self._tokens.setdefault(snapshot.username, set()).add(token)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _remove(self, token: str) -> bool:
+        entry = self._data.pop(token, None)
+        if entry is None:
+            return False
+        tokens = self._tokens.get(entry[1].username)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens[entry[1].username]
+        return True
+
+    def invalidate_token(self, token: str) -> None:
+        with self._lock:
+            self._generation += 1
+            if self._remove(token):
+                self.invalidations += 1
+
+    def invalidate_user(self, username: str) -> None:
+        with self._lock:
+            self._generation += 1
+            for token in list(self._tokens.get(username, ())):
+                self._remove(token)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+            self._tokens.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._data)
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+user_cache = UserCache()
+
+# ---------- Invalidation ----------
+# Changes drop cached tokens as soon as they are made and again once they
+# commit, so a request that read the old row in between can't keep it cached.
+
+_PENDING_KEY = "user_cache_pending"
+
+def _user_changed(username: Optional[str], session: Optional[Session]) -> None:
+    if username is None:
+        return
+    user_cache.invalidate_user(username)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, set()).add(username)
+
+@event.listens_for(User.is_active, "set")
+@event.listens_for(User.hashed_password, "set")
+def _credentials_set(target: User, value, oldvalue, initiator):
+    if value != oldvalue:
+        _user_changed(target.username, object_session(target))
+
+@event.listens_for(User.username, "set")
+def _username_set(target: User, value, oldvalue, initiator):
+    if value != oldvalue and isinstance(oldvalue, str):
+        _user_changed(oldvalue, object_session(target))
+
+@event.listens_for(User, "after_delete")
+def _user_deleted(mapper, connection, target: User):
+    _user_changed(target.username, object_session(target))
+
+@event.listens_for(Session, "after_commit")
+def _flush_pending(session: Session):
+    for username in session.info.pop(_PENDING_KEY, ()):
+        user_cache.invalidate_user(username)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session):
+    session.info.pop(_PENDING_KEY, None)
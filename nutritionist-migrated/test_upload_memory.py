@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Measure peak Python memory per request for the image analysis endpoint
+Usage: python test_upload_memory.py [image_path] [--requests N]
+
+Runs the app in-process with tracemalloc and a stand-in Vision client, so no
+API calls are made. Without an image path a large synthetic photo is used.
+Pillow's pixel buffers are allocated outside the Python allocator and don't
+show up here; the numbers cover the bytes/str copies of the upload, which is
+what the streaming upload path removes.
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import tracemalloc
+import types
+
+os.environ.setdefault("ANTHROPIC_API_KEY", "memory-test")
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import app as nutritionist_app
+import services.nutrition_service as nutrition_service
+from services.image_cache import image_cache
+
+ANALYZE_URL = "/api/nutrition/analyze-image"
+
+
+class FakeMessages:
+    """Stands in for the Vision API and returns a fixed analysis"""
+    async def create(self, **kwargs):
+        text = json.dumps({"calories": 500, "description": "memory test", "protein": 30, "carbs": 50, "fat": 20})
+        return types.SimpleNamespace(content=[types.SimpleNamespace(type="text", text=text)])
+
+
+def synthetic_photo(width: int = 4032, height: int = 3024) -> bytes:
+    """Noisy 12MP JPEG, about the size of an iPhone photo"""
+    image = Image.effect_noise((width, height), 48).convert("RGB")
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=92)
+    return output.getvalue()
+
+
+class MemoryProbe:
+    """ASGI wrapper recording the traced peak while the app handles a request,
+    so the test client's own copy of the multipart body isn't counted. The
+    test client delivers the body as one message; it is re-delivered in
+    64KB messages the way uvicorn does."""
+    def __init__(self, app, chunk_size: int = 64 * 1024):
+        self.app = app
+        self.chunk_size = chunk_size
+        self.last_peak = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        pending = []
+
+        def split(message):
+            body = memoryview(message.get("body", b""))
+            more_body = message.get("more_body", False)
+            for offset in range(0, len(body), self.chunk_size) or [0]:
+                last = offset + self.chunk_size >= len(body)
+                pending.append((body, offset, more_body or not last))
+
+        async def chunked_receive():
+            if not pending:
+                message = await receive()
+                if message["type"] != "http.request":
+                    return message
+                split(message)
+            body, offset, more_body = pending.pop(0)
+            chunk = bytes(body[offset:offset + self.chunk_size])
+            return {"type": "http.request", "body": chunk, "more_body": more_body}
+
+        # The client materialises the body on the first receive; do that
+        # before the baseline so only the server side is measured
+        split(await receive())
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        try:
+            await self.app(scope, chunked_receive, send)
+        finally:
+            _, peak = tracemalloc.get_traced_memory()
+            self.last_peak = peak - baseline
+
+
+def measure(client: TestClient, probe: MemoryProbe, image_data: bytes):
+    image_cache.clear()  # Make every request do the full preprocessing path
+    response = client.post(ANALYZE_URL, files={"image": ("photo.jpg", image_data, "image/jpeg")})
+    return response, probe.last_peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("image_path", nargs="?")
+    parser.add_argument("--requests", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.image_path:
+        if not os.path.exists(args.image_path):
+            print(f"❌ Image file not found: {args.image_path}")
+            sys.exit(1)
+        with open(args.image_path, "rb") as image_file:
+            image_data = image_file.read()
+    else:
+        image_data = synthetic_photo()
+
+    nutrition_service.get_async_anthropic_client = lambda: types.SimpleNamespace(messages=FakeMessages())
+    upload_mb = len(image_data) / (1024 * 1024)
+    print(f"📸 Upload size: {upload_mb:.2f}MB")
+
+    probe = MemoryProbe(nutritionist_app.app)
+    tracemalloc.start()
+    with TestClient(probe) as client:
+        for i in range(args.requests):
+            response, peak = measure(client, probe, image_data)
+            peak_mb = peak / (1024 * 1024)
+            print(
+                f"Request {i + 1}: status {response.status_code}, "
+                f"peak {peak_mb:.2f}MB ({peak_mb / upload_mb:.2f}x upload)"
+            )
+            if response.status_code != 200:
+                print(json.dumps(response.json(), indent=2))
+
+        # Anything over the limit should be rejected before it is buffered
+        oversized = b"\0" * (nutritionist_app.IMAGE_MAX_UPLOAD_BYTES + 1024 * 1024)
+        response = client.post(ANALYZE_URL, files={"image": ("huge.jpg", oversized, "image/jpeg")})
+        print(f"Oversized upload: status {response.status_code}, peak {probe.last_peak / (1024 * 1024):.2f}MB")
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
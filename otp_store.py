@@ -0,0 +1,194 @@
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+# ---------- OTP Store ----------
+# One-time login codes, checked once and then thrown away. The default
+# memory store keeps codes in a dict and is right for a single worker; the
+# SQLite store shares codes between worker processes and restarts. Either
+# way a purge task drops expired codes so lookups stay flat no matter how
+# many codes have ever been issued.
+
+VALID = "valid"
+INVALID = "invalid"
+EXPIRED = "expired"
+
+STORES = ("memory", "sqlite")
+
+
+class OTPStore:
+    """Shared counters; subclasses implement issue, verify, purge and size."""
+
+    backend = None
+
+    def __init__(self, ttl_seconds):
+        self.ttl = ttl_seconds
+        self.issued = 0
+        self.verified = 0
+        self.rejected = 0
+        self.purged = 0
+
+    def stats(self):
+        return {
+            "backend": self.backend,
+            "ttl": self.ttl,
+            "size": self.size(),
+            "issued": self.issued,
+            "verified": self.verified,
+            "rejected": self.rejected,
+            "purged": self.purged,
+        }
+
+
+class MemoryOTPStore(OTPStore):
+    backend = "memory"
+
+    def __init__(self, ttl_seconds):
+        super().__init__(ttl_seconds)
+        self._codes = {}  # phone -> {otp: expires_at}
+        self._lock = threading.Lock()
+
+    def issue(self, phone, otp):
+        with self._lock:
+            self._codes.setdefault(phone, {})[otp] = time.time() + self.ttl
+            self.issued += 1
+
+    def verify(self, phone, otp):
+        """VALID, INVALID or EXPIRED; a valid or expired code is used up either way."""
+        with self._lock:
+            codes = self._codes.get(phone)
+            expires_at = codes.pop(otp, None) if codes else None
+            if codes is not None and not codes:
+                del self._codes[phone]
+            if expires_at is None:
+                self.rejected += 1
+                return INVALID
+            if expires_at < time.time():
+                self.rejected += 1
+                return EXPIRED
+            self.verified += 1
+            return VALID
+
+    def purge(self):
+        now = time.time()
+        removed = 0
+        with self._lock:
+            for phone in list(self._codes):
+                codes = self._codes[phone]
+                for otp in [otp for otp, expires_at in codes.items() if expires_at < now]:
+                    del codes[otp]
+                    removed += 1
+                if not codes:
+                    del self._codes[phone]
+            self.purged += removed
+        return removed
+
+    def size(self):
+        with self._lock:
+            return sum(len(codes) for codes in self._codes.values())
+
+
+class SQLiteOTPStore(OTPStore):
+    """Codes in the otps table. Verified codes are deleted on the spot, expired
+    ones by purge(), along with rows marked used before this store existed."""
+
+    backend = "sqlite"
+
+    def __init__(self, db, ttl_seconds):
+        super().__init__(ttl_seconds)
+        self.db = db
+        self._init_table()
+
+    def _init_table(self):
+        with self.db.connection() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS otps (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    phone TEXT,
+                    otp TEXT,
+                    expires_at DATETIME,
+                    used BOOLEAN DEFAULT 0
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_otps_phone_otp ON otps (phone, otp) WHERE used = 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_otps_expires_at ON otps (expires_at)")
+
+    def issue(self, phone, otp):
+        # ISO timestamps, as the table has always held, so old and new rows compare
+        expires_at = datetime.utcnow() + timedelta(seconds=self.ttl)
+        with self.db.connection() as conn:
+            conn.execute(
+                "INSERT INTO otps (phone, otp, expires_at) VALUES (?, ?, ?)",
+                (phone, otp, expires_at.isoformat())
+            )
+        self.issued += 1
+
+    def verify(self, phone, otp):
+        """VALID, INVALID or EXPIRED; a valid or expired code is used up either way."""
+        with self.db.connection() as conn:
+            row = conn.execute(
+                "SELECT id, expires_at FROM otps WHERE phone = ? AND otp = ? AND used = 0 ORDER BY expires_at DESC LIMIT 1",
+                (phone, otp)
+            ).fetchone()
+            if row is None:
+                self.rejected += 1
+                return INVALID
+            conn.execute("DELETE FROM otps WHERE id = ?", (row["id"],))
+        if datetime.fromisoformat(row["expires_at"]) < datetime.utcnow():
+            self.rejected += 1
+            return EXPIRED
+        self.verified += 1
+        return VALID
+
+    def purge(self):
+        with self.db.connection() as conn:
+            cursor = conn.execute(
+                "DELETE FROM otps WHERE used = 1 OR expires_at < ?", (datetime.utcnow().isoformat(),)
+            )
+        self.purged += cursor.rowcount
+        return cursor.rowcount
+
+    def size(self):
+        with self.db.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM otps").fetchone()[0]
+
+
+def make_otp_store(db, ttl_seconds, backend=None):
+    backend = (backend or os.environ.get("OTP_STORE", "memory")).lower()
+    if backend == "memory":
+        return MemoryOTPStore(ttl_seconds)
+    if backend == "sqlite":
+        return SQLiteOTPStore(db, ttl_seconds)
+    raise ValueError(f"Unknown OTP_STORE {backend!r}, expected one of {', '.join(STORES)}")
+
+
+class OTPPurger:
+    """Runs store.purge() every interval seconds while the app is up."""
+
+    def __init__(self, store, interval=None):
+        self.store = store
+        self.interval = float(interval if interval is not None else os.environ.get("OTP_PURGE_INTERVAL", "300"))
+        self._task = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                removed = await asyncio.to_thread(self.store.purge)
+            except Exception as e:
+                print(f"OTP purge failed: {e}")
+                continue
+            if removed:
+                print(f"Purged {removed} expired OTP(s)")
+
@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# ---------- Decoded Meal Plan Cache ----------
+# Bounded LRU with a TTL, holding already-decoded plan dicts so hot pages
+# don't re-run the SELECT and json.loads on every request. Cached plans are
+# shared between requests and must be treated as read-only.
+
+MISSING = object()
+
+
+class PlanCache:
+    def __init__(self, maxsize=None, ttl=None):
+        self.maxsize = int(maxsize if maxsize is not None else os.environ.get("PLAN_CACHE_SIZE", "64"))
+        self.ttl = float(ttl if ttl is not None else os.environ.get("PLAN_CACHE_TTL", "300"))
+        self._data = OrderedDict()  # key -> (expires_at, plan)
+        self._lock = threading.Lock()
+        # Bumped by every write so a reader that raced a writer doesn't
+        # repopulate the cache with the row the writer just replaced.
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Return the cached plan (which may be None for "no plan"), or MISSING."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            expires_at, plan = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return plan
+
+    def generation(self):
+        return self._generation
+
+    def put(self, key, plan, generation=None):
+        """Store a plan. Readers filling a miss pass the generation() they saw
+        before querying; writers omit it."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation is None:
+                self._generation += 1
+            elif generation != self._generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, plan)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            size = len(self._data)
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,94 @@
+import asyncio
+import json
+import os
+
+from schema_validation import validate, subschema
+
+# ---------- Parallel Per-Day Plan Generation ----------
+# A single 7-day tool call generates every output token serially. This engine
+# asks Claude for the week's skeleton (overview, meal prep, grocery lists)
+# first, then generates each day of daily_plans concurrently against that
+# skeleton, and merges the pieces back into the get_meal_plan_schema() shape.
+
+SKELETON_SECTIONS = ("overview", "meal_prep", "grocery_lists")
+
+DEFAULT_CONCURRENCY = int(os.environ.get("FANOUT_CONCURRENCY", "4"))
+SKELETON_MAX_TOKENS = 3000
+DAY_MAX_TOKENS = 2000
+
+
+class FanoutValidationError(Exception):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"Merged meal plan failed validation: {errors[:5]}")
+
+
+def skeleton_tool(plan_schema):
+    plan_props = subschema(plan_schema, ["meal_plan"])
+    return {
+        "name": "generate_meal_plan_skeleton",
+        "description": "Generate the weekly overview, meal prep instructions and grocery lists for a 7-day meal plan",
+        "input_schema": {
+            "type": "object",
+            "properties": {section: plan_props["properties"][section] for section in SKELETON_SECTIONS},
+            "required": list(SKELETON_SECTIONS),
+        },
+    }
+
+
+def day_tool(plan_schema, day):
+    return {
+        "name": "generate_day_plan",
+        "description": f"Generate every meal for {day.capitalize()} with nutritional info and portion sizes",
+        "input_schema": subschema(plan_schema, ["meal_plan", "daily_plans", day]),
+    }
+
+
+def skeleton_prompt(base_prompt):
+    return base_prompt + """
+For this step, produce ONLY the weekly overview, the Sunday and Wednesday meal prep
+instructions and the two grocery lists. The individual days are planned separately
+and must be cookable from exactly these groceries and prep.
+"""
+
+
+def day_prompt(base_prompt, skeleton, day):
+    return base_prompt + f"""
+The week's overview, meal prep and grocery lists are already decided:
+{json.dumps(skeleton, indent=2)}
+
+For this step, produce ONLY the meals for {day.capitalize()}. Use only the groceries and
+prepped food available by {day.capitalize()}, and hit that day's share of the calorie and
+protein goals.
+"""
+
+
+async def generate_fanout_plan(call_tool, base_prompt, plan_schema, concurrency=None):
+    """Generate a plan as one skeleton call plus one call per day, then merge and validate.
+
+    call_tool(prompt, tool, max_tokens) must return the tool input dict or raise.
+    Raises FanoutValidationError if the merged plan doesn't match plan_schema.
+    """
+    skeleton = await call_tool(skeleton_prompt(base_prompt), skeleton_tool(plan_schema), SKELETON_MAX_TOKENS)
+
+    days = list(subschema(plan_schema, ["meal_plan", "daily_plans"])["properties"])
+    semaphore = asyncio.Semaphore(concurrency or DEFAULT_CONCURRENCY)
+
+    async def generate_day(day):
+        async with semaphore:
+            return await call_tool(day_prompt(base_prompt, skeleton, day), day_tool(plan_schema, day), DAY_MAX_TOKENS)
+
+    day_plans = await asyncio.gather(*(generate_day(day) for day in days))
+
+    meal_plan = {
+        "meal_plan": {
+            "overview": skeleton.get("overview"),
+            "daily_plans": dict(zip(days, day_plans)),
+            "meal_prep": skeleton.get("meal_prep"),
+            "grocery_lists": skeleton.get("grocery_lists"),
+        }
+    }
+    errors = validate(meal_plan, plan_schema)
+    if errors:
+        raise FanoutValidationError(errors)
+    return meal_plan
@@ -0,0 +1,85 @@
+import json
+
+# ---------- Incremental Tool-Input Parser ----------
+# Anthropic streams tool input as fragments of one JSON document
+# (input_json_delta events). This scanner tracks nesting as fragments arrive
+# and hands back each object/array at a watched path the moment its closing
+# bracket is seen, so callers can forward finished sections without waiting
+# for the whole document.
+
+
+class IncrementalJSONParser:
+    def __init__(self, watch_paths):
+        """watch_paths: tuples of keys; "*" matches any key at that level."""
+        self.watch_paths = [tuple(p) for p in watch_paths]
+        self.buffer = ""
+        self._pos = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        # Each frame: {"kind": "{" or "[", "path": tuple, "start": int,
+        #              "expect_key": bool, "key": str or None, "index": int}
+        self._stack = []
+
+    def _watched(self, path):
+        for pattern in self.watch_paths:
+            if len(pattern) == len(path) and all(p == "*" or p == k for p, k in zip(pattern, path)):
+                return True
+        return False
+
+    def _child_path(self):
+        if not self._stack:
+            return ()
+        frame = self._stack[-1]
+        if frame["kind"] == "{":
+            return frame["path"] + (frame["key"],)
+        return frame["path"] + (frame["index"],)
+
+    def feed(self, fragment):
+        """Consume a fragment; return [(path, value)] for watched containers it completed."""
+        self.buffer += fragment
+        completed = []
+        buf = self.buffer
+        i = self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    frame = self._stack[-1] if self._stack else None
+                    if frame is not None and frame["kind"] == "{" and frame["expect_key"]:
+                        frame["key"] = json.loads(buf[self._string_start:i + 1])
+                        frame["expect_key"] = False
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in "{[":
+                self._stack.append({
+                    "kind": ch,
+                    "path": self._child_path(),
+                    "start": i,
+                    "expect_key": ch == "{",
+                    "key": None,
+                    "index": 0,
+                })
+            elif ch in "}]":
+                frame = self._stack.pop()
+                if self._watched(frame["path"]):
+                    completed.append((frame["path"], json.loads(buf[frame["start"]:i + 1])))
+            elif ch == "," and self._stack:
+                frame = self._stack[-1]
+                if frame["kind"] == "{":
+                    frame["expect_key"] = True
+                else:
+                    frame["index"] += 1
+            i += 1
+        self._pos = i
+        return completed
+
+    def result(self):
+        """Parse the complete document once the stream has finished."""
+        return json.loads(self.buffer)
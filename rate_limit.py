@@ -0,0 +1,231 @@
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# ---------- Rate Limiting ----------
+# Token buckets for the endpoints that spend Anthropic quota or send codes.
+# Each key (route plus user or client IP) holds up to `capacity` tokens,
+# refilled continuously at capacity/period; a request takes one token or
+# gets a 429 with Retry-After before the endpoint runs. Buckets live in this
+# process; with RATE_LIMIT_PERSIST=true they are also saved to the
+# rate_limit_buckets table periodically and on shutdown, so a restart
+# doesn't hand everyone a full bucket. The request path never touches SQLite.
+
+PERIODS = {"second": 1.0, "minute": 60.0, "hour": 3600.0, "day": 86400.0}
+
+RateLimit = namedtuple("RateLimit", ["capacity", "period"])
+
+# Logged-in requests use per_user, anonymous ones per_ip; None means unlimited
+RouteLimit = namedtuple("RouteLimit", ["per_user", "per_ip", "methods"], defaults=(None, None, ("POST",)))
+
+
+def parse_rate(text):
+    """"10/hour" -> RateLimit(10, 3600); "30/90" means 30 per 90 seconds; empty -> None."""
+    if not text or not text.strip():
+        return None
+    count, _, period = text.strip().partition("/")
+    period = period.strip().lower().rstrip("s") or "second"
+    seconds = PERIODS.get(period)
+    if seconds is None:
+        try:
+            seconds = float(period)
+        except ValueError:
+            raise ValueError(f"Bad rate limit {text!r}, expected e.g. 10/hour")
+    if float(count) <= 0 or seconds <= 0:
+        raise ValueError(f"Bad rate limit {text!r}, both sides must be positive")
+    return RateLimit(float(count), seconds)
+
+
+def env_rate(name, default):
+    return parse_rate(os.environ.get(name, default))
+
+
+class TokenBucketLimiter:
+    def __init__(self, db=None, max_keys=None, persist=None, persist_interval=None):
+        self.db = db
+        self.max_keys = int(max_keys if max_keys is not None else os.environ.get("RATE_LIMIT_MAX_KEYS", "100000"))
+        if persist is None:
+            persist = os.environ.get("RATE_LIMIT_PERSIST", "false").lower() == "true"
+        self.persist = persist and db is not None
+        self.persist_interval = float(
+            persist_interval if persist_interval is not None else os.environ.get("RATE_LIMIT_PERSIST_INTERVAL", "30")
+        )
+        self._buckets = OrderedDict()  # key -> [tokens, updated_at]
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._task = None
+        self.allowed = 0
+        self.limited = 0
+        self.evictions = 0
+
+    def acquire(self, key, limit, cost=1.0):
+        """Take `cost` tokens; returns 0 if allowed, else seconds until they would be available."""
+        rate = limit.capacity / limit.period
+        now = time.time()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [limit.capacity, now]
+                while len(self._buckets) > self.max_keys:
+                    # An evicted key starts over with a full bucket; only idle keys get here
+                    evicted, _ = self._buckets.popitem(last=False)
+                    self._dirty.discard(evicted)
+                    self.evictions += 1
+            else:
+                self._buckets.move_to_end(key)
+                bucket[0] = min(limit.capacity, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if self.persist:
+                self._dirty.add(key)
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                self.allowed += 1
+                return 0.0
+            self.limited += 1
+            return (cost - bucket[0]) / rate
+
+    # ---- persistence ----
+
+    def _init_table(self, conn):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+
+    def load(self):
+        """Restore saved buckets; their tokens refill from updated_at on next use."""
+        with self.db.connection() as conn:
+            self._init_table(conn)
+            rows = conn.execute(
+                "SELECT key, tokens, updated_at FROM rate_limit_buckets ORDER BY updated_at DESC LIMIT ?",
+                (self.max_keys,)
+            ).fetchall()
+        with self._lock:
+            for row in reversed(rows):
+                self._buckets[row["key"]] = [row["tokens"], row["updated_at"]]
+        return len(rows)
+
+    def save(self):
+        """Write buckets touched since the last save."""
+        with self._lock:
+            keys, self._dirty = self._dirty, set()
+            rows = [(key, *self._buckets[key]) for key in keys if key in self._buckets]
+        if not rows:
+            return 0
+        try:
+            with self.db.connection() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated_at) VALUES (?, ?, ?)", rows
+                )
+        except Exception:
+            with self._lock:
+                self._dirty.update(row[0] for row in rows)
+            raise
+        return len(rows)
+
+    async def start(self):
+        if not self.persist:
+            return
+        restored = self.load()
+        if restored:
+            print(f"Restored {restored} rate limit bucket(s)")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.persist:
+            self.save()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.persist_interval)
+            try:
+                await asyncio.to_thread(self.save)
+            except Exception as e:
+                print(f"Saving rate limit buckets failed: {e}")
+
+    def stats(self):
+        checked = self.allowed + self.limited
+        return {
+            "keys": len(self._buckets),
+            "max_keys": self.max_keys,
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "limited_rate": round(self.limited / checked, 4) if checked else 0.0,
+            "evictions": self.evictions,
+            "persist": self.persist,
+        }
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying RouteLimits by path prefix (longest prefix wins).
+
+    identify(headers) returns the user id for a request, or None when it
+    carries no valid credentials; headers is a dict of lowercased bytes.
+    """
+
+    def __init__(self, app, limits, limiter, identify=None):
+        self.app = app
+        self.limits = sorted(limits.items(), key=lambda item: len(item[0]), reverse=True)
+        self.limiter = limiter
+        self.identify = identify
+        self.trust_proxy = os.environ.get("RATE_LIMIT_TRUST_PROXY", "false").lower() == "true"
+
+    def _limit_for(self, path, method):
+        for prefix, limit in self.limits:
+            if path.startswith(prefix):
+                return (prefix, limit) if method in limit.methods else (None, None)
+        return None, None
+
+    def _client_ip(self, scope, headers):
+        # Only behind a proxy that sets X-Forwarded-For; otherwise clients could pick their own key
+        if self.trust_proxy and b"x-forwarded-for" in headers:
+            return headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        prefix, limit = self._limit_for(scope["path"], scope["method"])
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        user = self.identify(headers) if self.identify is not None and limit.per_user is not None else None
+        if user is not None:
+            key, bucket = f"{prefix}|user:{user}", limit.per_user
+        else:
+            key, bucket = f"{prefix}|ip:{self._client_ip(scope, headers)}", limit.per_ip
+        retry_after = self.limiter.acquire(key, bucket) if bucket is not None else 0.0
+        if retry_after > 0:
+            await self._reject(send, key, retry_after)
+            return
+        await self.app(scope, receive, send)
+
+    async def _reject(self, send, key, retry_after):
+        print(f"Rate limited {key}")
+        seconds = max(1, math.ceil(retry_after))
+        body = json.dumps({"detail": f"Too many requests. Try again in {seconds} seconds"}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(seconds).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
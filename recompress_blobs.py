@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Rewrite stored plans, plan days and modification replies with the given
+compression, optionally training a dictionary on the existing plans first.
+Usage: python recompress_blobs.py [--db meal_plans.db] [--algorithm zlib|zstd|none]
+                                  [--train-dictionary] [--dictionary-size BYTES]
+
+Prints the database size and plan read latency before and after. Rows that
+are already compressed are decoded and re-encoded, so this also moves rows
+to a newly trained dictionary, or back to plain text with --algorithm none.
+Run the server with the same BLOB_COMPRESSION so new rows match.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+from sqlite_pool import SQLitePool
+from blob_codec import (
+    ALGORITHMS,
+    DEFAULT_DICTIONARY_SIZE,
+    BlobCodec,
+    init_dictionary_table,
+    load_dictionaries,
+    save_dictionary,
+    train_dictionary,
+)
+
+# (table, column) pairs written through the codec
+BLOB_COLUMNS = [
+    ("meal_plans", "plan"),
+    ("meal_plan_days", "plan"),
+    ("modifications", "response"),
+]
+
+
+def existing_columns(conn):
+    tables = {row["name"] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return [(table, column) for table, column in BLOB_COLUMNS if table in tables]
+
+
+def database_size(conn):
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    pages = conn.execute("PRAGMA page_count").fetchone()[0]
+    free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return (pages - free) * page_size
+
+
+def column_bytes(conn, table, column):
+    return conn.execute(f"SELECT COALESCE(SUM(LENGTH(CAST({column} AS BLOB))), 0) FROM {table}").fetchone()[0]
+
+
+def plan_read_latency(conn, codec, rounds=5):
+    """Median microseconds to select, decode and parse one weekly plan."""
+    keys = [row["week_key"] for row in conn.execute("SELECT week_key FROM meal_plans")]
+    if not keys:
+        return None
+    samples = []
+    for _ in range(rounds):
+        for key in keys:
+            start = time.perf_counter()
+            row = conn.execute("SELECT plan FROM meal_plans WHERE week_key = ?", (key,)).fetchone()
+            json.loads(codec.decode(row["plan"]))
+            samples.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(samples)
+
+
+def report(label, conn, codec, columns):
+    latency = plan_read_latency(conn, codec)
+    print(f"{label}:")
+    print(f"  Database size: {database_size(conn) / 1024:.1f}KB")
+    for table, column in columns:
+        print(f"  {table}.{column}: {column_bytes(conn, table, column) / 1024:.1f}KB")
+    print(f"  Plan read latency (p50): {latency:.1f}us" if latency is not None else "  No plans stored")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="meal_plans.db")
+    parser.add_argument("--algorithm", choices=ALGORITHMS, default=os.environ.get("BLOB_COMPRESSION", "zlib"))
+    parser.add_argument("--level", type=int)
+    parser.add_argument("--train-dictionary", action="store_true", help="Train a dictionary on the stored plans first")
+    parser.add_argument("--dictionary-size", type=int, default=DEFAULT_DICTIONARY_SIZE)
+    parser.add_argument("--no-vacuum", action="store_true", help="Skip VACUUM (freed pages stay in the file)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ Database not found: {args.db}")
+        return 1
+
+    db = SQLitePool(args.db)
+    codec = BlobCodec(args.algorithm, args.level)
+    with db.connection() as conn:
+        init_dictionary_table(conn)
+        load_dictionaries(conn, codec)
+        columns = existing_columns(conn)
+        report("Before", conn, codec, columns)
+
+        if args.train_dictionary and args.algorithm != "none":
+            samples = [codec.decode(row["plan"]) for row in conn.execute("SELECT plan FROM meal_plans ORDER BY created_at")]
+            dictionary = train_dictionary(args.algorithm, samples, args.dictionary_size)
+            dictionary_id = save_dictionary(conn, codec, dictionary)
+            print(f"Trained {args.algorithm} dictionary {dictionary_id} ({len(dictionary)} bytes) on {len(samples)} plans")
+
+    started = time.perf_counter()
+    rewritten = 0
+    for table, column in columns:
+        with db.connection() as conn:
+            rows = conn.execute(f"SELECT rowid AS row_id, {column} FROM {table}").fetchall()
+            conn.executemany(
+                f"UPDATE {table} SET {column} = ? WHERE rowid = ?",
+                [(codec.encode(codec.decode(row[column])), row["row_id"]) for row in rows],
+            )
+            rewritten += len(rows)
+    print(f"Rewrote {rewritten} values with {args.algorithm} in {time.perf_counter() - started:.2f}s")
+
+    if not args.no_vacuum:
+        with db.connection() as conn:
+            conn.execute("VACUUM")
+
+    with db.connection() as conn:
+        report("After", conn, codec, columns)
+    db.close_all()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,45 @@
+# ---------- Minimal JSON Schema Validation ----------
+# Covers the subset of JSON Schema used by get_meal_plan_schema():
+# type, properties, required and items.
+
+_TYPE_CHECKS = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+
+def validate(instance, schema, path="$"):
+    """Return a list of human-readable errors; an empty list means valid."""
+    errors = []
+    expected = schema.get("type")
+    if expected:
+        check = _TYPE_CHECKS.get(expected)
+        if check and not check(instance):
+            errors.append(f"{path}: expected {expected}, got {type(instance).__name__}")
+            return errors
+
+    if isinstance(instance, dict):
+        for key in schema.get("required", []):
+            if key not in instance:
+                errors.append(f"{path}: missing required property '{key}'")
+        for key, subschema in schema.get("properties", {}).items():
+            if key in instance:
+                errors.extend(validate(instance[key], subschema, f"{path}.{key}"))
+    elif isinstance(instance, list) and "items" in schema:
+        for i, item in enumerate(instance):
+            errors.extend(validate(item, schema["items"], f"{path}[{i}]"))
+    return errors
+
+
+def subschema(schema, path):
+    """Walk `properties` along path (a sequence of keys); None if the path isn't described."""
+    for key in path:
+        schema = schema.get("properties", {}).get(key)
+        if schema is None:
+            return None
+    return schema
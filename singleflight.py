@@ -0,0 +1,40 @@
+import asyncio
+
+# ---------- Single-Flight Coalescing ----------
+# Concurrent callers asking for the same key share one in-flight coroutine
+# instead of each starting their own, e.g. several tabs hitting
+# /api/generate for the same week at once.
+
+
+class SingleFlight:
+    def __init__(self):
+        self._in_flight = {}  # key -> asyncio.Task
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        """Run fn() for key, or join the run already in progress and share its result."""
+        self.calls += 1
+        task = self._in_flight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        # Shielded so one caller disconnecting doesn't cancel the others' call
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
@@ -0,0 +1,143 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# ---------- SQLite Connection Manager ----------
+# One long-lived connection per thread instead of a connect/close per query.
+# FastAPI runs sync endpoints on a fixed-size worker pool, so the number of
+# open connections is bounded by the number of worker threads.
+
+JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+
+class SQLitePool:
+    def __init__(
+        self,
+        database,
+        journal_mode=None,
+        synchronous=None,
+        cache_size=None,
+        mmap_size=None,
+        busy_timeout=None,
+    ):
+        self.database = database
+        self.journal_mode = (journal_mode or os.environ.get("SQLITE_JOURNAL_MODE", "WAL")).upper()
+        self.synchronous = (synchronous or os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")).upper()
+        # Negative cache_size is in KiB (-16000 ~= 16MB page cache per connection)
+        self.cache_size = int(cache_size if cache_size is not None else os.environ.get("SQLITE_CACHE_SIZE", "-16000"))
+        self.mmap_size = int(mmap_size if mmap_size is not None else os.environ.get("SQLITE_MMAP_SIZE", str(64 * 1024 * 1024)))
+        self.busy_timeout = int(busy_timeout if busy_timeout is not None else os.environ.get("SQLITE_BUSY_TIMEOUT", "5000"))
+
+        if self.journal_mode not in JOURNAL_MODES:
+            raise ValueError(f"Invalid SQLite journal mode: {self.journal_mode}")
+        if self.synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"Invalid SQLite synchronous mode: {self.synchronous}")
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}  # thread ident -> connection
+        self._metrics = {
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "reuses": 0,
+            "commits": 0,
+            "rollbacks": 0,
+            "checkout_wait_ms": 0.0,
+        }
+
+    def _connect(self):
+        # Each connection is only used by the thread that opened it, but
+        # close_all() and dead-thread pruning close it from another thread
+        conn = sqlite3.connect(self.database, timeout=self.busy_timeout / 1000, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute(f"PRAGMA cache_size={self.cache_size}")
+        conn.execute(f"PRAGMA mmap_size={self.mmap_size}")
+        conn.execute(f"PRAGMA busy_timeout={self.busy_timeout}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _prune_dead_threads(self):
+        # Worker threads can exit (e.g. an executor shrinking); close what they left behind
+        alive = {t.ident for t in threading.enumerate()}
+        for ident in [i for i in self._connections if i not in alive]:
+            try:
+                self._connections.pop(ident).close()
+            except sqlite3.Error:
+                pass
+            self._metrics["connections_closed"] += 1
+
+    def _count(self, metric, amount=1):
+        with self._lock:
+            self._metrics[metric] += amount
+
+    def _get(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            self._count("reuses")
+            return conn
+        conn = self._connect()
+        with self._lock:
+            self._prune_dead_threads()
+            self._connections[threading.get_ident()] = conn
+            self._metrics["connections_opened"] += 1
+        self._local.conn = conn
+        self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Yield this thread's connection; commits on success and rolls back on error.
+
+        Nested use (a helper calling another helper) shares the outer transaction.
+        """
+        start = time.perf_counter()
+        conn = self._get()
+        with self._lock:
+            self._metrics["checkouts"] += 1
+            self._metrics["checkout_wait_ms"] += (time.perf_counter() - start) * 1000
+        self._local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth -= 1
+            if self._local.depth == 0 and conn.in_transaction:
+                conn.rollback()
+                self._count("rollbacks")
+            raise
+        else:
+            self._local.depth -= 1
+            if self._local.depth == 0 and conn.in_transaction:
+                conn.commit()
+                self._count("commits")
+
+    def close_all(self):
+        with self._lock:
+            for conn in self._connections.values():
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+                self._metrics["connections_closed"] += 1
+            self._connections.clear()
+        self._local = threading.local()
+
+    def stats(self):
+        with self._lock:
+            open_connections = len(self._connections)
+            stats = dict(self._metrics)
+        stats["open_connections"] = open_connections
+        stats["checkout_wait_ms"] = round(stats["checkout_wait_ms"], 3)
+        stats["settings"] = {
+            "journal_mode": self.journal_mode,
+            "synchronous": self.synchronous,
+            "cache_size": self.cache_size,
+            "mmap_size": self.mmap_size,
+            "busy_timeout": self.busy_timeout,
+        }
+        return stats